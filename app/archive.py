@@ -0,0 +1,535 @@
+# app/archive.py
+
+"""
+Archivo de transacciones aceptadas con acceso aleatorio O(1) (auditoría).
+
+Buscar "la transacción #N" o "la tx con firma S" en verified/ o en la
+bitácora implica recorrer. El archivo es un directorio con tres partes:
+
+1) slots.bin: encabezado de 8 bytes y después un slot de ancho fijo por
+   transacción (136 bytes, big-endian):
+
+       offset  tamaño  campo
+       0       64      firma Ed25519
+       64      32      llave pública
+       96      20      dirección (RIPEMD-160(SHA-256(pubkey)))
+       116     8       nonce (uint64)
+       124     8       offset de la tx en heap.bin (uint64)
+       132     4       longitud de la tx (uint32)
+
+   El registro N está en 8 + N * 136: "#N" es una multiplicación.
+
+2) heap.bin: los bytes de cada tx tal como los produce canonical_bytes (lo
+   que se firmó), uno tras otro.
+
+3) signatures.idx: tabla hash en disco (direccionamiento abierto, sondeo
+   lineal, ocupación <= 50 %). Cada cubeta guarda (registro + 1, huella de
+   32 bits de la firma); la cubeta inicial sale de los primeros 8 bytes de
+   la firma, que ya son pseudoaleatorios. Buscar una firma revisa en
+   promedio una o dos cubetas y compara la firma completa solo cuando la
+   huella coincide. Al pasar del 50 % la tabla se reconstruye con el doble
+   de tamaño.
+
+La lectura es con mmap: firma, llave, dirección y bytes de la tx son
+memoryview sobre el archivo mapeado, sin copias (valen mientras el archivo
+siga abierto). Una búsqueda toma microsegundos sin importar cuántos
+registros haya.
+
+Escritura: un solo escritor a la vez (fcntl.flock sobre .lock, como la
+bitácora). El slot se valida y se arma antes de escribir; después se escribe
+heap, luego slot, luego índice, y si una escritura falla se truncan heap y
+slots al último registro completo. Al abrir para escribir se descarta un
+slot incompleto y lo que sobre en heap.bin, y si el índice no cubre
+exactamente los slots, se reconstruye.
+"""
+
+import base64
+import contextlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from .canonicalizer import canonical_bytes
+from .crypto_utils import derive_address_btc_style
+from .envelope import BinaryEnvelope, _pack, parse_envelope
+from .validation import NONCE_LIMIT
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock
+    fcntl = None
+
+MAGIC = b"WARC"
+VERSION = 1
+SIG_SIZE = 64
+PUBKEY_SIZE = 32
+ADDRESS_SIZE = 20
+
+_HEADER = struct.Struct(">4sBxH")  # magic, versión, tamaño del slot
+_SLOT = struct.Struct(">64s32s20sQQI")
+SLOT_SIZE = _SLOT.size
+# Offsets de los campos dentro del slot
+_NONCE_AT = SIG_SIZE + PUBKEY_SIZE + ADDRESS_SIZE
+_TAIL = struct.Struct(">QQI")  # nonce, offset en heap, longitud
+
+_INDEX_MAGIC = b"WSIX"
+_INDEX_HEADER = struct.Struct(">4sBxxxQQ")  # magic, versión, capacidad, registros indexados
+_BUCKET = struct.Struct(">II")  # registro + 1 (0 = vacía), huella
+MIN_CAPACITY = 1024
+# El registro se guarda como uint32 (+1) en la tabla
+MAX_RECORDS = 2 ** 32 - 2
+
+SLOTS_FILE = "slots.bin"
+HEAP_FILE = "heap.bin"
+INDEX_FILE = "signatures.idx"
+
+
+def _bucket_of(signature: bytes, capacity: int) -> int:
+    return int.from_bytes(signature[:8], "big") & (capacity - 1)
+
+
+def _fingerprint(signature: bytes) -> int:
+    return int.from_bytes(signature[8:12], "big")
+
+
+class ArchiveRecord:
+    '''
+    Un registro del archivo; los campos de bytes son memoryview sin copias
+    - tx se decodifica del JSON canónico solo la primera vez que se pide
+    '''
+
+    __slots__ = ("number", "signature", "pubkey", "address_bytes", "nonce", "tx_bytes", "_tx")
+
+    def __init__(self, number: int, signature: memoryview, pubkey: memoryview, address_bytes: memoryview,
+                 nonce: int, tx_bytes: memoryview) -> None:
+        self.number = number
+        self.signature = signature
+        self.pubkey = pubkey
+        self.address_bytes = address_bytes
+        self.nonce = nonce
+        self.tx_bytes = tx_bytes
+        self._tx: Optional[Dict[str, Any]] = None
+
+    @property
+    def address(self) -> str:
+        return "0x" + self.address_bytes.hex()
+
+    @property
+    def tx(self) -> Dict[str, Any]:
+        if self._tx is None:
+            self._tx = json.loads(bytes(self.tx_bytes))
+        return self._tx
+
+    def to_envelope(self) -> Dict[str, Any]:
+        '''
+        Paquete JSON, igual al de sign_transaction
+        '''
+        return {
+            "tx": self.tx,
+            "sig_scheme": "Ed25519",
+            "signature_b64": base64.b64encode(self.signature).decode("ascii"),
+            "pubkey_b64": base64.b64encode(self.pubkey).decode("ascii"),
+        }
+
+    def to_binary(self) -> bytes:
+        '''
+        Paquete binario (envelope.py), sin volver a canonicalizar
+        '''
+        return _pack("Ed25519", self.signature, self.pubkey, self.tx_bytes)
+
+
+class Archive:
+    '''
+    Archivo de transacciones en un directorio (ver el docstring del módulo)
+    - readonly=True: solo lectura, sin lock ni recuperación; refresh() ve
+      lo que un escritor agregó después de abrir
+    - fsync=True: flush() y close() esperan a que los datos lleguen al disco
+    '''
+
+    def __init__(self, directory: Path | str, readonly: bool = False, fsync: bool = True) -> None:
+        self.directory = Path(directory)
+        self.readonly = readonly
+        self.fsync = fsync
+
+        self._count = 0
+        self._heap_end = 0
+        self._slots_f: Optional[BinaryIO] = None
+        self._heap_f: Optional[BinaryIO] = None
+        self._lock_file = None
+
+        # Mapas de lectura (se vuelven a mapear cuando el archivo crece)
+        self._slots_mm: Optional[mmap.mmap] = None
+        self._slots_view: Optional[memoryview] = None
+        self._heap_mm: Optional[mmap.mmap] = None
+        self._heap_view: Optional[memoryview] = None
+        self._mapped = 0
+
+        # Índice de firmas
+        self._index_f: Optional[BinaryIO] = None
+        self._index_mm: Optional[mmap.mmap] = None
+        self._capacity = 0
+        self._indexed = 0
+
+        if readonly:
+            if not self._path(SLOTS_FILE).exists():
+                raise FileNotFoundError(f"No existe el archivo {self.directory}")
+            self._count = self._slot_count()
+            self._map()
+            self._open_index()
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.directory / ".lock", "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        self._open_writer()
+
+    # --------------------------------------------------------
+    # Apertura y recuperación
+    # --------------------------------------------------------
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _slot_count(self) -> int:
+        try:
+            size = self._path(SLOTS_FILE).stat().st_size
+        except FileNotFoundError:
+            return 0
+        return max(0, size - _HEADER.size) // SLOT_SIZE
+
+    def _open_writer(self) -> None:
+        slots_path = self._path(SLOTS_FILE)
+        if not slots_path.exists():
+            with open(slots_path, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, SLOT_SIZE))
+        self._slots_f = open(slots_path, "r+b")
+        self._check_header(self._slots_f)
+
+        # Un slot a medio escribir se descarta
+        self._count = self._slot_count()
+        self._slots_f.truncate(_HEADER.size + self._count * SLOT_SIZE)
+        self._slots_f.seek(0, os.SEEK_END)
+
+        # Lo que haya en heap.bin después de la última tx con slot se descarta
+        if self._count:
+            self._slots_f.seek(_HEADER.size + (self._count - 1) * SLOT_SIZE + _NONCE_AT)
+            _, offset, length = _TAIL.unpack(self._slots_f.read(_TAIL.size))
+            self._heap_end = offset + length
+            self._slots_f.seek(0, os.SEEK_END)
+        self._heap_f = open(self._path(HEAP_FILE), "a+b")
+        if os.fstat(self._heap_f.fileno()).st_size < self._heap_end:
+            raise ValueError(f"{self.directory}: heap.bin es más corto de lo que dicen los slots")
+        self._heap_f.truncate(self._heap_end)
+
+        self._map()
+        self._open_index()
+        if self._indexed != self._count or self._index_mm is None:
+            self._rebuild_index(self._capacity_for(self._count))
+
+    @staticmethod
+    def _check_header(f: BinaryIO) -> None:
+        f.seek(0)
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError("slots.bin: encabezado incompleto")
+        magic, version, slot_size = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            raise ValueError("slots.bin: formato no soportado")
+
+    def _map(self) -> None:
+        '''
+        (Re)mapea slots y heap para leer hasta self._count registros
+        '''
+        if self._slots_f is not None:
+            self._slots_f.flush()
+            self._heap_f.flush()
+        if self._count == 0:
+            self._mapped = 0
+            return
+        access = mmap.ACCESS_READ
+        with open(self._path(SLOTS_FILE), "rb") as f:
+            if self._slots_f is None:
+                self._check_header(f)
+            slots_mm = mmap.mmap(f.fileno(), 0, access=access)
+        with open(self._path(HEAP_FILE), "rb") as f:
+            heap_mm = mmap.mmap(f.fileno(), 0, access=access) if os.fstat(f.fileno()).st_size else None
+        # Los mapas anteriores siguen vivos mientras haya registros que los usen
+        self._slots_mm, self._slots_view = slots_mm, memoryview(slots_mm)
+        self._heap_mm = heap_mm
+        self._heap_view = memoryview(heap_mm) if heap_mm is not None else memoryview(b"")
+        self._mapped = min(self._count, (len(slots_mm) - _HEADER.size) // SLOT_SIZE)
+
+    def refresh(self) -> None:
+        '''
+        Lector: vuelve a mapear si un escritor agregó registros
+        '''
+        count = self._slot_count()
+        if count != self._count:
+            self._count = count
+            self._map()
+        self._open_index()
+
+    # --------------------------------------------------------
+    # Índice de firmas
+    # --------------------------------------------------------
+    @staticmethod
+    def _capacity_for(count: int) -> int:
+        capacity = MIN_CAPACITY
+        while capacity < 2 * (count + 1):
+            capacity *= 2
+        return capacity
+
+    def _open_index(self) -> None:
+        path = self._path(INDEX_FILE)
+        if self._index_mm is not None:
+            self._index_mm.close()
+        self._capacity = self._indexed = 0
+        self._index_mm = None
+        try:
+            f = open(path, "rb" if self.readonly else "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _INDEX_HEADER.size:
+                return
+            access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+            mm = mmap.mmap(f.fileno(), 0, access=access)
+        magic, version, capacity, indexed = _INDEX_HEADER.unpack_from(mm, 0)
+        if magic != _INDEX_MAGIC or version != VERSION or size != _INDEX_HEADER.size + capacity * _BUCKET.size:
+            mm.close()
+            return
+        self._index_mm, self._capacity, self._indexed = mm, capacity, indexed
+
+    def _rebuild_index(self, capacity: int) -> None:
+        '''
+        Crea una tabla nueva con "capacity" cubetas y mete todos los registros
+        '''
+        tmp_path = self._path(INDEX_FILE + ".tmp")
+        with open(tmp_path, "w+b") as f:
+            f.truncate(_INDEX_HEADER.size + capacity * _BUCKET.size)
+            mm = mmap.mmap(f.fileno(), 0)
+        _INDEX_HEADER.pack_into(mm, 0, _INDEX_MAGIC, VERSION, capacity, 0)
+        view = self._slots_view
+        for number in range(self._count):
+            start = _HEADER.size + number * SLOT_SIZE
+            self._insert(mm, capacity, bytes(view[start:start + SIG_SIZE]), number)
+        _INDEX_HEADER.pack_into(mm, 0, _INDEX_MAGIC, VERSION, capacity, self._count)
+        mm.flush()
+        mm.close()
+        if self.fsync:
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(INDEX_FILE))
+        self._open_index()
+
+    @staticmethod
+    def _insert(mm: mmap.mmap, capacity: int, signature: bytes, number: int) -> None:
+        mask = capacity - 1
+        bucket = _bucket_of(signature, capacity)
+        while True:
+            at = _INDEX_HEADER.size + bucket * _BUCKET.size
+            if _BUCKET.unpack_from(mm, at)[0] == 0:
+                _BUCKET.pack_into(mm, at, number + 1, _fingerprint(signature))
+                return
+            bucket = (bucket + 1) & mask
+
+    def _lookup(self, signature: bytes) -> Optional[int]:
+        mm = self._index_mm
+        if mm is not None:
+            capacity = self._capacity
+            mask = capacity - 1
+            fp = _fingerprint(signature)
+            bucket = _bucket_of(signature, capacity)
+            unpack_from = _BUCKET.unpack_from
+            while True:
+                entry, entry_fp = unpack_from(mm, _INDEX_HEADER.size + bucket * _BUCKET.size)
+                if entry == 0:
+                    break
+                if entry_fp == fp and self._signature_at(entry - 1) == signature:
+                    return entry - 1
+                bucket = (bucket + 1) & mask
+        # Registros que el índice todavía no cubre (lector con índice viejo)
+        for number in range(self._indexed if mm is not None else 0, self._count):
+            if self._signature_at(number) == signature:
+                return number
+        return None
+
+    # --------------------------------------------------------
+    # Lectura
+    # --------------------------------------------------------
+    def _signature_at(self, number: int) -> memoryview:
+        if number >= self._mapped:
+            self._map()
+        start = _HEADER.size + number * SLOT_SIZE
+        return self._slots_view[start:start + SIG_SIZE]
+
+    def get(self, number: int) -> ArchiveRecord:
+        '''
+        Registro número "number" (0 es el primero)
+        '''
+        if not 0 <= number < self._count:
+            raise IndexError(f"No hay registro {number} (el archivo tiene {self._count})")
+        if number >= self._mapped:
+            self._map()
+        view = self._slots_view
+        start = _HEADER.size + number * SLOT_SIZE
+        nonce, offset, length = _TAIL.unpack_from(view, start + _NONCE_AT)
+        return ArchiveRecord(
+            number,
+            view[start:start + SIG_SIZE],
+            view[start + SIG_SIZE:start + SIG_SIZE + PUBKEY_SIZE],
+            view[start + SIG_SIZE + PUBKEY_SIZE:start + _NONCE_AT],
+            nonce,
+            self._heap_view[offset:offset + length],
+        )
+
+    def __getitem__(self, number: int) -> ArchiveRecord:
+        return self.get(number)
+
+    def index_of(self, signature: bytes) -> Optional[int]:
+        '''
+        Número del registro con esa firma (64 bytes crudos), o None
+        '''
+        if len(signature) != SIG_SIZE:
+            return None
+        return self._lookup(bytes(signature))
+
+    def find(self, signature: bytes) -> Optional[ArchiveRecord]:
+        '''
+        Registro con esa firma, o None
+        '''
+        number = self.index_of(signature)
+        return None if number is None else self.get(number)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[ArchiveRecord]:
+        for number in range(self._count):
+            yield self.get(number)
+
+    # --------------------------------------------------------
+    # Escritura
+    # --------------------------------------------------------
+    def append(self, signed_tx: Any) -> int:
+        '''
+        Agrega un paquete ya verificado (JSON, binario o bytes, lo mismo que
+        acepta verify_signed_tx) y regresa su número de registro
+        - ValueError si no es Ed25519 o si la firma ya está en el archivo
+        '''
+        if self.readonly:
+            raise ValueError("Archivo abierto solo para lectura")
+        if self._count >= MAX_RECORDS:
+            raise ValueError("El archivo llegó al máximo de registros")
+
+        if isinstance(signed_tx, (bytes, bytearray, memoryview)):
+            signed_tx = parse_envelope(signed_tx, exact=True)
+        if isinstance(signed_tx, BinaryEnvelope):
+            scheme = signed_tx.sig_scheme
+            signature, pubkey = bytes(signed_tx.signature), bytes(signed_tx.pubkey)
+            tx_bytes = signed_tx.tx_bytes
+            nonce = signed_tx.tx.get("nonce", 0)
+        else:
+            scheme = signed_tx.get("sig_scheme", "Ed25519")
+            signature = base64.b64decode(signed_tx["signature_b64"])
+            pubkey = base64.b64decode(signed_tx["pubkey_b64"])
+            tx_bytes = canonical_bytes(signed_tx["tx"])
+            nonce = signed_tx["tx"].get("nonce", 0)
+        if scheme != "Ed25519" or len(signature) != SIG_SIZE or len(pubkey) != PUBKEY_SIZE:
+            raise ValueError("El archivo solo guarda paquetes Ed25519 (firma de 64 bytes, llave de 32)")
+
+        existing = self._lookup(signature)
+        if existing is not None:
+            raise ValueError(f"La firma ya está en el archivo (registro {existing})")
+
+        if isinstance(nonce, bool) or not isinstance(nonce, int) or not 0 <= nonce < NONCE_LIMIT:
+            raise ValueError(f"El nonce debe ser un entero entre 0 y 2**64 - 1: {nonce!r}")
+        if len(tx_bytes) >= 2 ** 32:
+            raise ValueError(f"Transacción demasiado grande ({len(tx_bytes)} bytes)")
+
+        # El slot se arma antes de escribir nada: si algo falla, heap.bin y
+        # slots.bin quedan como estaban
+        address = bytes.fromhex(derive_address_btc_style(pubkey)[2:])
+        slot = _SLOT.pack(signature, pubkey, address, nonce, self._heap_end, len(tx_bytes))
+        number = self._count
+        try:
+            self._heap_f.write(tx_bytes)
+            self._slots_f.write(slot)
+        except BaseException:
+            self._rollback()
+            raise
+        self._heap_end += len(tx_bytes)
+        self._count += 1
+
+        if 2 * self._count > self._capacity:
+            self._map()
+            self._rebuild_index(self._capacity * 2)
+        else:
+            self._insert(self._index_mm, self._capacity, signature, number)
+            self._indexed = self._count
+            _INDEX_HEADER.pack_into(self._index_mm, 0, _INDEX_MAGIC, VERSION, self._capacity, self._count)
+        return number
+
+    def _rollback(self) -> None:
+        '''
+        Deshace una escritura a medias: heap.bin y slots.bin vuelven a
+        terminar en el último registro completo
+        '''
+        for f, end in ((self._heap_f, self._heap_end), (self._slots_f, _HEADER.size + self._count * SLOT_SIZE)):
+            with contextlib.suppress(OSError):
+                f.flush()
+            f.truncate(end)
+            f.seek(end)
+
+    def append_many(self, envelopes: Iterable[Any]) -> List[int]:
+        '''
+        Agrega varios paquetes y hace un solo flush al final
+        '''
+        numbers = [self.append(env) for env in envelopes]
+        self.flush()
+        return numbers
+
+    def flush(self) -> None:
+        if self.readonly:
+            return
+        for f in (self._heap_f, self._slots_f):
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        if self._index_mm is not None:
+            self._index_mm.flush()
+
+    def close(self) -> None:
+        if self._slots_f is not None:
+            self.flush()
+            self._slots_f.close()
+            self._heap_f.close()
+            self._slots_f = self._heap_f = None
+        # Si quedan registros con memoryview vivos, el mapa se libera cuando mueran
+        for mm in (self._index_mm, self._slots_mm, self._heap_mm):
+            if mm is not None:
+                with contextlib.suppress(BufferError):
+                    mm.close()
+        self._index_mm = self._slots_mm = self._heap_mm = None
+        self._slots_view = self._heap_view = None
+        self._mapped = 0
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_archive(directory: Path | str, **kwargs: Any) -> Archive:
+    '''
+    Abre (o crea) un archivo de transacciones
+    '''
+    return Archive(directory, **kwargs)
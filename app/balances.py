@@ -0,0 +1,244 @@
+# app/balances.py
+
+"""
+Saldos por dirección calculados a partir de las transacciones verificadas.
+
+Antes había que volver a recorrer todo el historial y sumar cada "value"
+(un string decimal) para conocer un saldo. Aquí:
+
+1) Punto fijo: cada "value" se convierte a un entero de unidades mínimas
+   (DECIMALS decimales). Las sumas son enteros de Python: exactas, sin
+   floats y sin límite de tamaño. "10.5" -> 10500000000000000000.
+2) El historial es la bitácora de verificadas (ledger/verified). El motor
+   recuerda la posición del último registro aplicado; sync() solo lee lo
+   que se agregó después, así que cada actualización cuesta O(tx nuevas).
+3) Checkpoints: cada snapshot_every transacciones (y al terminar) el estado
+   completo se escribe como snapshot (archivo temporal + os.replace,
+   atómico) junto con esa posición. Al reiniciar se carga el snapshot y
+   solo se reaplica lo posterior. Si el proceso muere entre checkpoints,
+   lo no guardado se vuelve a aplicar desde la posición anterior: nunca se
+   cuenta dos veces.
+4) rebuild() descarta el snapshot y recorre todo el historial en flujo
+   (sin cargarlo en memoria), guardando checkpoints en el camino.
+
+Cada transacción resta "value" al remitente y lo suma al destinatario, así
+que el saldo es el neto de lo enviado y lo recibido (puede ser negativo si
+la dirección envió más de lo que este historial le registra).
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from .envelope import envelope_tx, load_envelope
+from .ledger import LedgerCorruption, Position, open_ledger
+
+# Archivo por defecto del snapshot de saldos
+BALANCES_PATH = Path("balances.json")
+# Decimales del punto fijo (unidades mínimas por unidad)
+DECIMALS = 18
+# Cada cuántas transacciones aplicadas se escribe un checkpoint
+DEFAULT_SNAPSHOT_EVERY = 100000
+
+_SCALE = 10 ** DECIMALS
+_VALUE_RE = re.compile(r"^(\d+)(?:\.(\d+))?$")
+_SNAPSHOT_VERSION = 1
+
+
+def to_units(value: Union[int, str]) -> int:
+    '''
+    "value" de una transacción -> entero de unidades mínimas
+    - Acepta enteros y strings "123" o "123.456" (mismo formato que validate_tx)
+    - Más de DECIMALS decimales no se redondea: es un error
+    '''
+    if isinstance(value, bool):
+        raise ValueError(f"Valor inválido: {value!r}")
+    if isinstance(value, int):
+        if value < 0:
+            raise ValueError(f"Valor negativo: {value!r}")
+        return value * _SCALE
+    match = _VALUE_RE.match(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError(f"Valor inválido: {value!r}")
+    whole, frac = match.group(1), (match.group(2) or "").rstrip("0")
+    if len(frac) > DECIMALS:
+        raise ValueError(f"Valor con más de {DECIMALS} decimales: {value!r}")
+    return int(whole) * _SCALE + int(frac.ljust(DECIMALS, "0") or 0)
+
+
+def format_units(units: int) -> str:
+    '''
+    Unidades mínimas -> string decimal sin ceros de más ("10.5", "-3", "0")
+    '''
+    sign = "-" if units < 0 else ""
+    whole, frac = divmod(abs(units), _SCALE)
+    if not frac:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{str(frac).rjust(DECIMALS, '0').rstrip('0')}"
+
+
+class BalanceEngine:
+    '''
+    Saldos en punto fijo por dirección, con checkpoints en disco
+    - apply() / apply_many(): suman transacciones ya verificadas
+    - sync(ledger_dir): aplica lo que se agregó a la bitácora desde el último checkpoint
+    - rebuild(ledger_dir): recalcula todo el historial en flujo
+    - balance(address) / balances(): consulta (en unidades mínimas)
+    '''
+
+    def __init__(
+        self,
+        snapshot_path: Optional[Path | str] = BALANCES_PATH,
+        snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+        fsync: bool = True,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        if snapshot_every <= 0:
+            raise ValueError("snapshot_every debe ser positivo")
+        self.snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.log = log
+
+        self._balances: Dict[str, int] = {}
+        # Posición del último registro de la bitácora ya aplicado
+        self.position: Optional[Position] = None
+        self.applied = 0
+        self.skipped = 0
+        self._load()
+
+    # --------------------------------------------------------
+    # Snapshot
+    # --------------------------------------------------------
+    def _load(self) -> None:
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return
+        data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        if data.get("version") != _SNAPSHOT_VERSION or data.get("decimals") != DECIMALS:
+            raise ValueError(f"Snapshot de saldos incompatible: {self.snapshot_path}")
+        self._balances = {addr: int(units) for addr, units in data["balances"].items()}
+        self.position = tuple(data["position"]) if data.get("position") is not None else None
+        self.applied = int(data.get("applied", 0))
+        self.skipped = int(data.get("skipped", 0))
+
+    def checkpoint(self) -> None:
+        '''
+        Escribe el estado completo y la posición actual (atómico)
+        '''
+        if self.snapshot_path is None:
+            return
+        data = {
+            "version": _SNAPSHOT_VERSION,
+            "decimals": DECIMALS,
+            "position": list(self.position) if self.position is not None else None,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            # Como string: los saldos pueden exceder lo que otros lectores de JSON aceptan como entero
+            "balances": {addr: str(units) for addr, units in self._balances.items()},
+        }
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def reset(self) -> None:
+        self._balances = {}
+        self.position = None
+        self.applied = 0
+        self.skipped = 0
+
+    # --------------------------------------------------------
+    # Aplicar transacciones
+    # --------------------------------------------------------
+    def apply(self, tx: Dict[str, Any]) -> None:
+        '''
+        Resta "value" al remitente y lo suma al destinatario
+        - ValueError si "value" no es un monto válido (el estado no cambia)
+        '''
+        units = to_units(tx["value"])
+        sender = str(tx["from"]).lower()
+        recipient = str(tx["to"]).lower()
+        balances = self._balances
+        balances[sender] = balances.get(sender, 0) - units
+        balances[recipient] = balances.get(recipient, 0) + units
+        self.applied += 1
+
+    def apply_many(self, txs: Iterable[Dict[str, Any]]) -> int:
+        '''
+        Aplica varias transacciones (sin checkpoint); regresa cuántas
+        '''
+        count = 0
+        for tx in txs:
+            self.apply(tx)
+            count += 1
+        return count
+
+    def sync(self, ledger_dir: Path | str) -> int:
+        '''
+        Aplica los registros de la bitácora posteriores al último checkpoint
+        Regresa cuántos registros nuevos se leyeron
+        - Si la posición guardada ya no existe (otra bitácora, o se borró),
+          se recalcula todo con rebuild()
+        '''
+        ledger = open_ledger(ledger_dir, readonly=True)
+        start = self.position
+        if start is not None:
+            try:
+                ledger.read_at(start)
+            except (LedgerCorruption, FileNotFoundError):
+                self.log(f"[!] La posición {start} del snapshot no existe en {ledger_dir}; se recalcula todo")
+                return self.rebuild(ledger_dir)
+
+        count = 0
+        since_checkpoint = 0
+        for position, payload in ledger.records(start=start):
+            # records() incluye la posición inicial, que ya estaba aplicada
+            if position == start:
+                continue
+            try:
+                self.apply(envelope_tx(load_envelope(payload)))
+            except (KeyError, TypeError, ValueError) as e:
+                self.skipped += 1
+                self.log(f"[!] Registro {position} omitido: {e}")
+            self.position = position
+            count += 1
+            since_checkpoint += 1
+            if since_checkpoint >= self.snapshot_every:
+                self.checkpoint()
+                since_checkpoint = 0
+        if count:
+            self.checkpoint()
+        return count
+
+    def rebuild(self, ledger_dir: Path | str) -> int:
+        '''
+        Descarta el estado y recorre todo el historial (con checkpoints en el camino)
+        '''
+        self.reset()
+        count = self.sync(ledger_dir)
+        self.checkpoint()
+        return count
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def balance(self, address: str) -> int:
+        return self._balances.get(address.lower(), 0)
+
+    def balances(self) -> Dict[str, int]:
+        return dict(self._balances)
+
+    def __len__(self) -> int:
+        return len(self._balances)
+
+
+def open_balances(snapshot_path: Path | str = BALANCES_PATH, **kwargs: Any) -> BalanceEngine:
+    '''
+    Carga el motor de saldos desde su snapshot (o vacío si no existe)
+    '''
+    return BalanceEngine(snapshot_path, **kwargs)
@@ -0,0 +1,428 @@
+# app/bench.py
+
+"""
+Suite de benchmarks de las rutas críticas del wallet.
+
+Uso:
+    python -m app.bench [--sizes 1,1000,100000] [--only a,b] [--out resultados.json]
+    python -m app.bench --list
+
+Para cada benchmark y cada tamaño reporta:
+- ops/s (sobre el tiempo medido de las operaciones)
+- latencia p50 / p99 / media en microsegundos
+- RSS máximo del proceso (KiB); con --isolate cada benchmark corre en su
+  propio proceso y el valor es solo suyo
+
+El tamaño es el número de transacciones (o de direcciones en el estado de
+nonces). Los benchmarks de Argon2 usan --kdf-iterations en lugar del
+tamaño porque cada derivación cuesta decenas o cientos de milisegundos;
+cli_startup también, porque cada operación arranca un intérprete nuevo.
+Los resultados en JSON incluyen datos de la máquina y del commit para
+poder comparar corridas.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .canonicalizer import canonical_bytes, canonical_json_generic
+from .crypto_utils import derive_address_btc_style, derive_aes_key
+from .keystore import create_keystore, load_keystore, save_keystore, unlock_keystore
+from .nonce_store import open_nonce_store
+from .session import SignerSession
+from .signer import sign_transaction
+from .tx_model import create_tx
+from .verifier import PUBKEY_CACHE, verify_signed_tx
+
+DEFAULT_SIZES = (1, 1000)
+DEFAULT_KDF_ITERATIONS = 3
+PASSPHRASE = "bench-passphrase"
+# Remitentes distintos para los benchmarks de verificación
+BENCH_SENDERS = 16
+
+# Arranque de la CLI: presupuesto del import de app.cli (ms, según -X importtime)
+CLI_IMPORT_BUDGET_MS = 120.0
+# Paquetes que "import app.cli" no debe cargar (cada comando los importa si los usa)
+HEAVY_IMPORTS = ("cryptography", "argon2", "multiprocessing")
+ROOT = Path(__file__).resolve().parents[1]
+
+# Transacción típica (mismo esquema que los vectores dorados)
+SAMPLE_TX: Dict[str, Any] = {
+    "from": "0x9ea155f9bb1bda0a9343fe1d6e63b014cfded1b4",
+    "to": "0x1234567890abcdef",
+    "value": "50.55",
+    "nonce": 2,
+    "timestamp": "2025-12-02T00:24:19.557533Z",
+    "gas_limit": 50000,
+    "data_hex": "0xabcdef",
+}
+
+
+# ------------------------------------------------------------
+# Contexto compartido (keystores, sesiones, directorio temporal)
+# ------------------------------------------------------------
+class BenchContext:
+    '''
+    Recursos caros que se crean una sola vez y se reutilizan entre benchmarks
+    '''
+
+    def __init__(self, workdir: Path, kdf_iterations: int) -> None:
+        self.workdir = workdir
+        self.kdf_iterations = kdf_iterations
+        self._keystore: Optional[Dict[str, Any]] = None
+        self._sessions: Optional[List[SignerSession]] = None
+
+    @property
+    def keystore(self) -> Dict[str, Any]:
+        if self._keystore is None:
+            self._keystore = create_keystore(PASSPHRASE)
+        return self._keystore
+
+    @property
+    def keystore_path(self) -> Path:
+        path = self.workdir / "bench.keystore.json"
+        if not path.exists():
+            save_keystore(self.keystore, path)
+        return path
+
+    @property
+    def sessions(self) -> List[SignerSession]:
+        if self._sessions is None:
+            self._sessions = [
+                SignerSession(create_keystore(PASSPHRASE), PASSPHRASE, idle_timeout=None)
+                for _ in range(BENCH_SENDERS)
+            ]
+        return self._sessions
+
+    def envelope(self, i: int) -> Dict[str, Any]:
+        '''
+        Paquete firmado número i; cada remitente recibe nonces crecientes
+        '''
+        session = self.sessions[i % BENCH_SENDERS]
+        tx = create_tx(
+            from_addr=session.address, to_addr="0x1234567890abcdef", value=i, nonce=i,
+            timestamp="2025-12-02T00:24:19Z",
+        )
+        return session.sign(tx)
+
+
+def _timed(n: int, op: Callable[[Any], Any], prepare: Optional[Callable[[int], Any]] = None) -> array:
+    '''
+    Ejecuta op n veces y regresa la latencia de cada llamada en ns
+    - prepare(i) construye el argumento fuera de la medición
+    '''
+    latencies = array("q")
+    clock = time.perf_counter_ns
+    for i in range(n):
+        arg = prepare(i) if prepare is not None else None
+        t0 = clock()
+        op(arg)
+        latencies.append(clock() - t0)
+    return latencies
+
+
+# ------------------------------------------------------------
+# Benchmarks: cada uno recibe (contexto, tamaño) y regresa latencias en ns
+# ------------------------------------------------------------
+def bench_derive_aes_key(ctx: BenchContext, size: int) -> array:
+    salt = os.urandom(16)
+    return _timed(ctx.kdf_iterations, lambda _: derive_aes_key(PASSPHRASE, salt))
+
+
+def bench_create_keystore(ctx: BenchContext, size: int) -> array:
+    return _timed(ctx.kdf_iterations, lambda _: create_keystore(PASSPHRASE))
+
+
+def bench_load_keystore(ctx: BenchContext, size: int) -> array:
+    path = ctx.keystore_path
+    return _timed(size, lambda _: load_keystore(path))
+
+
+def bench_unlock_keystore(ctx: BenchContext, size: int) -> array:
+    keystore = ctx.keystore
+    return _timed(ctx.kdf_iterations, lambda _: unlock_keystore(keystore, PASSPHRASE))
+
+
+def bench_canonical_bytes(ctx: BenchContext, size: int) -> array:
+    return _timed(size, lambda _: canonical_bytes(SAMPLE_TX))
+
+
+def bench_canonical_bytes_generic(ctx: BenchContext, size: int) -> array:
+    return _timed(size, lambda _: canonical_json_generic(SAMPLE_TX).encode("utf-8"))
+
+
+def bench_sign_transaction(ctx: BenchContext, size: int) -> array:
+    '''
+    Firmado de una sola transacción: incluye cargar y descifrar el keystore
+    '''
+    path = str(ctx.keystore_path)
+    address = ctx.keystore["address"]
+
+    def prepare(i: int) -> Dict[str, Any]:
+        return create_tx(from_addr=address, to_addr="0xdeadbeef", value=i, nonce=i)
+
+    return _timed(ctx.kdf_iterations, lambda tx: sign_transaction(path, PASSPHRASE, tx), prepare)
+
+
+def bench_session_sign(ctx: BenchContext, size: int) -> array:
+    '''
+    Firmado con la llave ya descifrada (SignerSession): solo Ed25519
+    '''
+    session = ctx.sessions[0]
+
+    def prepare(i: int) -> Dict[str, Any]:
+        return create_tx(from_addr=session.address, to_addr="0xdeadbeef", value=i, nonce=i)
+
+    return _timed(size, session.sign, prepare)
+
+
+def bench_verify_no_nonce(ctx: BenchContext, size: int) -> array:
+    PUBKEY_CACHE.clear()
+    return _timed(size, lambda env: verify_signed_tx(env, enforce_nonce=False), ctx.envelope)
+
+
+def bench_verify_nonce_store(ctx: BenchContext, size: int) -> array:
+    '''
+    Verificación con nonces en un almacén abierto (fsync en cada tx)
+    '''
+    PUBKEY_CACHE.clear()
+    path = ctx.workdir / f"verify_store_{size}.json"
+    with open_nonce_store(path) as store:
+        return _timed(size, lambda env: verify_signed_tx(env, nonce_store=store), ctx.envelope)
+
+
+def bench_verify_nonce_path(ctx: BenchContext, size: int) -> array:
+    '''
+    Verificación con nonce_state_path: abre el almacén en cada llamada
+    '''
+    PUBKEY_CACHE.clear()
+    path = str(ctx.workdir / f"verify_path_{size}.json")
+    return _timed(size, lambda env: verify_signed_tx(env, nonce_state_path=path), ctx.envelope)
+
+
+def bench_nonce_store_advance(ctx: BenchContext, size: int) -> array:
+    '''
+    Escritura de estado de nonces: un advance por tx, con fsync en cada una
+    '''
+    path = ctx.workdir / f"advance_{size}.json"
+    with open_nonce_store(path) as store:
+        return _timed(size, lambda i: store.advance(f"0x{i % 1000:040x}", i), lambda i: i)
+
+
+def bench_nonce_store_load(ctx: BenchContext, size: int) -> array:
+    '''
+    Lectura del estado de nonces con "size" direcciones (snapshot + log)
+    '''
+    path = ctx.workdir / f"load_{size}.json"
+    path.write_text(json.dumps({f"0x{i:040x}": i for i in range(size)}), encoding="utf-8")
+    # Algunas actualizaciones en el log para incluir su lectura
+    with open_nonce_store(path, flush_every=None, compact_every=None) as store:
+        for i in range(min(size, 1000)):
+            store.set(f"0x{i:040x}", size + i)
+
+    def op(_: Any) -> None:
+        open_nonce_store(path, compact_every=None).close()
+
+    return _timed(max(ctx.kdf_iterations, 3), op)
+
+
+def bench_derive_address(ctx: BenchContext, size: int) -> array:
+    def prepare(i: int) -> bytes:
+        return i.to_bytes(32, "big")
+
+    return _timed(size, derive_address_btc_style, prepare)
+
+
+def import_times(module: str = "app.cli") -> Dict[str, Tuple[int, int]]:
+    '''
+    Importa "module" en un intérprete nuevo con python -X importtime
+    Regresa {módulo: (tiempo propio us, tiempo acumulado us)} de todo lo cargado
+    '''
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=ROOT, check=True,
+    )
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        except ValueError:
+            # Encabezado "self [us] | cumulative | imported package"
+            continue
+    return times
+
+
+def bench_cli_startup(ctx: BenchContext, size: int) -> array:
+    '''
+    Tiempo de "import app.cli" en un intérprete nuevo (lo que paga cada
+    invocación de wallet antes de ejecutar el comando)
+    '''
+    return array("q", (import_times("app.cli")["app.cli"][1] * 1000 for _ in range(ctx.kdf_iterations)))
+
+
+# Benchmarks cuyo número de operaciones es --kdf-iterations y no el tamaño:
+# corren una sola vez aunque se pidan varios tamaños
+KDF_BOUND = {"derive_aes_key", "create_keystore", "unlock_keystore", "sign_transaction", "cli_startup"}
+
+BENCHMARKS: Dict[str, Callable[[BenchContext, int], array]] = {
+    "derive_aes_key": bench_derive_aes_key,
+    "create_keystore": bench_create_keystore,
+    "load_keystore": bench_load_keystore,
+    "unlock_keystore": bench_unlock_keystore,
+    "canonical_bytes": bench_canonical_bytes,
+    "canonical_bytes_generic": bench_canonical_bytes_generic,
+    "sign_transaction": bench_sign_transaction,
+    "session_sign": bench_session_sign,
+    "verify_no_nonce": bench_verify_no_nonce,
+    "verify_nonce_store": bench_verify_nonce_store,
+    "verify_nonce_path": bench_verify_nonce_path,
+    "nonce_store_advance": bench_nonce_store_advance,
+    "nonce_store_load": bench_nonce_store_load,
+    "derive_address": bench_derive_address,
+    "cli_startup": bench_cli_startup,
+}
+
+
+# ------------------------------------------------------------
+# Estadísticas y ejecución
+# ------------------------------------------------------------
+def peak_rss_kib() -> Optional[int]:
+    '''
+    RSS máximo del proceso en KiB (None si la plataforma no lo reporta)
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo reporta en bytes, Linux en KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def summarize(name: str, size: int, latencies: array) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    n = len(ordered)
+    total_ns = sum(ordered)
+
+    def pct(p: float) -> float:
+        return ordered[min(n - 1, int(p * n))] / 1000 if n else 0.0
+
+    return {
+        "name": name,
+        "size": size,
+        "ops": n,
+        "ops_per_sec": n / (total_ns / 1e9) if total_ns else 0.0,
+        "p50_us": pct(0.50),
+        "p99_us": pct(0.99),
+        "mean_us": total_ns / n / 1000 if n else 0.0,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def run_benchmark(name: str, size: int, workdir: str, kdf_iterations: int) -> Dict[str, Any]:
+    '''
+    Corre un solo benchmark (punto de entrada para procesos aislados)
+    '''
+    ctx = BenchContext(Path(workdir), kdf_iterations)
+    return summarize(name, size, BENCHMARKS[name](ctx, size))
+
+
+def run_benchmarks(
+    names: List[str],
+    sizes: List[int],
+    kdf_iterations: int = DEFAULT_KDF_ITERATIONS,
+    isolate: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    '''
+    Corre cada benchmark con cada tamaño y produce un resultado por corrida
+    '''
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Benchmarks desconocidos: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="wallet-bench-") as workdir:
+        ctx = BenchContext(Path(workdir), kdf_iterations)
+        for name in names:
+            for size in ([kdf_iterations] if name in KDF_BOUND else sizes):
+                if isolate:
+                    # Proceso nuevo por benchmark: su RSS máximo no se mezcla con otros
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                        yield pool.submit(run_benchmark, name, size, workdir, kdf_iterations).result()
+                else:
+                    yield summarize(name, size, BENCHMARKS[name](ctx, size))
+
+
+def machine_info() -> Dict[str, Any]:
+    '''
+    Datos para comparar corridas entre máquinas y commits
+    '''
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=ROOT,
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.bench", description="Benchmarks del wallet")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Tamaños separados por coma (número de tx), p. ej. 1,1000,1000000")
+    parser.add_argument("--only", default=None, help="Benchmarks a correr, separados por coma")
+    parser.add_argument("--kdf-iterations", type=int, default=DEFAULT_KDF_ITERATIONS,
+                        help="Repeticiones para los benchmarks que derivan con Argon2")
+    parser.add_argument("--isolate", action="store_true", help="Un proceso por benchmark (RSS por benchmark)")
+    parser.add_argument("--out", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--list", action="store_true", help="Lista los benchmarks disponibles")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    results = []
+    print(f"{'benchmark':26s} {'size':>9s} {'ops/s':>14s} {'p50 us':>11s} {'p99 us':>11s} {'rss KiB':>10s}")
+    for r in run_benchmarks(names, sizes, args.kdf_iterations, args.isolate):
+        results.append(r)
+        rss = r["peak_rss_kib"] if r["peak_rss_kib"] is not None else "-"
+        print(f"{r['name']:26s} {r['size']:9d} {r['ops_per_sec']:14,.1f} "
+              f"{r['p50_us']:11.1f} {r['p99_us']:11.1f} {rss:>10}", flush=True)
+
+    if args.out:
+        report = {"meta": machine_info(), "results": results}
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"[+] Resultados guardados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
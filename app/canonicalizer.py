@@ -1,23 +1,91 @@
 # app/canonicalizer.py
+import itertools
 import json
-from typing import Any, Dict
+import time
+from json.encoder import encode_basestring
+from typing import Any, Dict, Optional, Tuple
+
+from . import metrics
+
+# Codificador genérico reutilizable (json.dumps crea uno nuevo en cada llamada)
+_GENERIC_ENCODER = json.JSONEncoder(
+    sort_keys=True,        # Orden lexicográfico de llaves
+    separators=(",", ":"), # JSON compacto y determinístico
+    ensure_ascii=False,    # Mantiene UTF-8 intacto
+)
+
+# Llaves del esquema de transacción, ya en orden lexicográfico
+TX_KEYS = ("data_hex", "from", "gas_limit", "nonce", "timestamp", "to", "value")
+
+
+def _compile_tx_shapes() -> Dict[frozenset, Tuple[Tuple[str, ...], str]]:
+    '''
+    Precalcula una plantilla por cada combinación posible de llaves del
+    esquema, p. ej. '{"from":%s,"nonce":%s,...}', con las llaves ya ordenadas
+    '''
+    shapes: Dict[frozenset, Tuple[Tuple[str, ...], str]] = {}
+    for size in range(len(TX_KEYS) + 1):
+        for keys in itertools.combinations(TX_KEYS, size):
+            template = "{" + ",".join(encode_basestring(k) + ":%s" for k in keys) + "}"
+            shapes[frozenset(keys)] = (keys, template)
+    return shapes
+
+
+_TX_SHAPES = _compile_tx_shapes()
+
+
+def _fast_tx_json(data: Dict[str, Any]) -> Optional[str]:
+    '''
+    Camino rápido para transacciones: solo llaves del esquema y valores str/int.
+    Regresa None si el diccionario no encaja y hay que usar el camino genérico.
+    - type() exacto a propósito: bool, float o subclases van al genérico
+    '''
+    shape = _TX_SHAPES.get(frozenset(data))
+    if shape is None:
+        return None
+    keys, template = shape
+
+    values = []
+    for key in keys:
+        value = data[key]
+        value_type = type(value)
+        if value_type is str:
+            values.append(encode_basestring(value))
+        elif value_type is int:
+            values.append(int.__repr__(value))
+        else:
+            return None
+    return template % tuple(values)
+
+
+def canonical_json_generic(data: Dict[str, Any]) -> str:
+    '''
+    JSON canónico por el camino general de json (cualquier diccionario)
+    '''
+    return _GENERIC_ENCODER.encode(data)
 
 
 def canonical_json(data: Dict[str, Any]) -> str:
     """
     JSON canónico:
     - Llaves ordenadas lexicográficamente.
+    - Las transacciones usan un codificador precompilado; el resultado es
+      idéntico byte por byte al del camino genérico.
     """
-    return json.dumps(
-        data,
-        sort_keys=True,        # Orden lexicográfico de llaves
-        separators=(",", ":"), # JSON compacto y determinístico
-        ensure_ascii=False,    # Mantiene UTF-8 intacto
-    )
+    if type(data) is dict:
+        fast = _fast_tx_json(data)
+        if fast is not None:
+            return fast
+    return canonical_json_generic(data)
 
 
 def canonical_bytes(data: Dict[str, Any]) -> bytes:
     """
     JSON canónico codificado en UTF-8 (para firmar/verificar).
     """
+    if metrics.ENABLED:
+        start = time.perf_counter_ns()
+        encoded = canonical_json(data).encode("utf-8")
+        metrics.observe("canonical_bytes", time.perf_counter_ns() - start)
+        return encoded
     return canonical_json(data).encode("utf-8")
@@ -1,14 +1,24 @@
 # app/cli.py
 import argparse
+import csv
 import getpass
 import json
+import os
+import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
 
-from .keystore import create_keystore, save_keystore, load_keystore
+# Solo módulos ligeros al cargar la CLI. signer, session y verifier cargan
+# cryptography (decenas de ms) y se importan dentro del comando que los usa,
+# así "--help", "address" o "convert" arrancan sin el backend criptográfico.
+from .crypto_utils import calibrate_kdf
+from .keystore import create_keystore, save_keystore, load_keystore, rekey_files
 from .tx_model import create_tx
-from .signer import sign_transaction
-from .verifier import verify_signed_tx
+from .nonce_store import open_nonce_store
+from .envelope import BINARY_SUFFIX, decode_envelope, encode_envelope, envelope_tx, is_binary_envelope, load_envelope
+from .ledger import LedgerCorruption, open_ledger
+from . import metrics
 
 # Donde se guardan las transacciones firmadas 
 OUTBOX_DIR = Path("outbox")
@@ -16,8 +26,17 @@ OUTBOX_DIR = Path("outbox")
 INBOX_DIR = Path("inbox")
 # Donde se guardan las transacciones verificadas
 VERIFIED_DIR = Path("verified")
+# Bitácoras segmentadas (opción --ledger) en lugar de un archivo por tx
+OUTBOX_LEDGER = Path("ledger") / "outbox"
+VERIFIED_LEDGER = Path("ledger") / "verified"
+# Registros que se agregan a la bitácora con un solo fsync
+LEDGER_BATCH = 1024
 # Donde se guarda keystore
 DEFAULT_KEYSTORE = Path("wallet.keystore.json")
+# Memoria total (KiB) de Argon2 para "rekey" en paralelo
+DEFAULT_REKEY_MEM_BUDGET = 1024 * 1024
+# Modos de --profile (los mismos que app.profiling.PROFILE_MODES)
+PROFILE_MODES = ("cpu", "mem")
 
 
 def ensure_dirs() -> None:
@@ -43,13 +62,81 @@ def cmd_init(args: argparse.Namespace) -> None:
     if pw1 != pw2:
         print("Las passphrases no coinciden. Abortando.")
         return
-    # Genera keystore cifrado
-    ks = create_keystore(pw1)
+    # Genera keystore cifrado (con los parámetros de Argon2 pedidos, si hay)
+    ks = create_keystore(pw1, t_cost=args.t_cost, m_cost=args.m_cost, parallelism=args.parallelism)
     # Guarda keystore en Json
     save_keystore(ks, DEFAULT_KEYSTORE)
     print(f"[+] Keystore creado en {DEFAULT_KEYSTORE}")
 
 
+def parse_mem_kib(text: str) -> int:
+    '''
+    Convierte una cantidad de memoria a KiB: "65536" (KiB), "512K", "64M", "1G"
+    '''
+    units = {"K": 1, "M": 1024, "G": 1024 * 1024}
+    text = text.strip().upper().removesuffix("IB").removesuffix("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def cmd_kdf_calibrate(args: argparse.Namespace) -> None:
+    '''
+    Mide esta máquina y sugiere parámetros de Argon2id
+    - Usa la mayor memoria posible hasta --max-mem y ajusta t_cost a --target-ms
+    '''
+    params = calibrate_kdf(args.target_ms, args.max_mem, args.parallelism)
+    if args.json:
+        print(json.dumps(params))
+        return
+    print(f"[*] Argon2id calibrado: t_cost={params['t_cost']} m_cost={params['m_cost']} KiB "
+          f"({params['m_cost'] / 1024:.0f} MiB) parallelism={params['parallelism']} "
+          f"-> {params['measured_ms']:.0f} ms")
+    print(f"[*] Para usarlos: wallet init --t-cost {params['t_cost']} "
+          f"--m-cost {params['m_cost']} --parallelism {params['parallelism']}")
+
+
+def cmd_rekey(args: argparse.Namespace) -> None:
+    '''
+    Re-cifra uno o varios keystores con otra passphrase y/o otros parámetros
+    de Argon2 (por defecto, el keystore de la billetera)
+    - La passphrase actual se pide una vez y se usa para todos
+    - Cada archivo se reescribe de forma atómica
+    - En paralelo con --workers, sin pasar de --mem-budget de memoria de Argon2
+    '''
+    # Sin duplicados, en el orden dado
+    paths = list(dict.fromkeys(args.paths or [str(DEFAULT_KEYSTORE)]))
+    if args.t_cost is None and args.m_cost is None and args.parallelism is None and not args.new_passphrase:
+        print("Nada que cambiar: usa --new-passphrase y/o --t-cost/--m-cost/--parallelism.")
+        return
+
+    passphrase = getpass.getpass("Passphrase actual: ")
+    new_passphrase = None
+    if args.new_passphrase:
+        pw1 = getpass.getpass("Nueva passphrase: ")
+        pw2 = getpass.getpass("Repite passphrase: ")
+        if pw1 != pw2:
+            print("Las passphrases no coinciden. Abortando.")
+            return
+        new_passphrase = pw1
+
+    start = time.perf_counter()
+    failed = 0
+    for path, error in rekey_files(
+        paths, passphrase, new_passphrase,
+        t_cost=args.t_cost, m_cost=args.m_cost, parallelism=args.parallelism,
+        workers=args.workers, mem_budget_kib=args.mem_budget,
+    ):
+        if error is None:
+            print(f"[+] Keystore re-cifrado: {path}")
+        else:
+            failed += 1
+            print(f"[!] {path}: {error}")
+
+    elapsed = time.perf_counter() - start
+    print(f"[*] {len(paths) - failed} de {len(paths)} keystores re-cifrados en {elapsed:.2f} s")
+
+
 def cmd_address(args: argparse.Namespace) -> None:
     '''
     Muestra la dirección de la cartera
@@ -70,7 +157,11 @@ def cmd_sign(args: argparse.Namespace) -> None:
         --nonce: Número secuencial
         --gas_limit: Límite de gas
         --data_hex: Datos extra
+        --binary: Guardar en formato binario compacto (.wtx)
+        --ledger: Agregar a la bitácora ledger/outbox en lugar de un archivo
     '''
+    from .signer import sign_transaction
+
     # Creación de directorios necesarios
     ensure_dirs()
     # Carga keystores guardados
@@ -91,30 +182,805 @@ def cmd_sign(args: argparse.Namespace) -> None:
     signed = sign_transaction(str(DEFAULT_KEYSTORE), passphrase, tx)
 
     # Guardamos resultado
-    out_path = OUTBOX_DIR / f"tx_{tx['nonce']}.json"
-    out_path.write_text(json.dumps(signed, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.ledger:
+        with open_ledger(OUTBOX_LEDGER) as ledger:
+            seq, offset = ledger.append(encode_envelope(signed))
+        print(f"[+] Transacción firmada agregada a {OUTBOX_LEDGER}/ (segmento {seq}, offset {offset})")
+        return
+    if args.binary:
+        out_path = OUTBOX_DIR / f"tx_{tx['nonce']}{BINARY_SUFFIX}"
+        out_path.write_bytes(encode_envelope(signed))
+    else:
+        out_path = OUTBOX_DIR / f"tx_{tx['nonce']}.json"
+        out_path.write_text(json.dumps(signed, indent=2, ensure_ascii=False), encoding="utf-8")
     print(f"[+] Transacción firmada guardada en {out_path}")
 
 
+def _read_tx_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    '''
+    Lee registros de transacciones uno por uno (sin cargar todo el archivo)
+    - jsonl: un objeto JSON por línea, se ignoran líneas vacías
+    - csv: encabezado con columnas to,value,nonce[,gas_limit,data_hex,timestamp]
+    Produce (número de línea, registro); si la línea no se puede leer el
+    registro es la excepción, para reportarla sin detener el lote
+    '''
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for lineno, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield lineno, e
+
+
+def _record_to_tx(record: Any, from_addr: str, from_csv: bool = False) -> Dict[str, Any]:
+    '''
+    Construye la transacción de un registro de entrada con create_tx
+    - Las columnas vacías del CSV se toman como no proporcionadas
+    - nonce y gas_limit: en CSV se convierte el texto con int(); en JSON
+      deben ser enteros (1.9 o true no se redondean a 1)
+    '''
+    if isinstance(record, Exception):
+        raise ValueError(f"Registro ilegible: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Cada registro debe ser un objeto con to, value y nonce")
+
+    def opt(name: str) -> Any:
+        value = record.get(name)
+        return None if value == "" else value
+
+    for field in ("to", "value", "nonce"):
+        if opt(field) is None:
+            raise ValueError(f"Falta el campo obligatorio '{field}'.")
+
+    def integer(name: str) -> Optional[int]:
+        value = opt(name)
+        if value is None:
+            return None
+        if from_csv and isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"El campo '{name}' debe ser un entero.") from None
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"El campo '{name}' debe ser un entero.")
+        return value
+
+    return create_tx(
+        from_addr=from_addr,
+        to_addr=record["to"],
+        value=record["value"],
+        nonce=integer("nonce"),
+        gas_limit=integer("gas_limit"),
+        data_hex=opt("data_hex"),
+        timestamp=opt("timestamp"),
+    )
+
+
+def cmd_sign_batch(args: argparse.Namespace) -> None:
+    '''
+    Firma muchas transacciones desde un archivo JSONL/CSV (o stdin)
+
+    - Pide la passphrase una sola vez y descifra el keystore una sola vez
+    - Procesa en flujo: lee, construye, valida, firma y escribe registro por
+      registro, así la memoria no crece con el tamaño de la entrada
+    - Escribe NDJSON en --out ("-" para stdout) o un archivo por tx en outbox/
+    '''
+    from .session import SignerSession
+
+    ensure_dirs()
+    ks = load_keystore(DEFAULT_KEYSTORE)
+    from_addr = ks.get("address")
+
+    # Formato de entrada: explícito o deducido de la extensión
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.input.lower().endswith(".csv") else "jsonl"
+
+    # El reporte va a stderr si los resultados salen por stdout
+    to_stdout = args.out == "-"
+    report = sys.stderr if to_stdout else sys.stdout
+
+    # Se abre la entrada antes de pedir la passphrase para fallar pronto
+    in_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+
+    passphrase = getpass.getpass("Passphrase: ")
+    try:
+        # Sin idle_timeout: la sesión vive solo lo que dure el lote
+        session = SignerSession(ks, passphrase, idle_timeout=None)
+    except Exception:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        raise
+
+    out_stream = None
+    ledger = None
+    pending: List[bytes] = []
+    if to_stdout:
+        out_stream = sys.stdout
+    elif args.out is not None:
+        out_stream = open(args.out, "w", encoding="utf-8")
+    elif args.ledger:
+        ledger = open_ledger(OUTBOX_LEDGER)
+
+    signed_count = 0
+    error_count = 0
+    start = time.perf_counter()
+    try:
+        with session:
+            for lineno, record in _read_tx_records(in_stream, fmt):
+                try:
+                    signed = session.sign(_record_to_tx(record, from_addr, from_csv=fmt == "csv"))
+                except Exception as e:
+                    error_count += 1
+                    print(f"[!] Línea {lineno}: {e}", file=sys.stderr)
+                    continue
+
+                if out_stream is not None:
+                    out_stream.write(json.dumps(signed, separators=(",", ":"), ensure_ascii=False) + "\n")
+                elif ledger is not None:
+                    # Se agrega por bloques: un fsync cada LEDGER_BATCH transacciones
+                    pending.append(encode_envelope(signed))
+                    if len(pending) >= LEDGER_BATCH:
+                        ledger.append_many(pending)
+                        pending.clear()
+                else:
+                    out_path = OUTBOX_DIR / f"tx_{signed['tx']['nonce']}.json"
+                    out_path.write_text(json.dumps(signed, indent=2, ensure_ascii=False), encoding="utf-8")
+                signed_count += 1
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not None and out_stream is not sys.stdout:
+            out_stream.close()
+        if ledger is not None:
+            if pending:
+                ledger.append_many(pending)
+            ledger.close()
+
+    elapsed = time.perf_counter() - start
+    rate = signed_count / elapsed if elapsed > 0 else 0.0
+    destination = args.out if args.out is not None else f"{OUTBOX_LEDGER if args.ledger else OUTBOX_DIR}/"
+    print(
+        f"[+] {signed_count} transacciones firmadas, {error_count} con error "
+        f"en {elapsed:.3f} s ({rate:.1f} tx/s) -> {destination}",
+        file=report,
+    )
+
+
 def cmd_recv(args: argparse.Namespace) -> None:
     '''
     Verificar transacciones
     '''
     ensure_dirs()
 
+    # Verificación masiva de un directorio completo
+    if args.dir is not None:
+        _recv_dir(Path(args.dir), args.workers, args.ledger)
+        return
+
+    # Un archivo NDJSON con muchos paquetes, leído en flujo
+    if args.ndjson is not None:
+        _recv_ndjson(Path(args.ndjson), args.start, args.ledger)
+        return
+
+    from .tx_index import open_tx_index
+    from .verifier import verify_signed_tx
+
     in_path = Path(args.path)
-    # Obtiene transacción firmada
-    signed = json.loads(in_path.read_text(encoding="utf-8"))
+    # Obtiene transacción firmada (JSON o binaria)
+    raw = in_path.read_bytes()
+    binary = is_binary_envelope(raw)
+    signed = raw if binary else json.loads(raw)
 
     # Verifica firma
     result = verify_signed_tx(signed)
     print("[*] Resultado de verificación:", result)
 
-    # Si es valida, la mueve a "verified"
-    if result["valid"]:
+    # Si es valida, la mueve a "verified" (o a la bitácora con --ledger)
+    if not result["valid"]:
+        return
+    if args.ledger:
+        with open_ledger(VERIFIED_LEDGER) as ledger:
+            position = ledger.append(_ledger_record(raw))
+        location, where = VERIFIED_LEDGER, f"agregada a {VERIFIED_LEDGER}/"
+    else:
         out_path = VERIFIED_DIR / in_path.name
+        if binary:
+            out_path.write_bytes(raw)
+        else:
+            out_path.write_text(json.dumps(signed, indent=2, ensure_ascii=False), encoding="utf-8")
+        position, location, where = None, out_path, f"almacenada en {out_path}"
+
+    # Se agrega al índice de consultas ("wallet query")
+    with open_tx_index() as index:
+        index.add(envelope_tx(load_envelope(raw)), location, position)
+    print(f"[+] Transacción válida {where}")
+
+
+# Archivos que se mandan juntos a cada proceso trabajador
+RECV_CHUNK_SIZE = 64
+
+
+def _ledger_record(raw: bytes) -> bytes:
+    '''
+    Contenido de un archivo recibido -> registro de la bitácora (paquete binario)
+    '''
+    if is_binary_envelope(raw):
+        return raw
+    return encode_envelope(json.loads(raw))
+
+
+def _verify_inbox_files(paths: List[str]) -> List[Tuple[str, Dict[str, Any], Optional[str], Any]]:
+    '''
+    Trabajo de cada proceso: solo la parte sin estado (dirección y firma)
+    Regresa (ruta, resultado, dirección derivada, tx) por archivo
+    '''
+    from .verifier import verify_signature
+
+    out = []
+    for path in paths:
+        try:
+            signed = load_envelope(Path(path).read_bytes())
+            result, address = verify_signature(signed)
+            tx = envelope_tx(signed) if result["valid"] else None
+        except Exception as e:
+            result, address, tx = {"valid": False, "reason": f"exception: {e}"}, None, None
+        out.append((path, result, address, tx))
+    return out
+
+
+def _chunked_inbox_scan(directory: Path, size: int) -> Iterator[List[str]]:
+    '''
+    Recorre el directorio con os.scandir (sin listar todo de golpe)
+    y agrupa los .json y .wtx en bloques de "size" rutas
+    '''
+    chunk: List[str] = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith((".json", BINARY_SUFFIX)) and entry.is_file():
+                chunk.append(entry.path)
+                if len(chunk) >= size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_verified_chunks(directory: Path, workers: int) -> Iterator[List[Tuple[str, Dict[str, Any], Optional[str], Any]]]:
+    '''
+    Verifica firmas en paralelo con un pool de procesos
+    - Mantiene un número acotado de bloques en vuelo para no cargar todo el
+      directorio en memoria como futuros pendientes
+    - Con --metrics-dir cada proceso regresa lo que midió y se suma aquí
+    '''
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+    chunks = _chunked_inbox_scan(directory, RECV_CHUNK_SIZE)
+    if workers <= 1:
+        for chunk in chunks:
+            yield _verify_inbox_files(chunk)
+        return
+
+    measured = metrics.ENABLED
+
+    def submit(pool: ProcessPoolExecutor, chunk: List[str]) -> Any:
+        if measured:
+            return pool.submit(metrics.call_measured, _verify_inbox_files, chunk)
+        return pool.submit(_verify_inbox_files, chunk)
+
+    def result(fut: Any) -> List[Tuple[str, Dict[str, Any], Optional[str], Any]]:
+        if not measured:
+            return fut.result()
+        results, state = fut.result()
+        metrics.merge(state)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(submit(pool, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield result(fut)
+        for fut in as_completed(pending):
+            yield result(fut)
+
+
+def _recv_dir(directory: Path, workers: Optional[int], use_ledger: bool = False) -> None:
+    '''
+    Verifica todos los .json y .wtx de un directorio
+
+    1) Firmas y direcciones en paralelo (sin estado)
+    2) Nonces en orden determinista (dirección, nonce, nombre), con el estado
+       cargado una vez; cada nonce aceptado se escribe al log en ese momento
+       y el fsync se hace una sola vez, al cerrar el almacén
+    3) Los válidos se mueven con os.replace (atómico) a verified/, sin
+       volver a serializarlos; con use_ledger se agregan a ledger/verified
+       y se borran del directorio
+    4) Se agregan al índice de consultas en una sola transacción de SQLite
+    '''
+    from .tx_index import open_tx_index
+    from .verifier import NONCE_STATE_PATH, check_nonce
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    total = 0
+    rejected = 0
+    candidates: List[Tuple[str, Any, str]] = []
+    txs: Dict[str, Dict[str, Any]] = {}
+    for results in _iter_verified_chunks(directory, workers):
+        for path, result, address, tx in results:
+            total += 1
+            if result["valid"]:
+                candidates.append((address, tx.get("nonce", 0), path))
+                txs[path] = tx
+            else:
+                rejected += 1
+                print(f"[!] {Path(path).name}: {result['reason']}")
+
+    # El orden de aplicación de nonces no depende del orden del pool
+    def order(item: Tuple[str, Any, str]) -> Tuple[str, int, str]:
+        address, nonce, path = item
+        try:
+            return address, int(nonce), path
+        except (TypeError, ValueError):
+            return address, -1, path
+    candidates.sort(key=order)
+
+    accepted: List[str] = []
+    # Modo compartido: cada nonce aceptado llega al log de inmediato (bajo el
+    # lock, visible para otros recv); flush_every=None deja un solo fsync,
+    # al cerrar, para todo el directorio
+    with open_nonce_store(NONCE_STATE_PATH, flush_every=None) as nonce_store:
+        for address, nonce, path in candidates:
+            result = check_nonce(nonce_store, address, nonce)
+            if result["valid"]:
+                accepted.append(path)
+            else:
+                rejected += 1
+                print(f"[!] {Path(path).name}: {result['reason']}")
+
+    # Primero se persisten los nonces (al cerrar el almacén): si algo falla al
+    # mover, un reintento rechaza los archivos como replay en lugar de
+    # aceptarlos dos veces
+    entries = []
+    if use_ledger:
+        with open_ledger(VERIFIED_LEDGER) as ledger:
+            for i in range(0, len(accepted), LEDGER_BATCH):
+                chunk = accepted[i:i + LEDGER_BATCH]
+                # Se leen antes de tomar el lock: un error de lectura no deja
+                # registros a medias en la bitácora
+                records = [_ledger_record(Path(p).read_bytes()) for p in chunk]
+                positions = ledger.append_many(records)
+                for path, position in zip(chunk, positions):
+                    os.unlink(path)
+                    entries.append((txs[path], VERIFIED_LEDGER, position))
+    else:
+        for path in accepted:
+            dest = VERIFIED_DIR / Path(path).name
+            os.replace(path, dest)
+            entries.append((txs[path], dest, None))
+
+    with open_tx_index() as index:
+        index.add_many(entries)
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(
+        f"[*] {total} archivos verificados con {workers} procesos en {elapsed:.3f} s "
+        f"({rate:.1f} tx/s): {len(accepted)} válidos -> {VERIFIED_LEDGER if use_ledger else VERIFIED_DIR}/, "
+        f"{rejected} rechazados"
+    )
+
+
+def _recv_ndjson(path: Path, start: int = 0, use_ledger: bool = False) -> None:
+    '''
+    Verifica un archivo NDJSON de paquetes firmados, uno a la vez (mmap)
+    - Las líneas mal formadas se reportan con su offset y no detienen el archivo
+    - Por bloques de LEDGER_BATCH: se verifican (firma y nonce), se
+      persisten los nonces y después se guardan los válidos en
+      verified/<archivo>_<registro>.json (o en ledger/verified) y en el índice
+    - start: número de registro desde el cual reanudar (usa <archivo>.idx)
+    - Si algo falla o se interrumpe (Ctrl+C) a mitad de un bloque, lo ya
+      aceptado del bloque se guarda igual (sus nonces ya están en el log) y
+      se imprime el registro desde el cual reanudar
+    '''
+    from .ndjson_reader import open_ndjson
+    from .tx_index import open_tx_index
+    from .verifier import NONCE_STATE_PATH, verify_signed_tx
+
+    begin = time.perf_counter()
+    total = 0
+    accepted = 0
+    rejected = 0
+    next_record = start
+
+    with open_ndjson(path) as reader, \
+            open_nonce_store(NONCE_STATE_PATH, flush_every=None) as nonce_store, \
+            open_tx_index() as index:
+        ledger = open_ledger(VERIFIED_LEDGER) if use_ledger else None
+
+        def store(valid: List[Tuple[int, Dict[str, Any]]]) -> None:
+            # Los nonces llegan a disco antes que las transacciones (ver _recv_dir)
+            nonce_store.flush()
+            entries = []
+            if ledger is not None:
+                positions = ledger.append_many(encode_envelope(env) for _, env in valid)
+                entries = [(env["tx"], VERIFIED_LEDGER, pos) for (_, env), pos in zip(valid, positions)]
+            else:
+                for number, env in valid:
+                    out_path = VERIFIED_DIR / f"{path.stem}_{number}.json"
+                    out_path.write_text(json.dumps(env, indent=2, ensure_ascii=False), encoding="utf-8")
+                    entries.append((env["tx"], out_path, None))
+            index.add_many(entries)
+
+        valid: List[Tuple[int, Dict[str, Any]]] = []
+        finished = False
+        try:
+            for record in reader.records(start=start):
+                total += 1
+                if record["ok"]:
+                    result = verify_signed_tx(record["envelope"], nonce_store=nonce_store)
+                else:
+                    result = {"valid": False, "reason": record["error"]}
+                # Solo después de verificarlo: un registro interrumpido se vuelve a leer al reanudar
+                next_record = record["index"] + 1
+                if not result["valid"]:
+                    rejected += 1
+                    print(f"[!] Registro {record['index']} (offset {record['offset']}): {result['reason']}")
+                    continue
+                valid.append((record["index"], record["envelope"]))
+                if len(valid) >= LEDGER_BATCH:
+                    store(valid)
+                    accepted += len(valid)
+                    valid = []
+            finished = True
+        finally:
+            try:
+                # También al fallar: lo aceptado del bloque ya tiene su nonce en el log
+                if valid:
+                    store(valid)
+                    accepted += len(valid)
+            finally:
+                if ledger is not None:
+                    ledger.close()
+                elapsed = time.perf_counter() - begin
+                rate = total / elapsed if elapsed > 0 else 0.0
+                print(
+                    f"[{'*' if finished else '!'}] {total} registros de {path} verificados en {elapsed:.3f} s "
+                    f"({rate:.1f} tx/s): {accepted} válidos -> {VERIFIED_LEDGER if use_ledger else VERIFIED_DIR}/, "
+                    f"{rejected} rechazados; siguiente registro: {next_record}"
+                )
+
+
+def cmd_serve_inbox(args: argparse.Namespace) -> None:
+    '''
+    Servicio que vigila inbox/ y verifica cada transacción que llega
+    - Válidas -> verified/, rechazadas -> quarantine/ con su motivo
+    - Termina lo pendiente y sale con SIGTERM o Ctrl+C
+    '''
+    import asyncio
+    from .inbox_service import InboxService, QUARANTINE_DIR
+    from .tx_index import TX_INDEX_PATH
+
+    ensure_dirs()
+    service = InboxService(
+        INBOX_DIR, VERIFIED_DIR, QUARANTINE_DIR,
+        workers=args.workers,
+        queue_depth=args.queue_depth,
+        poll_interval=args.poll_interval,
+        use_inotify=not args.poll,
+        index_path=TX_INDEX_PATH,
+    )
+    asyncio.run(service.run(install_signal_handlers=True))
+
+
+def cmd_serve_signer(args: argparse.Namespace) -> None:
+    '''
+    Servicio de firmado sobre un socket Unix
+    - Desbloquea el keystore una sola vez y firma lo que pidan los clientes
+    - Se bloquea tras --idle-timeout segundos sin firmar
+    '''
+    import asyncio
+    from .session import SignerSession
+    from .signer_service import SignerService
+
+    ks = load_keystore(DEFAULT_KEYSTORE)
+    passphrase = getpass.getpass("Passphrase: ")
+    idle_timeout = args.idle_timeout if args.idle_timeout > 0 else None
+    try:
+        session = SignerSession(ks, passphrase, idle_timeout=idle_timeout)
+    except Exception as e:
+        print(f"[!] {e}")
+        return
+
+    service = SignerService(
+        session,
+        socket_path=args.socket,
+        max_rate=args.max_rate,
+        burst=args.burst,
+        max_batch=args.max_batch,
+        batch_window_ms=args.batch_window_ms,
+    )
+    try:
+        asyncio.run(service.run(install_signal_handlers=True))
+    except RuntimeError as e:
+        # Otro serve-signer ya atiende en ese socket
+        session.close()
+        print(f"[!] {e}")
+
+
+def cmd_ledger_migrate(args: argparse.Namespace) -> None:
+    '''
+    Pasa un directorio con un archivo por tx (outbox/, verified/) a una bitácora
+    - Orden de llegada: fecha de modificación y luego nombre
+    - Con --delete borra cada archivo cuando su registro ya está en disco
+    '''
+    src = Path(args.src)
+    files = sorted(
+        (p for p in src.iterdir() if p.is_file() and p.name.endswith((".json", BINARY_SUFFIX))),
+        key=lambda p: (p.stat().st_mtime_ns, p.name),
+    )
+    migrated = 0
+    failed = 0
+    with open_ledger(args.dest) as ledger:
+        for i in range(0, len(files), LEDGER_BATCH):
+            records: List[bytes] = []
+            done: List[Path] = []
+            for path in files[i:i + LEDGER_BATCH]:
+                try:
+                    records.append(_ledger_record(path.read_bytes()))
+                    done.append(path)
+                except Exception as e:
+                    failed += 1
+                    print(f"[!] {path.name}: {e}", file=sys.stderr)
+            ledger.append_many(records)
+            migrated += len(records)
+            if args.delete:
+                for path in done:
+                    path.unlink()
+    print(f"[+] {migrated} transacciones migradas de {src}/ a {args.dest}/, {failed} con error")
+
+
+def cmd_ledger_verify(args: argparse.Namespace) -> None:
+    '''
+    Revisa los CRC de todos los registros y segmentos de una bitácora
+    '''
+    ledger = open_ledger(args.path, readonly=True)
+    problems = ledger.verify()
+    count = 0
+    try:
+        for _ in ledger.records():
+            count += 1
+    except LedgerCorruption:
+        # verify() ya lo reportó; se cuentan los registros hasta ahí
+        pass
+    for problem in problems:
+        print(f"[!] {problem}")
+    state = "íntegra" if not problems else f"{len(problems)} problemas"
+    print(f"[*] {args.path}: {len(ledger.segments())} segmentos, {count} registros, {state}")
+    if problems:
+        sys.exit(1)
+
+
+def cmd_ledger_cat(args: argparse.Namespace) -> None:
+    '''
+    Imprime las transacciones de una bitácora como NDJSON, en orden
+    '''
+    ledger = open_ledger(args.path, readonly=True)
+    for payload in ledger:
+        sys.stdout.write(json.dumps(decode_envelope(payload), separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def _archive_sources(src: Path) -> Iterator[Tuple[str, Any]]:
+    '''
+    (nombre, paquete) de cada transacción en un directorio de archivos, una
+    bitácora o un archivo NDJSON
+    '''
+    if src.is_file():
+        from .ndjson_reader import open_ndjson
+
+        with open_ndjson(src) as reader:
+            for record in reader:
+                name = f"{src.name}#{record['index']}"
+                yield name, record["envelope"] if record["ok"] else ValueError(record["error"])
+        return
+    ledger = open_ledger(src, readonly=True)
+    if ledger.segments():
+        for (seq, offset), payload in ledger.records():
+            yield f"{src}@{seq}:{offset}", load_envelope(payload)
+        return
+    files = sorted(
+        (p for p in src.iterdir() if p.is_file() and p.name.endswith((".json", BINARY_SUFFIX))),
+        key=lambda p: (p.stat().st_mtime_ns, p.name),
+    )
+    for path in files:
+        try:
+            yield path.name, load_envelope(path.read_bytes())
+        except ValueError as e:
+            yield path.name, e
+
+
+def cmd_archive_add(args: argparse.Namespace) -> None:
+    '''
+    Agrega transacciones al archivo de acceso aleatorio
+    - Fuentes: directorio de archivos (verified/), bitácora o archivo NDJSON
+    - Solo entran paquetes con firma válida (no se revisan nonces); las
+      firmas que ya están en el archivo se omiten
+    '''
+    from .archive import open_archive
+    from .verifier import verify_many
+
+    added = skipped = failed = 0
+    start = time.perf_counter()
+    with open_archive(args.dest) as archive:
+        for src in args.src:
+            items = _archive_sources(Path(src))
+            while True:
+                chunk = [item for _, item in zip(range(LEDGER_BATCH), items)]
+                if not chunk:
+                    break
+                envelopes = [env for _, env in chunk if not isinstance(env, Exception)]
+                results = iter(verify_many(envelopes, enforce_nonce=False))
+                for name, env in chunk:
+                    result = {"valid": False, "reason": str(env)} if isinstance(env, Exception) else next(results)
+                    if not result["valid"]:
+                        failed += 1
+                        print(f"[!] {name}: {result['reason']}", file=sys.stderr)
+                        continue
+                    try:
+                        archive.append(env)
+                        added += 1
+                    except ValueError as e:
+                        skipped += 1
+                        print(f"[*] {name}: {e}", file=sys.stderr)
+                archive.flush()
+        total = len(archive)
+    elapsed = time.perf_counter() - start
+    print(f"[+] {added} transacciones agregadas a {args.dest}/ ({total} en total) en {elapsed:.3f} s, "
+          f"{skipped} omitidas, {failed} con error")
+
+
+def cmd_archive_get(args: argparse.Namespace) -> None:
+    '''
+    Imprime una transacción del archivo, por número de registro o por firma
+    - La firma puede ir en base64 (como signature_b64) o en hexadecimal
+    '''
+    import base64
+    import binascii
+
+    from .archive import open_archive
+
+    try:
+        archive = open_archive(args.path, readonly=True)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[!] {e}", file=sys.stderr)
+        sys.exit(1)
+    with archive:
+        if args.signature is not None:
+            try:
+                signature = bytes.fromhex(args.signature)
+            except ValueError:
+                try:
+                    signature = base64.b64decode(args.signature, validate=True)
+                except binascii.Error:
+                    signature = b""
+            record = archive.find(signature)
+            if record is None:
+                print("[!] No hay ninguna transacción con esa firma", file=sys.stderr)
+                sys.exit(1)
+        else:
+            try:
+                record = archive.get(args.record)
+            except IndexError as e:
+                print(f"[!] {e}", file=sys.stderr)
+                sys.exit(1)
+        envelope = record.to_envelope()
+        print(json.dumps({"record": record.number, "address": record.address, **envelope},
+                         indent=None if args.compact else 2, ensure_ascii=False))
+
+
+def cmd_query(args: argparse.Namespace) -> None:
+    '''
+    Consulta el índice de transacciones verificadas
+    - Filtros: remitente, destinatario, rango de nonces y ventana de tiempo
+    - Imprime NDJSON: metadatos del índice o, con --full, la transacción firmada
+    - --rebuild reconstruye el índice desde verified/ y ledger/verified
+    '''
+    from .tx_index import open_tx_index
+
+    with open_tx_index() as index:
+        if args.rebuild:
+            count = index.rebuild(VERIFIED_DIR, VERIFIED_LEDGER, log=lambda msg: print(msg, file=sys.stderr))
+            print(f"[+] Índice reconstruido: {count} transacciones", file=sys.stderr)
+            return
+        try:
+            rows = index.query(
+                sender=args.sender,
+                recipient=args.recipient,
+                nonce_min=args.nonce_min,
+                nonce_max=args.nonce_max,
+                since=args.since,
+                until=args.until,
+                limit=args.limit,
+            )
+            count = 0
+            for row in rows:
+                record = row.load() if args.full else row.to_dict()
+                sys.stdout.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+                count += 1
+        except ValueError as e:
+            print(f"[!] {e}", file=sys.stderr)
+            sys.exit(1)
+    print(f"[*] {count} transacciones", file=sys.stderr)
+
+
+def cmd_balances(args: argparse.Namespace) -> None:
+    '''
+    Saldos por dirección a partir de las transacciones verificadas
+    - ledger/verified se aplica de forma incremental desde el último checkpoint
+      (balances.json); --rebuild recalcula todo el historial
+    - Los archivos sueltos en verified/ se suman encima en cada ejecución
+    - Imprime NDJSON {"address", "balance"} o solo el saldo de --address
+    '''
+    from .balances import format_units, open_balances
+
+    engine = open_balances(snapshot_every=args.snapshot_every, log=lambda msg: print(msg, file=sys.stderr))
+    start = time.perf_counter()
+    new = engine.rebuild(VERIFIED_LEDGER) if args.rebuild else engine.sync(VERIFIED_LEDGER)
+
+    # verified/ no tiene orden de llegada estable: no entra al checkpoint
+    files = 0
+    if VERIFIED_DIR.is_dir():
+        with os.scandir(VERIFIED_DIR) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith((".json", BINARY_SUFFIX)):
+                    try:
+                        engine.apply(envelope_tx(load_envelope(Path(entry.path).read_bytes())))
+                        files += 1
+                    except (KeyError, TypeError, ValueError) as e:
+                        print(f"[!] {entry.name}: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    if args.address is not None:
+        print(format_units(engine.balance(args.address)))
+    else:
+        for address, units in sorted(engine.balances().items()):
+            sys.stdout.write(json.dumps({"address": address, "balance": format_units(units)}) + "\n")
+    print(
+        f"[*] {len(engine)} direcciones: {new} registros nuevos de {VERIFIED_LEDGER}/ y {files} archivos "
+        f"de {VERIFIED_DIR}/ en {elapsed:.3f} s",
+        file=sys.stderr,
+    )
+
+
+def cmd_convert(args: argparse.Namespace) -> None:
+    '''
+    Convierte una transacción firmada entre JSON y binario (.wtx)
+    - El formato de entrada se detecta por su contenido
+    - La firma no cambia: la conversión no pierde información
+    '''
+    in_path = Path(args.path)
+    raw = in_path.read_bytes()
+
+    if is_binary_envelope(raw):
+        out_path = Path(args.out) if args.out else in_path.with_suffix(".json")
+        signed = decode_envelope(raw)
         out_path.write_text(json.dumps(signed, indent=2, ensure_ascii=False), encoding="utf-8")
-        print(f"[+] Transacción válida almacenada en {out_path}")
+    else:
+        out_path = Path(args.out) if args.out else in_path.with_suffix(BINARY_SUFFIX)
+        out_path.write_bytes(encode_envelope(json.loads(raw)))
+
+    print(f"[+] {in_path} ({len(raw)} bytes) -> {out_path} ({out_path.stat().st_size} bytes)")
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -125,13 +991,49 @@ def build_parser() -> argparse.ArgumentParser:
     '''
     Estructura de los comandos
     '''
+    # Opciones globales (van antes del subcomando)
+    parser.add_argument("--metrics-dir", default=os.environ.get(metrics.METRICS_DIR_ENV),
+                        help="Medir tiempos por etapa y escribir wallet_metrics.json y wallet_metrics.prom "
+                             f"en este directorio (o la variable {metrics.METRICS_DIR_ENV})")
+    parser.add_argument("--metrics-interval", type=float, default=metrics.DEFAULT_EXPORT_INTERVAL,
+                        help="Segundos entre escrituras de las métricas (por defecto 10)")
+    parser.add_argument("--profile", nargs="?", const="cpu", default=None, choices=PROFILE_MODES,
+                        help="Perfilar el comando: cpu (cProfile: .pstats y pilas colapsadas) o mem "
+                             "(tracemalloc: resumen de memoria); el reporte va a stderr")
+    parser.add_argument("--profile-out", default=None,
+                        help="Prefijo de los archivos del perfil (por defecto wallet-profile-<comando>-<fecha>)")
+    parser.add_argument("--profile-top", type=int, default=20, help="Funciones o líneas en el resumen del perfil")
+
     # Creación de subcomandos
     sub = parser.add_subparsers(dest="command", required=True)
 
     # Llama a la función "cmd_init()" con el comando "init"
     p_init = sub.add_parser("init", help="Crear un nuevo keystore cifrado")
+    p_init.add_argument("--t-cost", type=int, default=None, help="Argon2id: número de pasadas (opcional)")
+    p_init.add_argument("--m-cost", type=parse_mem_kib, default=None, help="Argon2id: memoria, p. ej. 65536 (KiB) o 64M")
+    p_init.add_argument("--parallelism", type=int, default=None, help="Argon2id: carriles en paralelo (opcional)")
     p_init.set_defaults(func=cmd_init)
 
+    # Llama a la función "cmd_kdf_calibrate()" con el comando "kdf-calibrate"
+    p_cal = sub.add_parser("kdf-calibrate", help="Medir la máquina y sugerir parámetros de Argon2id")
+    p_cal.add_argument("--target-ms", type=float, required=True, help="Tiempo objetivo por derivación (ms)")
+    p_cal.add_argument("--max-mem", type=parse_mem_kib, required=True, help="Memoria máxima, p. ej. 65536 (KiB), 256M o 1G")
+    p_cal.add_argument("--parallelism", type=int, default=None, help="Carriles (por defecto, min(4, núcleos))")
+    p_cal.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    p_cal.set_defaults(func=cmd_kdf_calibrate)
+
+    # Llama a la función "cmd_rekey()" con el comando "rekey"
+    p_rekey = sub.add_parser("rekey", help="Re-cifrar keystores con otra passphrase o parámetros de Argon2")
+    p_rekey.add_argument("paths", nargs="*", help="Keystores a re-cifrar (por defecto, el de la billetera)")
+    p_rekey.add_argument("--new-passphrase", action="store_true", help="Pedir una passphrase nueva")
+    p_rekey.add_argument("--t-cost", type=int, default=None, help="Argon2id: nuevo número de pasadas")
+    p_rekey.add_argument("--m-cost", type=parse_mem_kib, default=None, help="Argon2id: nueva memoria, p. ej. 64M")
+    p_rekey.add_argument("--parallelism", type=int, default=None, help="Argon2id: nuevos carriles")
+    p_rekey.add_argument("--workers", type=int, default=None, help="Keystores en paralelo (por defecto, núcleos)")
+    p_rekey.add_argument("--mem-budget", type=parse_mem_kib, default=DEFAULT_REKEY_MEM_BUDGET,
+                         help="Memoria total de Argon2 entre todos los workers, p. ej. 1G (por defecto 1G)")
+    p_rekey.set_defaults(func=cmd_rekey)
+
     # Llama a la función "cmd_address()" con el comando "address"
     p_addr = sub.add_parser("address", help="Mostrar la dirección de la billetera")
     p_addr.set_defaults(func=cmd_address)
@@ -143,16 +1045,146 @@ def build_parser() -> argparse.ArgumentParser:
     p_sign.add_argument("--nonce", required=True, help="Nonce del remitente (uint64)")
     p_sign.add_argument("--gas_limit", type=int, default=None, help="Gas limit (opcional)")
     p_sign.add_argument("--data_hex", default=None, help="Payload hex opcional (0x...)")
+    p_sign.add_argument("--binary", action="store_true", help="Guardar en formato binario compacto (.wtx)")
+    p_sign.add_argument("--ledger", action="store_true", help="Agregar a la bitácora ledger/outbox en lugar de un archivo")
     p_sign.set_defaults(func=cmd_sign)
 
+    # Llama a la función "cmd_sign_batch()" con el comando "sign-batch"
+    p_batch = sub.add_parser("sign-batch", help="Firmar muchas transacciones desde JSONL/CSV")
+    p_batch.add_argument("--input", required=True, help="Archivo JSONL o CSV de transacciones ('-' para stdin)")
+    p_batch.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                         help="Formato de entrada (por defecto se deduce de la extensión)")
+    p_batch.add_argument("--out", default=None,
+                         help="Archivo NDJSON de salida ('-' para stdout); si se omite, escribe en outbox/")
+    p_batch.add_argument("--ledger", action="store_true", help="Sin --out: agregar a la bitácora ledger/outbox")
+    p_batch.set_defaults(func=cmd_sign_batch)
+
     # Llama a la función "cmd_recv()" con el comando "recv" y le agrega su argumento necesario
     p_recv = sub.add_parser("recv", help="Verificar transacción firmada desde un archivo")
-    p_recv.add_argument("--path", required=True, help="Ruta al JSON de transacción firmada")
+    recv_src = p_recv.add_mutually_exclusive_group(required=True)
+    recv_src.add_argument("--path", help="Ruta a la transacción firmada (JSON o .wtx)")
+    recv_src.add_argument("--dir", help="Directorio con transacciones firmadas (.json/.wtx) a verificar en bloque")
+    recv_src.add_argument("--ndjson", help="Archivo NDJSON con un paquete firmado por línea (se lee en flujo)")
+    p_recv.add_argument("--start", type=int, default=0,
+                        help="Con --ndjson: número de registro desde el cual reanudar (por defecto 0)")
+    p_recv.add_argument("--workers", type=int, default=None,
+                        help="Procesos para verificar firmas con --dir (por defecto, núcleos de CPU)")
+    p_recv.add_argument("--ledger", action="store_true",
+                        help="Guardar las válidas en la bitácora ledger/verified en lugar de verified/")
     p_recv.set_defaults(func=cmd_recv)
 
+    # Llama a la función "cmd_serve_inbox()" con el comando "serve-inbox"
+    p_serve = sub.add_parser("serve-inbox", help="Vigilar inbox/ y verificar cada transacción que llegue")
+    p_serve.add_argument("--workers", type=int, default=None, help="Hilos de verificación (por defecto, núcleos)")
+    p_serve.add_argument("--queue-depth", type=int, default=1024, help="Archivos en espera como máximo (por defecto 1024)")
+    p_serve.add_argument("--poll", action="store_true", help="Revisar el directorio periódicamente en lugar de usar inotify")
+    p_serve.add_argument("--poll-interval", type=float, default=1.0, help="Segundos entre revisiones con --poll (por defecto 1.0)")
+    p_serve.set_defaults(func=cmd_serve_inbox)
+
+    # Llama a la función "cmd_serve_signer()" con el comando "serve-signer"
+    p_signer = sub.add_parser("serve-signer", help="Servicio de firmado sobre un socket Unix")
+    p_signer.add_argument("--socket", default="wallet-signer.sock", help="Ruta del socket (por defecto wallet-signer.sock)")
+    p_signer.add_argument("--idle-timeout", type=float, default=300.0,
+                          help="Segundos sin firmar antes de bloquearse (0 = nunca; por defecto 300)")
+    p_signer.add_argument("--max-rate", type=float, default=None, help="Peticiones por segundo como máximo (opcional)")
+    p_signer.add_argument("--burst", type=float, default=None, help="Ráfaga máxima sobre --max-rate (por defecto, igual a --max-rate)")
+    p_signer.add_argument("--max-batch", type=int, default=64, help="Peticiones firmadas por lote como máximo (por defecto 64)")
+    p_signer.add_argument("--batch-window-ms", type=float, default=2.0,
+                          help="Espera máxima para juntar un lote en ms (por defecto 2)")
+    p_signer.set_defaults(func=cmd_serve_signer)
+
+    # Comandos de la bitácora segmentada: "ledger migrate|verify|cat"
+    p_ledger = sub.add_parser("ledger", help="Bitácora segmentada de transacciones (migrar, revisar, leer)")
+    ledger_sub = p_ledger.add_subparsers(dest="ledger_command", required=True)
+    p_migrate = ledger_sub.add_parser("migrate", help="Pasar un directorio de archivos .json/.wtx a una bitácora")
+    p_migrate.add_argument("src", help="Directorio de origen (p. ej. verified)")
+    p_migrate.add_argument("dest", help="Directorio de la bitácora (p. ej. ledger/verified)")
+    p_migrate.add_argument("--delete", action="store_true", help="Borrar los archivos ya migrados")
+    p_migrate.set_defaults(func=cmd_ledger_migrate)
+    p_lverify = ledger_sub.add_parser("verify", help="Revisar los CRC de una bitácora")
+    p_lverify.add_argument("path", help="Directorio de la bitácora")
+    p_lverify.set_defaults(func=cmd_ledger_verify)
+    p_cat = ledger_sub.add_parser("cat", help="Imprimir las transacciones de una bitácora como NDJSON")
+    p_cat.add_argument("path", help="Directorio de la bitácora")
+    p_cat.set_defaults(func=cmd_ledger_cat)
+
+    # Comandos del archivo de acceso aleatorio: "archive add|get"
+    p_archive = sub.add_parser("archive", help="Archivo de transacciones con acceso directo por registro o firma")
+    archive_sub = p_archive.add_subparsers(dest="archive_command", required=True)
+    p_aadd = archive_sub.add_parser("add", help="Agregar transacciones desde verified/, una bitácora o un NDJSON")
+    p_aadd.add_argument("dest", help="Directorio del archivo (p. ej. archive)")
+    p_aadd.add_argument("src", nargs="+", help="Directorio de archivos, bitácora o archivo NDJSON")
+    p_aadd.set_defaults(func=cmd_archive_add)
+    p_aget = archive_sub.add_parser("get", help="Imprimir una transacción por número de registro o firma")
+    p_aget.add_argument("path", help="Directorio del archivo")
+    p_aget_key = p_aget.add_mutually_exclusive_group(required=True)
+    p_aget_key.add_argument("--record", type=int, default=None, help="Número de registro (0 es el primero)")
+    p_aget_key.add_argument("--signature", default=None, help="Firma en base64 o hexadecimal")
+    p_aget.add_argument("--compact", action="store_true", help="Imprimir en una sola línea")
+    p_aget.set_defaults(func=cmd_archive_get)
+
+    # Llama a la función "cmd_query()" con el comando "query"
+    p_query = sub.add_parser("query", help="Buscar transacciones verificadas en el índice")
+    p_query.add_argument("--from", dest="sender", default=None, help="Dirección del remitente")
+    p_query.add_argument("--to", dest="recipient", default=None, help="Dirección del destinatario")
+    p_query.add_argument("--nonce-min", type=int, default=None, help="Nonce mínimo (incluido)")
+    p_query.add_argument("--nonce-max", type=int, default=None, help="Nonce máximo (incluido)")
+    p_query.add_argument("--since", default=None, help="Desde esta fecha ISO8601 (incluida)")
+    p_query.add_argument("--until", default=None, help="Hasta esta fecha ISO8601 (excluida)")
+    p_query.add_argument("--limit", type=int, default=None, help="Resultados como máximo")
+    p_query.add_argument("--full", action="store_true", help="Imprimir la transacción firmada completa")
+    p_query.add_argument("--rebuild", action="store_true", help="Reconstruir el índice desde verified/ y ledger/verified")
+    p_query.set_defaults(func=cmd_query)
+
+    # Llama a la función "cmd_balances()" con el comando "balances"
+    p_bal = sub.add_parser("balances", help="Saldos por dirección de las transacciones verificadas")
+    p_bal.add_argument("--address", default=None, help="Imprimir solo el saldo de esta dirección")
+    p_bal.add_argument("--rebuild", action="store_true", help="Recalcular todo el historial en lugar de continuar desde el checkpoint")
+    p_bal.add_argument("--snapshot-every", type=int, default=100000,
+                       help="Transacciones entre checkpoints (por defecto 100000)")
+    p_bal.set_defaults(func=cmd_balances)
+
+    # Llama a la función "cmd_convert()" con el comando "convert"
+    p_conv = sub.add_parser("convert", help="Convertir una transacción firmada entre JSON y binario (.wtx)")
+    p_conv.add_argument("path", help="Transacción firmada de entrada (JSON o .wtx)")
+    p_conv.add_argument("--out", default=None, help="Archivo de salida (por defecto, misma ruta con la otra extensión)")
+    p_conv.set_defaults(func=cmd_convert)
+
     return parser
 
 
+def _expand_profile_flag(parser: argparse.ArgumentParser, argv: List[str]) -> List[str]:
+    '''
+    "--profile" sin valor seguido del subcomando: argparse tomaría el nombre
+    del subcomando como el modo, así que se vuelve "--profile=cpu"
+    - "--profile mem" / "--profile cpu" se dejan como están
+    - Solo se revisan las opciones globales, antes del subcomando
+    '''
+    commands = set()
+    takes_value = set()
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            commands.update(action.choices)
+        elif action.option_strings and action.nargs is None:
+            takes_value.update(action.option_strings)
+
+    out: List[str] = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in commands:
+            return out + argv[i:]
+        if arg == "--profile" and (i + 1 == len(argv) or argv[i + 1] not in PROFILE_MODES):
+            arg = "--profile=cpu"
+        out.append(arg)
+        # El valor de una opción global no es el subcomando aunque se llame igual
+        if arg in takes_value and i + 1 < len(argv):
+            out.append(argv[i + 1])
+            i += 1
+        i += 1
+    return out
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     '''
     Función principal 
@@ -160,9 +1192,21 @@ def main(argv: Optional[list[str]] = None) -> None:
 
     # Generamos parser, y parseamos los argumentos de la linea de comandos
     parser = build_parser()
-    args = parser.parse_args(argv)
+    args = parser.parse_args(_expand_profile_flag(parser, sys.argv[1:] if argv is None else argv))
+    if args.metrics_dir:
+        metrics.enable(args.metrics_dir, interval=args.metrics_interval)
     # Ejecutamos la función asociada
-    args.func(args)
+    try:
+        if args.profile:
+            from .profiling import profile_call
+
+            prefix = args.profile_out or f"wallet-profile-{args.command}-{time.strftime('%Y%m%d-%H%M%S')}"
+            profile_call(lambda: args.func(args), args.profile, prefix, args.profile_top)
+        else:
+            args.func(args)
+    finally:
+        if args.metrics_dir:
+            metrics.disable()
 
 
 if __name__ == "__main__":
@@ -1,12 +1,13 @@
 #/app/crypto_utils.py 
 import os
+import time
 import hashlib
-from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from argon2 import PasswordHasher
-from argon2.low_level import hash_secret_raw, Type as ArgonType
-import base64
-from cryptography.exceptions import InvalidTag
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+# cryptography y argon2 se importan dentro de cada función: cargarlos cuesta
+# decenas de ms y comandos como "wallet address" o "--help" no los usan
 
 # --- Constantes de Seguridad ---
 # Parámetros para Argon2id, como sugiere el documento 
@@ -14,6 +15,7 @@ from cryptography.exceptions import InvalidTag
 ARGON_TIME_COST = 3
 ARGON_MEM_COST_KIB = 65536  # 64 MiB
 ARGON_PARALLELISM = 4
+ARGON_MIN_MEM_COST_KIB = 8192  # Mínimo que acepta la calibración (8 MiB)
 ARGON_KEY_LEN_BYTES = 32  # Para AES-256, necesitamos una clave de 32 bytes
 ARGON_SALT_LEN_BYTES = 16
 AES_NONCE_LEN_BYTES = 12  # Estándar para GCM
@@ -25,6 +27,8 @@ def generate_ed25519_keys():
     Genera un nuevo par de claves Ed25519.
     Retorna (private_key_bytes, public_key_bytes)
     """
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
     private_key = ed25519.Ed25519PrivateKey.generate()
     public_key = private_key.public_key()
     
@@ -34,29 +38,96 @@ def generate_ed25519_keys():
     
     return private_key_bytes, public_key_bytes
 
-def derive_aes_key(passphrase: str, salt: bytes) -> bytes:
+def ed25519_public_key(private_key_bytes: bytes) -> bytes:
+    """
+    Llave pública (32 bytes) de una llave privada Ed25519 ya existente.
+    """
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    private_key = ed25519.Ed25519PrivateKey.from_private_bytes(private_key_bytes)
+    return private_key.public_key().public_bytes_raw()
+
+@metrics.timed("derive_aes_key")
+def derive_aes_key(
+    passphrase: str,
+    salt: bytes,
+    time_cost: int = ARGON_TIME_COST,
+    memory_cost: int = ARGON_MEM_COST_KIB,
+    parallelism: int = ARGON_PARALLELISM,
+) -> bytes:
     """
     Deriva una clave AES de 32 bytes desde una contraseña y un salt
     usando Argon2id.
+    Los parámetros por defecto son las constantes del módulo; para abrir un
+    keystore se usan los que quedaron guardados en su "kdf_params".
     """
+    from argon2.low_level import hash_secret_raw, Type as ArgonType
+
     passphrase_bytes = passphrase.encode('utf-8')
     
     key = hash_secret_raw(
         secret=passphrase_bytes,
         salt=salt,
-        time_cost=ARGON_TIME_COST,
-        memory_cost=ARGON_MEM_COST_KIB,
-        parallelism=ARGON_PARALLELISM,
+        time_cost=time_cost,
+        memory_cost=memory_cost,
+        parallelism=parallelism,
         hash_len=ARGON_KEY_LEN_BYTES,
         type=ArgonType.ID  # Asegura que usamos Argon2id
     )
     return key
 
+def calibrate_kdf(
+    target_ms: float,
+    max_mem_kib: int,
+    parallelism: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Busca parámetros de Argon2id para esta máquina:
+    - Usa toda la memoria permitida (max_mem_kib) si una pasada (t_cost=1)
+      cabe en el tiempo objetivo; si no, la reduce a la mitad hasta que quepa.
+    - Después sube t_cost mientras la derivación siga dentro de target_ms.
+
+    Regresa {"t_cost", "m_cost", "parallelism", "measured_ms"}.
+    """
+    if target_ms <= 0:
+        raise ValueError("target_ms debe ser positivo")
+    if parallelism is None:
+        parallelism = max(1, min(ARGON_PARALLELISM, os.cpu_count() or 1))
+    # Argon2 exige al menos 8 KiB por carril
+    min_mem_kib = max(ARGON_MIN_MEM_COST_KIB, 8 * parallelism)
+    if max_mem_kib < min_mem_kib:
+        raise ValueError(f"max_mem debe ser al menos {min_mem_kib} KiB")
+
+    salt = os.urandom(ARGON_SALT_LEN_BYTES)
+
+    def measure(t_cost: int, m_cost: int) -> float:
+        start = time.perf_counter()
+        derive_aes_key("calibration", salt, t_cost, m_cost, parallelism)
+        return (time.perf_counter() - start) * 1000
+
+    # 1) Memoria: la mayor posible con una sola pasada dentro del objetivo
+    m_cost = max_mem_kib
+    elapsed = measure(1, m_cost)
+    while elapsed > target_ms and m_cost // 2 >= min_mem_kib:
+        m_cost //= 2
+        elapsed = measure(1, m_cost)
+
+    # 2) Tiempo: el costo crece casi lineal con t_cost
+    t_cost = max(1, int(target_ms // max(elapsed, 1e-3)))
+    elapsed = measure(t_cost, m_cost)
+    while t_cost > 1 and elapsed > target_ms:
+        t_cost -= 1
+        elapsed = measure(t_cost, m_cost)
+
+    return {"t_cost": t_cost, "m_cost": m_cost, "parallelism": parallelism, "measured_ms": elapsed}
+
 def encrypt_data(data: bytes, key: bytes) -> tuple[bytes, bytes, bytes]:
     """
     Cifra datos usando AES-256-GCM con una clave dada.
     Retorna (ciphertext, nonce, tag)
     """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     aesgcm = AESGCM(key)
     nonce = os.urandom(AES_NONCE_LEN_BYTES)
     
@@ -71,12 +142,15 @@ def encrypt_data(data: bytes, key: bytes) -> tuple[bytes, bytes, bytes]:
     
     return ciphertext, nonce, tag
 
+@metrics.timed("decrypt_data")
 def decrypt_data(ciphertext: bytes, tag: bytes, nonce: bytes, key: bytes) -> bytes:
     """
     Descifra datos de AES-256-GCM.
     Lanzará una excepción (InvalidTag) si la clave, nonce, tag o
     ciphertext son incorrectos.
     """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     aesgcm = AESGCM(key)
     
     # Juntamos el ciphertext y el tag para la verificación
@@ -92,6 +166,8 @@ def derive_address_btc_style(public_key_bytes: bytes) -> str:
     
     Retorna un string hexadecimal.
     """
+    start = time.perf_counter_ns() if metrics.ENABLED else 0
+
     # 1. SHA-256 de la clave pública
     sha256_hash = hashlib.sha256(public_key_bytes).digest()
     
@@ -103,4 +179,7 @@ def derive_address_btc_style(public_key_bytes: bytes) -> str:
     
     # 3. Convertir a string hexadecimal
     # Agregamos un prefijo '0x' por convención
-    return "0x" + address_bytes.hex()
\ No newline at end of file
+    address = "0x" + address_bytes.hex()
+    if start:
+        metrics.observe("derive_address", time.perf_counter_ns() - start)
+    return address
\ No newline at end of file
@@ -0,0 +1,182 @@
+# app/envelope.py
+
+"""
+Formato binario compacto para transacciones firmadas.
+
+El paquete JSON (sign_transaction) guarda firma y llave pública en base64 y
+se escribe con indent=2. El formato binario guarda los bytes crudos:
+
+    offset  tamaño  campo
+    0       4       magic b"WTXB"
+    4       1       versión (1)
+    5       1       esquema de firma (1 = Ed25519)
+    6       2       longitud de la firma (uint16, big-endian)
+    8       2       longitud de la llave pública (uint16)
+    10      4       longitud de la transacción (uint32)
+    14      ...     firma | llave pública | JSON canónico de la tx
+
+La transacción se guarda exactamente como canonical_bytes, que es lo que
+se firmó. El verificador y decode_envelope rechazan un paquete cuya tx no
+esté en forma canónica, así lo que uno acepta el otro lo puede leer.
+Cada paquete dice su propio tamaño, por lo que se pueden concatenar; un
+archivo o registro suelto, en cambio, debe contener exactamente uno.
+La conversión JSON <-> binario no pierde información.
+"""
+
+import base64
+import json
+import struct
+from typing import Any, Dict, Optional, Union
+
+from .canonicalizer import canonical_bytes
+
+MAGIC = b"WTXB"
+VERSION = 1
+# Extensión de archivo para paquetes binarios
+BINARY_SUFFIX = ".wtx"
+
+_HEADER = struct.Struct(">4sBBHHI")
+HEADER_SIZE = _HEADER.size
+
+_SCHEME_IDS = {"Ed25519": 1}
+_SCHEME_NAMES = {v: k for k, v in _SCHEME_IDS.items()}
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class BinaryEnvelope:
+    '''
+    Paquete binario ya separado en sus partes
+    - signature, pubkey y tx_bytes son memoryview sobre el buffer original (sin copias)
+    - tx se decodifica del JSON solo la primera vez que se pide
+    - nbytes es el tamaño total del paquete dentro del buffer
+    '''
+
+    __slots__ = ("sig_scheme", "signature", "pubkey", "tx_bytes", "nbytes", "_tx")
+
+    def __init__(
+        self,
+        sig_scheme: str,
+        signature: memoryview,
+        pubkey: memoryview,
+        tx_bytes: memoryview,
+        nbytes: int,
+    ) -> None:
+        self.sig_scheme = sig_scheme
+        self.signature = signature
+        self.pubkey = pubkey
+        self.tx_bytes = tx_bytes
+        self.nbytes = nbytes
+        self._tx: Optional[Dict[str, Any]] = None
+
+    @property
+    def tx(self) -> Dict[str, Any]:
+        if self._tx is None:
+            self._tx = json.loads(bytes(self.tx_bytes))
+        return self._tx
+
+    def to_bytes(self) -> bytes:
+        '''
+        Copia del paquete como bytes independientes del buffer original
+        '''
+        return _pack(self.sig_scheme, self.signature, self.pubkey, self.tx_bytes)
+
+
+def _pack(sig_scheme: str, signature: BytesLike, pubkey: BytesLike, tx_bytes: BytesLike) -> bytes:
+    scheme_id = _SCHEME_IDS.get(sig_scheme)
+    if scheme_id is None:
+        raise ValueError(f"Unsupported sig_scheme {sig_scheme}")
+    header = _HEADER.pack(MAGIC, VERSION, scheme_id, len(signature), len(pubkey), len(tx_bytes))
+    return b"".join((header, signature, pubkey, tx_bytes))
+
+
+def is_binary_envelope(data: BytesLike) -> bool:
+    '''
+    True si los datos empiezan con el magic del formato binario
+    '''
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_envelope(signed_tx: Dict[str, Any]) -> bytes:
+    '''
+    Paquete JSON (como lo regresa sign_transaction) -> formato binario
+    '''
+    return _pack(
+        signed_tx.get("sig_scheme", "Ed25519"),
+        base64.b64decode(signed_tx["signature_b64"]),
+        base64.b64decode(signed_tx["pubkey_b64"]),
+        canonical_bytes(signed_tx["tx"]),
+    )
+
+
+def parse_envelope(data: BytesLike, offset: int = 0, exact: bool = False) -> BinaryEnvelope:
+    '''
+    Lee un paquete binario a partir de "offset" sin copiar los datos
+    - Lanza ValueError si el magic, la versión o las longitudes no cuadran
+    - exact=True (un archivo o registro suelto): el paquete debe llegar justo
+      al final de data, sin bytes de sobra
+    '''
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if len(view) - offset < HEADER_SIZE:
+        raise ValueError("Paquete binario truncado (encabezado incompleto)")
+
+    magic, version, scheme_id, sig_len, pub_len, tx_len = _HEADER.unpack_from(view, offset)
+    if magic != MAGIC:
+        raise ValueError("No es un paquete binario (magic incorrecto)")
+    if version != VERSION:
+        raise ValueError(f"Versión de paquete binario no soportada: {version}")
+    sig_scheme = _SCHEME_NAMES.get(scheme_id)
+    if sig_scheme is None:
+        raise ValueError(f"Esquema de firma desconocido: {scheme_id}")
+
+    start = offset + HEADER_SIZE
+    end = start + sig_len + pub_len + tx_len
+    if end > len(view):
+        raise ValueError("Paquete binario truncado")
+    if exact and end != len(view):
+        raise ValueError(f"Paquete binario con {len(view) - end} bytes de sobra al final")
+
+    sig_end = start + sig_len
+    pub_end = sig_end + pub_len
+    return BinaryEnvelope(
+        sig_scheme,
+        view[start:sig_end],
+        view[sig_end:pub_end],
+        view[pub_end:end],
+        end - offset,
+    )
+
+
+def decode_envelope(data: BytesLike | BinaryEnvelope) -> Dict[str, Any]:
+    '''
+    Formato binario -> paquete JSON
+    - Exige que la tx esté en forma canónica, así la ida y vuelta es exacta
+    '''
+    env = data if isinstance(data, BinaryEnvelope) else parse_envelope(data, exact=True)
+    tx = env.tx
+    if canonical_bytes(tx) != env.tx_bytes:
+        raise ValueError("La transacción del paquete binario no está en forma canónica")
+    return {
+        "tx": tx,
+        "sig_scheme": env.sig_scheme,
+        "signature_b64": base64.b64encode(env.signature).decode("utf-8"),
+        "pubkey_b64": base64.b64encode(env.pubkey).decode("utf-8"),
+    }
+
+
+def load_envelope(raw: BytesLike) -> Dict[str, Any] | BinaryEnvelope:
+    '''
+    Contenido de un archivo recibido -> paquete (binario o JSON, según el magic)
+    '''
+    if is_binary_envelope(raw):
+        return parse_envelope(raw, exact=True)
+    return json.loads(bytes(raw))
+
+
+def envelope_tx(signed_tx: Dict[str, Any] | BinaryEnvelope) -> Dict[str, Any]:
+    '''
+    La transacción de un paquete, sin importar su formato
+    '''
+    if isinstance(signed_tx, BinaryEnvelope):
+        return signed_tx.tx
+    return signed_tx["tx"]
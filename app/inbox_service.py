@@ -0,0 +1,436 @@
+# app/inbox_service.py
+
+"""
+Servicio de larga duración que vigila inbox/ ("wallet serve-inbox").
+
+En lugar de lanzar un proceso de "wallet recv" por archivo, un solo proceso:
+
+1) Vigila el directorio con inotify (Linux, vía ctypes) o, si no está
+   disponible, revisándolo cada cierto tiempo (polling).
+2) Mete las rutas nuevas en una cola acotada (--queue-depth). Si la cola se
+   llena, el vigilante deja de leer eventos: con inotify el kernel los
+   acumula y, si su cola se desborda, al final se vuelve a escanear el
+   directorio completo. Nunca se pierde un archivo, solo se retrasa.
+3) Un pool acotado de hilos verifica las firmas (la parte sin estado de
+   verify_signed_tx). La caché de llaves públicas (PUBKEY_CACHE) se
+   comparte entre hilos y se mantiene caliente entre archivos.
+4) Los nonces se revisan en un único hilo, en el orden de llegada, sobre un
+   almacén de nonces que se abre una sola vez. Los válidos se mueven a
+   verified/ (y se agregan al índice de consultas, tx_index.py, si se dio
+   index_path); los rechazados a quarantine/ junto con un archivo
+   <nombre>.reason.json que explica el motivo.
+
+Con SIGTERM o SIGINT deja de aceptar archivos nuevos, termina los que ya
+están en la cola, cierra el almacén de nonces y sale. Lo que no alcanzó a
+entrar a la cola se queda en inbox/ para la siguiente ejecución.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import signal
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from .envelope import BINARY_SUFFIX, envelope_tx, load_envelope
+from .nonce_store import open_nonce_store
+from .verifier import NONCE_STATE_PATH, check_nonce, verify_signature
+
+# Donde se apartan las transacciones rechazadas
+QUARANTINE_DIR = Path("quarantine")
+# Rutas en espera de verificación como máximo
+DEFAULT_QUEUE_DEPTH = 1024
+# Segundos entre revisiones del directorio cuando no hay inotify
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Constantes de <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# (resultado, dirección derivada, tx) de la verificación de un archivo
+Verification = Tuple[Dict[str, Any], Optional[str], Optional[Dict[str, Any]]]
+
+
+def is_inbox_file(name: str) -> bool:
+    '''
+    Archivos que el servicio procesa: .json y .wtx, sin ocultos ni temporales
+    '''
+    return not name.startswith(".") and name.endswith((".json", BINARY_SUFFIX))
+
+
+def _scan(directory: Path) -> List[str]:
+    '''
+    Archivos del directorio en orden de llegada (mtime, luego nombre), para
+    que los nonces de un mismo remitente se apliquen en el orden en que se
+    escribieron
+    '''
+    found = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if is_inbox_file(entry.name):
+                try:
+                    if entry.is_file():
+                        found.append((entry.stat().st_mtime_ns, entry.name))
+                except FileNotFoundError:
+                    continue
+    return [name for _, name in sorted(found)]
+
+
+# ------------------------------------------------------------
+# Vigilantes del directorio
+# ------------------------------------------------------------
+class PollingWatcher:
+    '''
+    Revisa el directorio cada "interval" segundos
+    - Un archivo se entrega cuando su tamaño y fecha no cambiaron entre dos
+      revisiones seguidas (así no se lee uno a medio escribir)
+    '''
+
+    def __init__(self, directory: Path, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.directory = directory
+        self.interval = interval
+        self._closed = False
+
+    async def names(self) -> AsyncIterator[str]:
+        # nombre -> (tamaño, mtime) de la revisión anterior; None si ya se entregó
+        known: Dict[str, Optional[Tuple[int, int]]] = {}
+        while not self._closed:
+            current: Dict[str, Optional[Tuple[int, int]]] = {}
+            for name in _scan(self.directory):
+                try:
+                    st = os.stat(self.directory / name)
+                except FileNotFoundError:
+                    continue
+                stamp = (st.st_size, st.st_mtime_ns)
+                previous = known.get(name, ())
+                if previous is None:
+                    current[name] = None
+                elif previous == stamp:
+                    current[name] = None
+                    yield name
+                else:
+                    current[name] = stamp
+            # Lo que ya no está (movido o borrado) se olvida
+            known = current
+            await asyncio.sleep(self.interval)
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class InotifyWatcher:
+    '''
+    Vigila el directorio con inotify (IN_CLOSE_WRITE | IN_MOVED_TO)
+    - Solo entrega archivos ya cerrados o movidos dentro del directorio
+    - Si el kernel desborda su cola de eventos, vuelve a escanear todo
+    '''
+
+    def __init__(self, directory: Path, libc: Any) -> None:
+        self.directory = directory
+        self._libc = libc
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, os.strerror(err), str(directory))
+        self._ready = asyncio.Event()
+
+    @classmethod
+    def create(cls, directory: Path) -> Optional["InotifyWatcher"]:
+        '''
+        Regresa None si la plataforma no tiene inotify
+        '''
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            return cls(directory, libc)
+        except (OSError, AttributeError):
+            return None
+
+    def _read_events(self) -> Tuple[list, bool]:
+        '''
+        Lee todo lo disponible del descriptor: (nombres, hubo desborde)
+        '''
+        names = []
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                elif not mask & _IN_IGNORED and name:
+                    names.append(os.fsdecode(name))
+        return names, overflow
+
+    async def names(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._fd, self._ready.set)
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                names, overflow = self._read_events()
+                if overflow:
+                    names = _scan(self.directory)
+                for name in names:
+                    if is_inbox_file(name):
+                        # Si la cola está llena, aquí se espera sin leer más eventos
+                        yield name
+        finally:
+            loop.remove_reader(self._fd)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+# ------------------------------------------------------------
+# Servicio
+# ------------------------------------------------------------
+def verify_inbox_file(path: Path) -> Verification:
+    '''
+    Parte sin estado para un archivo: lee el paquete (JSON o binario) y
+    verifica dirección y firma
+    '''
+    signed = load_envelope(path.read_bytes())
+    result, address = verify_signature(signed)
+    tx = envelope_tx(signed) if result["valid"] else None
+    return result, address, tx
+
+
+def _unique_dest(directory: Path, name: str) -> Path:
+    '''
+    Ruta libre en el directorio destino (no pisa un archivo con el mismo nombre)
+    '''
+    dest = directory / name
+    n = 1
+    while dest.exists():
+        dest = directory / f"{name}.{n}"
+        n += 1
+    return dest
+
+
+class InboxService:
+    '''
+    Vigila inbox_dir y verifica cada transacción que llega (ver el docstring
+    del módulo). Se detiene con stop() o con SIGTERM/SIGINT si
+    install_signal_handlers=True.
+    '''
+
+    def __init__(
+        self,
+        inbox_dir: Path | str,
+        verified_dir: Path | str,
+        quarantine_dir: Path | str = QUARANTINE_DIR,
+        nonce_state_path: Path | str = NONCE_STATE_PATH,
+        workers: Optional[int] = None,
+        queue_depth: int = DEFAULT_QUEUE_DEPTH,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        use_inotify: bool = True,
+        index_path: Optional[Path | str] = None,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        if queue_depth <= 0:
+            raise ValueError("queue_depth debe ser positivo")
+        self.inbox_dir = Path(inbox_dir)
+        self.verified_dir = Path(verified_dir)
+        self.quarantine_dir = Path(quarantine_dir)
+        self.nonce_state_path = Path(nonce_state_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = queue_depth
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.index_path = Path(index_path) if index_path is not None else None
+        self.log = log
+
+        self.stats = {"accepted": 0, "rejected": 0, "errors": 0}
+        self.watcher_kind: Optional[str] = None
+        self._stop: Optional[asyncio.Event] = None
+        # Nombres en la cola o en proceso (evita encolar dos veces el mismo)
+        self._inflight: Set[str] = set()
+        self._commit_tail: Optional[asyncio.Future] = None
+
+    # --------------------------------------------------------
+    # Paso con estado: nonces y movimiento de archivos (un solo hilo)
+    # --------------------------------------------------------
+    def _commit(self, store: Any, index: Any, path: Path, verification: Verification) -> Tuple[bool, str]:
+        result, address, tx = verification
+        if result["valid"]:
+            result = check_nonce(store, address, tx.get("nonce", 0))
+        if result["valid"]:
+            # El nonce ya quedó registrado: si mover falla, un reintento lo rechaza como replay
+            dest = _unique_dest(self.verified_dir, path.name)
+            os.replace(path, dest)
+            if index is not None:
+                index.add(tx, dest)
+            return True, "ok"
+        self._quarantine(path, result["reason"])
+        return False, result["reason"]
+
+    def _quarantine(self, path: Path, reason: str) -> None:
+        dest = _unique_dest(self.quarantine_dir, path.name)
+        os.replace(path, dest)
+        note = {"file": path.name, "reason": reason, "rejected_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        dest.with_name(dest.name + ".reason.json").write_text(json.dumps(note, ensure_ascii=False), encoding="utf-8")
+
+    # --------------------------------------------------------
+    # Tareas
+    # --------------------------------------------------------
+    async def _produce(self, queue: asyncio.Queue, watcher: Any) -> None:
+        '''
+        Primero lo que ya estaba en inbox/, después lo que vaya llegando
+        '''
+        async def names() -> AsyncIterator[str]:
+            for name in _scan(self.inbox_dir):
+                yield name
+            async for name in watcher.names():
+                yield name
+
+        async for name in names():
+            if name in self._inflight:
+                continue
+            self._inflight.add(name)
+            # Backpressure: con la cola llena, se espera aquí
+            await queue.put(name)
+
+    async def _consume(self, queue: asyncio.Queue, store: Any, index: Any, verify_pool: ThreadPoolExecutor,
+                       store_pool: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            name = await queue.get()
+            # Los commits se encadenan en el orden en que se sacaron de la cola
+            previous, done = self._commit_tail, loop.create_future()
+            self._commit_tail = done
+            path = self.inbox_dir / name
+            try:
+                try:
+                    verification = await loop.run_in_executor(verify_pool, verify_inbox_file, path)
+                except FileNotFoundError:
+                    # Otro proceso (p. ej. "wallet recv") ya se lo llevó
+                    continue
+                except Exception as e:
+                    verification = ({"valid": False, "reason": f"exception: {e}"}, None, None)
+
+                if previous is not None:
+                    await previous
+                try:
+                    accepted, reason = await loop.run_in_executor(store_pool, self._commit, store, index, path, verification)
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.log(f"[!] {name}: error al procesar ({e})")
+                    continue
+
+                if accepted:
+                    self.stats["accepted"] += 1
+                    self.log(f"[+] {name}: válida -> {self.verified_dir}/")
+                else:
+                    self.stats["rejected"] += 1
+                    self.log(f"[!] {name}: {reason} -> {self.quarantine_dir}/")
+            finally:
+                # En toda salida (también si el archivo ya no estaba): el siguiente no se adelanta al anterior
+                if previous is not None:
+                    await previous
+                done.set_result(None)
+                self._inflight.discard(name)
+                queue.task_done()
+
+    def _make_watcher(self) -> Any:
+        watcher = InotifyWatcher.create(self.inbox_dir) if self.use_inotify else None
+        if watcher is not None:
+            self.watcher_kind = "inotify"
+            return watcher
+        self.watcher_kind = "polling"
+        return PollingWatcher(self.inbox_dir, self.poll_interval)
+
+    def stop(self) -> None:
+        '''
+        Pide el cierre ordenado: no se aceptan archivos nuevos y se termina la cola
+        '''
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self, install_signal_handlers: bool = False) -> Dict[str, int]:
+        '''
+        Corre hasta stop() (o SIGTERM/SIGINT) y regresa las estadísticas
+        '''
+        for d in (self.inbox_dir, self.verified_dir, self.quarantine_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if install_signal_handlers:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self.stop)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_depth)
+        watcher = self._make_watcher()
+        verify_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inbox-verify")
+        store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inbox-nonces")
+        # El almacén vive todo lo que dure el servicio (estado caliente en memoria)
+        store = open_nonce_store(self.nonce_state_path)
+        index = None
+        if self.index_path is not None:
+            from .tx_index import open_tx_index
+            # Solo lo usa el hilo de store_pool
+            index = await loop.run_in_executor(store_pool, open_tx_index, self.index_path)
+
+        self.log(f"[*] Vigilando {self.inbox_dir}/ ({self.watcher_kind}, {self.workers} workers, "
+                 f"cola de {self.queue_depth})")
+        producer = asyncio.create_task(self._produce(queue, watcher))
+        consumers = [
+            asyncio.create_task(self._consume(queue, store, index, verify_pool, store_pool))
+            for _ in range(self.workers)
+        ]
+        try:
+            await self._stop.wait()
+        finally:
+            # 1) Sin archivos nuevos
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            watcher.close()
+            # 2) Drenar lo que ya estaba en la cola
+            await queue.join()
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            verify_pool.shutdown(wait=True)
+            if index is not None:
+                store_pool.submit(index.close).result()
+            store_pool.shutdown(wait=True)
+            store.close()
+            if install_signal_handlers:
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    loop.remove_signal_handler(sig)
+
+        self.log(f"[*] Servicio detenido: {self.stats['accepted']} válidas, "
+                 f"{self.stats['rejected']} en cuarentena, {self.stats['errors']} con error")
+        return dict(self.stats)
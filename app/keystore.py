@@ -3,29 +3,64 @@ import os
 import json
 import base64
 import hashlib
+import threading
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
-from cryptography.exceptions import InvalidTag
+# InvalidTag (cryptography) se importa dentro de las funciones que lo usan:
+# leer un keystore (load_keystore, "wallet address") no necesita el backend
 
+from . import metrics
 # Constantes tomadas de crypto_utils
 from .crypto_utils import (
-    generate_ed25519_keys, derive_aes_key, encrypt_data, decrypt_data, derive_address_btc_style,
+    generate_ed25519_keys, ed25519_public_key, derive_aes_key, encrypt_data, decrypt_data, derive_address_btc_style,
     ARGON_TIME_COST, ARGON_MEM_COST_KIB, ARGON_PARALLELISM, ARGON_SALT_LEN_BYTES
 )
 
 #                                                 vv Any porque son varios tipos de datos
-def create_keystore(passphrase: str) -> Dict[str, Any]:
+def create_keystore(
+    passphrase: str,
+    t_cost: Optional[int] = None,
+    m_cost: Optional[int] = None,
+    parallelism: Optional[int] = None,
+    private_key_bytes: Optional[bytes] = None,
+) -> Dict[str, Any]:
     '''
     Crea un nuevo keystore, sin almacenarlo en disco
-    - Crea un par de llaves Ed25519
+    - Crea un par de llaves Ed25519 (o usa "private_key_bytes" si se pasa,
+      p. ej. llaves deterministas del generador de carga)
     - Deriva la dirección "BTC-Style" a partir de la llave pública
     - Deriva la clave de cifrado AES con Argon2id, la passphrase y el salt definido en crpyto_utils
+    - Los parámetros de Argon2 que no se pasen toman las constantes de crypto_utils
+      y se guardan en "kdf_params" para usarlos al desbloquear
     - Cifra la clave privada con AES-256-GCM
     - Devuelve un diccionario del keystore
     '''
     # Toma los pasos de crypto_utils para hacer el diccionario
-    private_key_bytes, public_key_bytes = generate_ed25519_keys()
+    if private_key_bytes is None:
+        private_key_bytes, public_key_bytes = generate_ed25519_keys()
+    else:
+        public_key_bytes = ed25519_public_key(private_key_bytes)
+
+    return _encrypt_keystore(private_key_bytes, public_key_bytes, passphrase, t_cost, m_cost, parallelism)
+
+def _encrypt_keystore(
+    private_key_bytes: bytes,
+    public_key_bytes: bytes,
+    passphrase: str,
+    t_cost: Optional[int] = None,
+    m_cost: Optional[int] = None,
+    parallelism: Optional[int] = None,
+    created: Optional[float] = None,
+) -> Dict[str, Any]:
+    '''
+    Cifra un par de llaves ya existente y arma el diccionario del keystore
+    - Lo usan create_keystore (llaves nuevas) y rekey_keystore (mismas llaves)
+    - Siempre usa un salt y un nonce nuevos
+    '''
+    t_cost = ARGON_TIME_COST if t_cost is None else t_cost
+    m_cost = ARGON_MEM_COST_KIB if m_cost is None else m_cost
+    parallelism = ARGON_PARALLELISM if parallelism is None else parallelism
 
     address = derive_address_btc_style(public_key_bytes)
 
@@ -33,7 +68,7 @@ def create_keystore(passphrase: str) -> Dict[str, Any]:
     # para seguridad, urandom si es apto para criptografía (https://docs.python.org/3/library/os.html#os.urandom)
     salt = os.urandom(ARGON_SALT_LEN_BYTES)
 
-    aes_key = derive_aes_key(passphrase, salt)
+    aes_key = derive_aes_key(passphrase, salt, t_cost, m_cost, parallelism)
 
     ciphertext, nonce, tag = encrypt_data(private_key_bytes, aes_key)
 
@@ -44,16 +79,16 @@ def create_keystore(passphrase: str) -> Dict[str, Any]:
             #Todo lo base 64 se decodifica primero a utf-8 para evitar caracteres raros,
             # aunque se podría limpiar en otro lado
             "salt_b64":base64.b64encode(salt).decode("utf-8"),
-            "t_cost":ARGON_TIME_COST,
-            "m_cost":ARGON_MEM_COST_KIB,
-            "parallelism":ARGON_PARALLELISM
+            "t_cost":t_cost,
+            "m_cost":m_cost,
+            "parallelism":parallelism
             },
         "cipher": "AES-256-GCM",
         "cipher_params":{"nonce_b64": base64.b64encode(nonce).decode("utf-8")},
         "ciphertext_b64": base64.b64encode(ciphertext).decode("utf-8"),
         "tag_b64": base64.b64encode(tag).decode("utf-8"),
         "pubkey_b64": base64.b64encode(public_key_bytes).decode("utf-8"),
-        "created": time.time(),
+        "created": time.time() if created is None else created,
         "scheme": "Ed25519",
         "address": address,
         "checksum": ""  # Se añade después de armar el keystore
@@ -62,6 +97,10 @@ def create_keystore(passphrase: str) -> Dict[str, Any]:
     # Checksum
     keystore["checksum"] = keystore_checksum(keystore)
 
+    # Comprobación: lo que se guardó se puede descifrar con la misma llave derivada
+    if decrypt_data(ciphertext, tag, nonce, aes_key) != private_key_bytes:
+        raise RuntimeError("El keystore recién cifrado no se pudo verificar")
+
     return keystore
 
 def keystore_checksum(keystore: Dict[str, Any]) -> str:
@@ -84,12 +123,24 @@ def keystore_checksum(keystore: Dict[str, Any]) -> str:
 def save_keystore(keystore: Dict[str, Any], filepath: Path | str) -> None:
     '''
     Guarda el keystore en un archivo JSON en UTF-8
+    - Escritura atómica: archivo temporal en el mismo directorio + os.replace,
+      así nunca queda un keystore a medio escribir (importante al re-cifrar)
     '''
     path = Path(filepath)
     #Si el directorio no existe lo crea
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(keystore, indent=2), encoding='utf-8')
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(keystore, indent=2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
 
+@metrics.timed("load_keystore")
 def load_keystore(filepath: Path | str) -> Dict[str, Any]:
     '''
     Carga un keystore desde un JSON en UTF-8
@@ -117,8 +168,16 @@ def unlock_keystore(keystore: Dict[str, Any], passphrase: str) -> Tuple[bytes, b
     # Extrae los parámetros del keystore
 
     # Para volver a sacar la llave derivada se necesita el salt
-    salt = base64.b64decode(keystore.get("kdf_params", {}).get("salt_b64"))
-    aes_key = derive_aes_key(passphrase, salt)
+    # y los mismos parámetros de Argon2 con los que se creó
+    kdf_params = keystore.get("kdf_params", {})
+    salt = base64.b64decode(kdf_params.get("salt_b64"))
+    aes_key = derive_aes_key(
+        passphrase,
+        salt,
+        int(kdf_params.get("t_cost", ARGON_TIME_COST)),
+        int(kdf_params.get("m_cost", ARGON_MEM_COST_KIB)),
+        int(kdf_params.get("parallelism", ARGON_PARALLELISM)),
+    )
 
     # Nonce
     nonce = base64.b64decode(keystore.get("cipher_params", {}).get("nonce_b64"))
@@ -135,10 +194,118 @@ def unlock_keystore(keystore: Dict[str, Any], passphrase: str) -> Tuple[bytes, b
     # Dirección
     address = keystore.get("address")
     
+    from cryptography.exceptions import InvalidTag
+
     # Intenta descifrar la llave privada
     try:
         private_key_bytes = decrypt_data(ciphertext, tag, nonce, aes_key)
     except InvalidTag as e:
         raise InvalidTag("Passphrase incorrecta o keystore inválido") from e
 
-    return private_key_bytes, public_key_bytes, address
\ No newline at end of file
+    return private_key_bytes, public_key_bytes, address
+
+def rekey_keystore(
+    keystore: Dict[str, Any],
+    passphrase: str,
+    new_passphrase: Optional[str] = None,
+    t_cost: Optional[int] = None,
+    m_cost: Optional[int] = None,
+    parallelism: Optional[int] = None,
+) -> Dict[str, Any]:
+    '''
+    Vuelve a cifrar la misma llave privada con otra passphrase y/o otros
+    parámetros de Argon2, sin guardarlo en disco
+    - Lo que no se pase se conserva (passphrase y parámetros actuales)
+    - Salt y nonce nuevos; el checksum se recalcula con keystore_checksum
+    - Lanza InvalidTag si la passphrase actual es incorrecta
+    '''
+    private_key_bytes, public_key_bytes, address = unlock_keystore(keystore, passphrase)
+
+    kdf_params = keystore.get("kdf_params", {})
+    new_keystore = _encrypt_keystore(
+        private_key_bytes,
+        public_key_bytes,
+        passphrase if new_passphrase is None else new_passphrase,
+        kdf_params.get("t_cost", ARGON_TIME_COST) if t_cost is None else t_cost,
+        kdf_params.get("m_cost", ARGON_MEM_COST_KIB) if m_cost is None else m_cost,
+        kdf_params.get("parallelism", ARGON_PARALLELISM) if parallelism is None else parallelism,
+        created=keystore.get("created"),
+    )
+    if new_keystore["address"] != address:
+        raise ValueError("La dirección del keystore no coincide con su llave pública")
+    return new_keystore
+
+def rekey_memory_kib(keystore: Dict[str, Any], m_cost: Optional[int] = None) -> int:
+    '''
+    Memoria máxima (KiB) que usa re-cifrar un keystore: las dos derivaciones
+    van una después de la otra, así que cuenta la mayor de las dos
+    '''
+    current = int(keystore.get("kdf_params", {}).get("m_cost", ARGON_MEM_COST_KIB))
+    return max(current, current if m_cost is None else m_cost)
+
+class _MemoryBudget:
+    '''
+    Semáforo por KiB: un trabajo espera hasta que su memoria quepa en el presupuesto
+    - Un trabajo más grande que todo el presupuesto corre solo (no se bloquea para siempre)
+    '''
+
+    def __init__(self, budget_kib: int) -> None:
+        self.budget_kib = budget_kib
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, kib: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_use == 0 or self.in_use + kib <= self.budget_kib)
+            self.in_use += kib
+
+    def release(self, kib: int) -> None:
+        with self._cond:
+            self.in_use -= kib
+            self._cond.notify_all()
+
+def rekey_files(
+    paths: Iterable[Path | str],
+    passphrase: str,
+    new_passphrase: Optional[str] = None,
+    t_cost: Optional[int] = None,
+    m_cost: Optional[int] = None,
+    parallelism: Optional[int] = None,
+    workers: Optional[int] = None,
+    mem_budget_kib: Optional[int] = None,
+) -> Iterator[Tuple[Path, Optional[str]]]:
+    '''
+    Re-cifra muchos keystores en paralelo (hilos: Argon2 libera el GIL)
+    - Cada archivo se reescribe de forma atómica con save_keystore
+    - Con mem_budget_kib la suma de memoria de Argon2 de los trabajos en
+      curso no pasa del presupuesto, sin importar cuántos workers haya
+    - Produce (ruta, None) si salió bien o (ruta, error) por archivo, en el
+      orden en que terminan
+    '''
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from cryptography.exceptions import InvalidTag
+
+    budget = _MemoryBudget(mem_budget_kib) if mem_budget_kib is not None else None
+
+    def job(path: Path) -> Tuple[Path, Optional[str]]:
+        try:
+            keystore = load_keystore(path)
+            kib = rekey_memory_kib(keystore, m_cost)
+            if budget is not None:
+                budget.acquire(kib)
+            try:
+                new_keystore = rekey_keystore(keystore, passphrase, new_passphrase, t_cost, m_cost, parallelism)
+            finally:
+                if budget is not None:
+                    budget.release(kib)
+            save_keystore(new_keystore, path)
+        except InvalidTag:
+            return path, "Passphrase incorrecta o keystore inválido"
+        except Exception as e:
+            return path, str(e)
+        return path, None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(job, Path(p)) for p in paths]
+        for fut in as_completed(futures):
+            yield fut.result()
@@ -0,0 +1,455 @@
+# app/ledger.py
+
+"""
+Bitácora de solo-agregar, dividida en segmentos, para transacciones firmadas.
+
+Con millones de transacciones, un archivo por tx (outbox/tx_N.json,
+verified/...) agota inodos y hace lentos los recorridos del directorio. La
+bitácora guarda todo en pocos archivos grandes:
+
+    <directorio>/00000001.seg, 00000002.seg, ...
+
+Cada segmento:
+- Encabezado: magic b"WLG1" + número de segmento (uint32).
+- Registros: longitud (uint32) + CRC32 del contenido (uint32) + contenido.
+- Sello al rotar: longitud 0 + CRC32 de todos los registros del segmento +
+  número de registros. Un segmento sellado ya no cambia.
+
+Cuando el segmento activo pasaría de segment_size, se sella y se abre el
+siguiente. La posición de un registro es (segmento, offset) y sirve para
+releerlo directamente (read_at) o para continuar una lectura (records).
+
+Recuperación: al abrir para escribir, si el último registro del segmento
+activo quedó a medias (encabezado o contenido cortados al final del archivo:
+el proceso murió a mitad de una escritura), se trunca el segmento hasta el
+último registro completo. Un registro completo cuyo CRC no cuadra, o con una
+longitud imposible, no es una escritura interrumpida sino datos dañados: no
+se trunca nada y se lanza LedgerCorruption (lo que venga después podría ser
+válido).
+
+Varios procesos pueden escribir en la misma bitácora: cada escritura se hace
+bajo un lock de archivo (fcntl.flock), como en nonce_store.
+"""
+
+import contextlib
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, un solo proceso escritor
+    fcntl = None
+
+MAGIC = b"WLG1"
+# Tamaño a partir del cual se rota el segmento activo
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+# Registro más grande que se acepta (protege contra longitudes corruptas)
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+SEGMENT_SUFFIX = ".seg"
+
+_SEG_HEADER = struct.Struct(">4sI")  # magic, número de segmento
+_REC_HEADER = struct.Struct(">II")   # longitud, crc32 (en el sello: 0, crc del segmento)
+_SEAL_COUNT = struct.Struct(">I")    # número de registros del segmento sellado
+_SEAL_SIZE = _REC_HEADER.size + _SEAL_COUNT.size
+
+# Posición de un registro: (número de segmento, offset dentro del segmento)
+Position = Tuple[int, int]
+
+
+class LedgerCorruption(ValueError):
+    '''
+    Un registro o segmento no cuadra con su CRC o su formato
+    '''
+
+
+def _segment_name(seq: int) -> str:
+    return f"{seq:08d}{SEGMENT_SUFFIX}"
+
+
+class _SegmentScan:
+    '''
+    Recorre los registros de un segmento abierto, desde "offset"
+    Al terminar deja en sus atributos hasta dónde llegó:
+    - end: offset después del último registro completo y válido
+    - sealed: True si se encontró el sello (con count y crc del segmento)
+    - torn: True si después de "end" hay un registro incompleto que llega
+      al final del archivo (escritura interrumpida)
+    - corrupt: descripción del problema si en "end" hay un registro completo
+      con CRC o longitud inválidos (None si no)
+    - crc/count: acumulados de los registros leídos (más crc0/count0 iniciales)
+    '''
+
+    def __init__(self, f: BinaryIO, seq: int, offset: int, crc0: int = 0, count0: int = 0) -> None:
+        self.f = f
+        self.seq = seq
+        self.end = offset
+        self.crc = crc0
+        self.count = count0
+        self.sealed = False
+        self.seal_crc: Optional[int] = None
+        self.seal_count: Optional[int] = None
+        self.torn = False
+        self.corrupt: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Tuple[int, bytes]]:
+        f = self.f
+        f.seek(self.end)
+        while True:
+            header = f.read(_REC_HEADER.size)
+            if not header:
+                return
+            if len(header) < _REC_HEADER.size:
+                self.torn = True
+                return
+            length, crc = _REC_HEADER.unpack(header)
+
+            if length == 0:
+                tail = f.read(_SEAL_COUNT.size)
+                if len(tail) < _SEAL_COUNT.size:
+                    self.torn = True
+                    return
+                self.sealed = True
+                self.seal_crc = crc
+                (self.seal_count,) = _SEAL_COUNT.unpack(tail)
+                self.end += _SEAL_SIZE
+                return
+
+            if length > MAX_RECORD_SIZE:
+                self.corrupt = f"Segmento {self.seq}: longitud inválida ({length}) en el offset {self.end}"
+                return
+            payload = f.read(length)
+            if len(payload) < length:
+                self.torn = True
+                return
+            if zlib.crc32(payload) != crc:
+                self.corrupt = f"Segmento {self.seq}: registro corrupto (CRC) en el offset {self.end}"
+                return
+
+            offset = self.end
+            self.crc = zlib.crc32(payload, zlib.crc32(header, self.crc))
+            self.count += 1
+            self.end += _REC_HEADER.size + length
+            yield offset, payload
+
+
+class Ledger:
+    '''
+    Bitácora segmentada en un directorio (ver el docstring del módulo)
+    - readonly=True: solo lectura, sin lock ni recuperación
+    - fsync=True: cada append llega al disco antes de regresar
+    '''
+
+    def __init__(
+        self,
+        directory: Path | str,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        fsync: bool = True,
+        readonly: bool = False,
+    ) -> None:
+        if segment_size <= _SEG_HEADER.size + _SEAL_SIZE:
+            raise ValueError("segment_size demasiado pequeño")
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.readonly = readonly
+
+        self._active: Optional[BinaryIO] = None
+        self._active_seq = 0
+        self._end = 0
+        self._crc = 0
+        self._count = 0
+        self._lock_file = None
+
+        if not readonly:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.directory / ".lock", "a+b")
+            with self._locked():
+                self._open_active()
+
+    # ------------------------------------------------------------
+    # Segmentos
+    # ------------------------------------------------------------
+    def segments(self) -> List[int]:
+        '''
+        Números de segmento existentes, en orden
+        '''
+        if not self.directory.exists():
+            return []
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit():
+                seqs.append(int(name[:-len(SEGMENT_SUFFIX)]))
+        return sorted(seqs)
+
+    def segment_path(self, seq: int) -> Path:
+        return self.directory / _segment_name(seq)
+
+    @staticmethod
+    def _check_header(f: BinaryIO, seq: int) -> None:
+        header = f.read(_SEG_HEADER.size)
+        if len(header) < _SEG_HEADER.size:
+            raise LedgerCorruption(f"Segmento {seq}: encabezado incompleto")
+        magic, stored_seq = _SEG_HEADER.unpack(header)
+        if magic != MAGIC or stored_seq != seq:
+            raise LedgerCorruption(f"Segmento {seq}: encabezado inválido")
+
+    # ------------------------------------------------------------
+    # Lock y recuperación
+    # ------------------------------------------------------------
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        if self._lock_file is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _open_active(self) -> None:
+        '''
+        Abre el último segmento para agregar; lo crea si no hay ninguno y
+        trunca una cola incompleta. Debe llamarse con el lock tomado.
+        '''
+        seqs = self.segments()
+        if not seqs:
+            self._start_segment(1)
+            return
+
+        seq = seqs[-1]
+        f = open(self.segment_path(seq), "r+b")
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size < _SEG_HEADER.size:
+                # El proceso murió al crear el segmento: se vuelve a escribir el encabezado
+                f.truncate(0)
+                f.write(_SEG_HEADER.pack(MAGIC, seq))
+                self._sync(f)
+            else:
+                self._check_header(f, seq)
+        except Exception:
+            f.close()
+            raise
+        self._set_active(f, seq)
+        self._catch_up()
+
+    def _set_active(self, f: BinaryIO, seq: int) -> None:
+        if self._active is not None:
+            self._active.close()
+        self._active = f
+        self._active_seq = seq
+        self._end = _SEG_HEADER.size
+        self._crc = 0
+        self._count = 0
+
+    def _catch_up(self) -> None:
+        '''
+        Lee lo que haya después de self._end en el segmento activo (lo que
+        escribieron otros procesos) y avanza a los segmentos siguientes si el
+        activo ya está sellado. Con el lock tomado nadie más está escribiendo,
+        así que una cola incompleta es de un proceso que murió: se trunca.
+        Un registro corrupto lanza LedgerCorruption sin tocar el archivo.
+        Debe llamarse con el lock tomado.
+        '''
+        while True:
+            scan = _SegmentScan(self._active, self._active_seq, self._end, self._crc, self._count)
+            for _ in scan:
+                pass
+            if scan.corrupt:
+                raise LedgerCorruption(f"{scan.corrupt}; no se abre para escribir")
+            self._end, self._crc, self._count = scan.end, scan.crc, scan.count
+            if scan.torn:
+                self._active.truncate(self._end)
+                self._sync(self._active)
+            if not scan.sealed:
+                self._active.seek(self._end)
+                return
+            nxt = self._active_seq + 1
+            if not self.segment_path(nxt).exists():
+                self._start_segment(nxt)
+                return
+            f = open(self.segment_path(nxt), "r+b")
+            self._check_header(f, nxt)
+            self._set_active(f, nxt)
+
+    def _start_segment(self, seq: int) -> None:
+        f = open(self.segment_path(seq), "w+b")
+        f.write(_SEG_HEADER.pack(MAGIC, seq))
+        self._sync(f)
+        self._sync_dir()
+        self._set_active(f, seq)
+
+    def _sync(self, f: BinaryIO) -> None:
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _sync_dir(self) -> None:
+        if not self.fsync or not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _seal(self) -> None:
+        self._active.seek(self._end)
+        self._active.write(_REC_HEADER.pack(0, self._crc) + _SEAL_COUNT.pack(self._count))
+        self._sync(self._active)
+        self._end += _SEAL_SIZE
+
+    # ------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------
+    def append(self, payload: bytes) -> Position:
+        '''
+        Agrega un registro y regresa su posición
+        '''
+        return self.append_many([payload])[0]
+
+    def append_many(self, payloads: Iterable[bytes]) -> List[Position]:
+        '''
+        Agrega varios registros con un solo lock y un solo fsync
+        - Todos se revisan antes de escribir: si uno no es válido no se
+          escribe ninguno
+        '''
+        if self.readonly:
+            raise RuntimeError("La bitácora está abierta solo para lectura")
+        records: List[bytes] = []
+        for payload in payloads:
+            payload = bytes(payload)
+            if not payload:
+                raise ValueError("No se pueden guardar registros vacíos")
+            if len(payload) > MAX_RECORD_SIZE:
+                raise ValueError(f"Registro demasiado grande ({len(payload)} bytes)")
+            records.append(_REC_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+
+        positions: List[Position] = []
+        with self._locked():
+            # Otro proceso pudo haber escrito o rotado desde la última vez
+            self._catch_up()
+            for record in records:
+                if self._count and self._end + len(record) + _SEAL_SIZE > self.segment_size:
+                    self._seal()
+                    self._start_segment(self._active_seq + 1)
+                self._active.seek(self._end)
+                self._active.write(record)
+                positions.append((self._active_seq, self._end))
+                self._crc = zlib.crc32(record, self._crc)
+                self._count += 1
+                self._end += len(record)
+            self._sync(self._active)
+        return positions
+
+    # ------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------
+    def records(self, start: Optional[Position] = None) -> Iterator[Tuple[Position, bytes]]:
+        '''
+        Lector secuencial: (posición, contenido) de cada registro en orden
+        - start: posición desde la que se empieza (incluida)
+        - Se detiene sin error en una cola incompleta del último segmento
+          (puede ser una escritura en curso de otro proceso)
+        - Lanza LedgerCorruption en un registro con CRC o longitud inválidos
+          y en un registro incompleto de un segmento que no es el último
+        '''
+        seqs = self.segments()
+        for i, seq in enumerate(seqs):
+            if start is not None and seq < start[0]:
+                continue
+            offset = start[1] if start is not None and seq == start[0] else _SEG_HEADER.size
+            with open(self.segment_path(seq), "rb") as f:
+                self._check_header(f, seq)
+                scan = _SegmentScan(f, seq, offset)
+                for rec_offset, payload in scan:
+                    yield (seq, rec_offset), payload
+            if scan.corrupt:
+                raise LedgerCorruption(scan.corrupt)
+            if scan.torn:
+                if i < len(seqs) - 1:
+                    raise LedgerCorruption(f"Segmento {seq}: registro incompleto en el offset {scan.end}")
+                return
+
+    def __iter__(self) -> Iterator[bytes]:
+        for _, payload in self.records():
+            yield payload
+
+    def read_at(self, position: Position) -> bytes:
+        '''
+        Lee un solo registro a partir de su posición
+        '''
+        seq, offset = position
+        with open(self.segment_path(seq), "rb") as f:
+            f.seek(offset)
+            header = f.read(_REC_HEADER.size)
+            if len(header) < _REC_HEADER.size:
+                raise LedgerCorruption(f"No hay registro en {position}")
+            length, crc = _REC_HEADER.unpack(header)
+            if length == 0 or length > MAX_RECORD_SIZE:
+                raise LedgerCorruption(f"No hay registro en {position}")
+            payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            raise LedgerCorruption(f"Registro corrupto en {position}")
+        return payload
+
+    def verify(self) -> List[str]:
+        '''
+        Revisa CRC de cada registro y de cada segmento sellado
+        Regresa la lista de problemas (vacía si todo está bien)
+        '''
+        problems: List[str] = []
+        seqs = self.segments()
+        for i, seq in enumerate(seqs):
+            last = i == len(seqs) - 1
+            try:
+                with open(self.segment_path(seq), "rb") as f:
+                    self._check_header(f, seq)
+                    scan = _SegmentScan(f, seq, _SEG_HEADER.size)
+                    for _ in scan:
+                        pass
+                    trailing = os.fstat(f.fileno()).st_size - scan.end
+            except LedgerCorruption as e:
+                problems.append(str(e))
+                continue
+
+            if scan.sealed:
+                if scan.seal_crc != scan.crc or scan.seal_count != scan.count:
+                    problems.append(f"Segmento {seq}: el CRC o el número de registros no coincide con el sello")
+                if trailing:
+                    problems.append(f"Segmento {seq}: {trailing} bytes después del sello")
+            elif scan.corrupt:
+                problems.append(scan.corrupt)
+            elif scan.torn:
+                problems.append(f"Segmento {seq}: registro incompleto en el offset {scan.end}")
+            elif not last:
+                problems.append(f"Segmento {seq}: no está sellado y no es el último")
+        return problems
+
+    # ------------------------------------------------------------
+    # Cierre
+    # ------------------------------------------------------------
+    def close(self) -> None:
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __enter__(self) -> "Ledger":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_ledger(directory: Path | str, **kwargs) -> Ledger:
+    '''
+    Abre (o crea) la bitácora de un directorio
+    '''
+    return Ledger(directory, **kwargs)
@@ -0,0 +1,443 @@
+# app/loadgen.py
+
+"""
+Generador de carga: corpus grandes y reproducibles de paquetes firmados.
+
+Uso:
+    python -m app.loadgen --count 1000000 --out corpus.ndjson [--format ndjson]
+    python -m app.loadgen --count 100000 --out inbox --format binary --invalid 0.01 --replay 0.01
+
+Para dimensionar hardware y alimentar benchmarks o pruebas de estrés hace
+falta una entrada realista que salga igual en cada corrida:
+
+1) Todo sale de una semilla. La llave de cada remitente es
+   SHA-256("<semilla>:sender:<n>"), así que las direcciones y las firmas
+   (Ed25519 es determinista) se repiten entre corridas y máquinas.
+2) Cada remitente pasa por el camino normal: create_keystore con su llave
+   (Argon2 barato por defecto, ver --kdf-m-cost), una SignerSession, y
+   create_tx + session.sign para cada transacción.
+3) Las transacciones van por rondas: en cada ronda cada remitente firma una,
+   en un orden barajado por ronda. Así cada remitente tiene nonces
+   crecientes sin estado compartido entre procesos:
+     - sequential: 1, 2, 3, ...
+     - gapped: crecientes con huecos de hasta --nonce-gap
+     - random: cualquier valor (muchos serán "stale" al verificar)
+4) El valor tiene hasta --value-digits dígitos enteros y --decimals
+   decimales; data_hex tiene entre MIN y MAX bytes (--data-bytes MIN:MAX),
+   con un gas_limit acorde.
+5) Una fracción --invalid sale dañada a propósito (firma alterada, tx
+   modificada después de firmar o llave pública de otro remitente) y una
+   fracción --replay repite un paquete válido anterior.
+6) El trabajo se reparte en bloques de CHUNK_SIZE registros entre varios
+   procesos; cada bloque usa su propio generador aleatorio y el resultado se
+   escribe en orden, así que el corpus no depende del número de procesos.
+
+Formatos de salida: json (un archivo por tx en un directorio), ndjson (un
+archivo), binary (un .wtx por tx en un directorio) y ledger (bitácora
+segmentada).
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .crypto_utils import derive_address_btc_style, ed25519_public_key
+from .envelope import BINARY_SUFFIX, encode_envelope
+from .keystore import create_keystore, save_keystore
+from .ledger import open_ledger
+from .session import SignerSession
+from .tx_model import create_tx
+
+FORMATS = ("json", "ndjson", "binary", "ledger")
+NONCE_MODES = ("sequential", "gapped", "random")
+INVALID_KINDS = ("bad_signature", "tampered", "wrong_key")
+# Registros por bloque: fijo, para que el corpus no dependa de --workers
+CHUNK_SIZE = 2048
+DEFAULT_PASSPHRASE = "loadgen-passphrase"
+# Argon2 barato: el corpus no protege fondos reales y cada proceso desbloquea
+# a cada remitente una vez
+LOADGEN_KDF = (1, 1024, 1)  # t_cost, m_cost (KiB), parallelism
+DEFAULT_START = "2025-01-01T00:00:00Z"
+
+
+class LoadSpec:
+    '''
+    Parámetros del corpus (se manda tal cual a cada proceso)
+    '''
+
+    __slots__ = (
+        "count", "seed", "senders", "recipients", "nonces", "nonce_gap", "value_digits", "decimals",
+        "data_bytes", "invalid", "replay", "start", "rate", "passphrase", "kdf",
+    )
+
+    def __init__(
+        self,
+        count: int,
+        seed: int = 0,
+        senders: int = 16,
+        recipients: int = 64,
+        nonces: str = "sequential",
+        nonce_gap: int = 10,
+        value_digits: int = 6,
+        decimals: int = 2,
+        data_bytes: Tuple[int, int] = (0, 0),
+        invalid: float = 0.0,
+        replay: float = 0.0,
+        start: str = DEFAULT_START,
+        rate: float = 100.0,
+        passphrase: str = DEFAULT_PASSPHRASE,
+        kdf: Tuple[int, int, int] = LOADGEN_KDF,
+    ) -> None:
+        if count < 0 or senders <= 0 or recipients < 0:
+            raise ValueError("count y recipients deben ser >= 0 y senders > 0")
+        if nonces not in NONCE_MODES:
+            raise ValueError(f"Distribución de nonces desconocida: {nonces} (opciones: {', '.join(NONCE_MODES)})")
+        if nonce_gap <= 0 or value_digits <= 0 or rate <= 0:
+            raise ValueError("nonce_gap, value_digits y rate deben ser positivos")
+        if not 0 <= decimals <= 18:
+            raise ValueError("decimals debe estar entre 0 y 18")
+        if not 0 <= data_bytes[0] <= data_bytes[1]:
+            raise ValueError("data_bytes debe ser MIN:MAX con 0 <= MIN <= MAX")
+        if invalid < 0 or replay < 0 or invalid + replay > 1:
+            raise ValueError("invalid y replay son fracciones que juntas no pasan de 1")
+        self.count = count
+        self.seed = seed
+        self.senders = senders
+        self.recipients = recipients
+        self.nonces = nonces
+        self.nonce_gap = nonce_gap
+        self.value_digits = value_digits
+        self.decimals = decimals
+        self.data_bytes = tuple(data_bytes)
+        self.invalid = invalid
+        self.replay = replay
+        self.start = start
+        self.rate = rate
+        self.passphrase = passphrase
+        self.kdf = tuple(kdf)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {name: getattr(self, name) for name in self.__slots__ if name != "passphrase"}
+        d["data_bytes"], d["kdf"] = list(self.data_bytes), list(self.kdf)
+        return d
+
+
+def sender_key(seed: int, sender: int) -> bytes:
+    '''
+    Llave privada Ed25519 (32 bytes) del remitente número "sender"
+    '''
+    return hashlib.sha256(f"{seed}:sender:{sender}".encode()).digest()
+
+
+def sender_address(seed: int, sender: int) -> str:
+    return derive_address_btc_style(ed25519_public_key(sender_key(seed, sender)))
+
+
+# ------------------------------------------------------------
+# Generación (corre en cada proceso)
+# ------------------------------------------------------------
+class _Generator:
+    '''
+    Estado de un proceso: sesiones de los remitentes que ya firmaron y el
+    orden de la ronda actual
+    '''
+
+    def __init__(self, spec: LoadSpec) -> None:
+        self.spec = spec
+        self.start = datetime.fromisoformat(spec.start.replace("Z", "+00:00"))
+        self._sessions: Dict[int, SignerSession] = {}
+        self._addresses: Dict[int, str] = {}
+        self._round = -1
+        self._order: List[int] = []
+
+    def session(self, sender: int) -> SignerSession:
+        session = self._sessions.get(sender)
+        if session is None:
+            t_cost, m_cost, parallelism = self.spec.kdf
+            keystore = create_keystore(self.spec.passphrase, t_cost, m_cost, parallelism,
+                                       private_key_bytes=sender_key(self.spec.seed, sender))
+            session = SignerSession(keystore, self.spec.passphrase, idle_timeout=None)
+            self._sessions[sender] = session
+        return session
+
+    def recipient(self, rng: random.Random) -> str:
+        '''
+        Destinatario: otro remitente o una de las direcciones extra
+        '''
+        spec = self.spec
+        n = rng.randrange(spec.senders + spec.recipients)
+        if n < spec.senders:
+            address = self._addresses.get(n)
+            if address is None:
+                address = self._addresses[n] = sender_address(spec.seed, n)
+            return address
+        digest = hashlib.sha256(f"{spec.seed}:to:{n - spec.senders}".encode()).digest()
+        return "0x" + digest[:20].hex()
+
+    def sender_of(self, index: int) -> Tuple[int, int]:
+        '''
+        (remitente, número de tx de ese remitente) del registro "index"
+        '''
+        senders = self.spec.senders
+        rnd, pos = divmod(index, senders)
+        if rnd != self._round:
+            self._order = list(range(senders))
+            random.Random(f"{self.spec.seed}:round:{rnd}").shuffle(self._order)
+            self._round = rnd
+        return self._order[pos], rnd
+
+    def tx(self, index: int, rng: random.Random, sender: int, k: int) -> Dict[str, Any]:
+        spec = self.spec
+        if spec.nonces == "sequential":
+            nonce = k + 1
+        elif spec.nonces == "gapped":
+            nonce = k * spec.nonce_gap + 1 + rng.randrange(spec.nonce_gap)
+        else:
+            nonce = rng.randrange(1, 2 ** 53)
+
+        digits = rng.randint(1, spec.value_digits)
+        value = str(rng.randrange(10 ** (digits - 1) if digits > 1 else 1, 10 ** digits))
+        if spec.decimals:
+            value += f".{rng.randrange(10 ** spec.decimals):0{spec.decimals}d}"
+
+        gas_limit = data_hex = None
+        size = rng.randint(*spec.data_bytes)
+        if size:
+            data_hex = "0x" + rng.randbytes(size).hex()
+            gas_limit = 21000 + 16 * size
+
+        timestamp = (self.start + timedelta(seconds=index / spec.rate)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return create_tx(self.session(sender).address, self.recipient(rng), value, nonce,
+                         gas_limit=gas_limit, data_hex=data_hex, timestamp=timestamp)
+
+    def damage(self, signed: Dict[str, Any], rng: random.Random, sender: int) -> str:
+        '''
+        Daña un paquete firmado; regresa el tipo de daño
+        '''
+        kind = rng.choice(INVALID_KINDS)
+        if kind == "wrong_key" and self.spec.senders < 2:
+            kind = "bad_signature"
+        if kind == "bad_signature":
+            signature = bytearray(base64.b64decode(signed["signature_b64"]))
+            signature[rng.randrange(len(signature))] ^= 1 << rng.randrange(8)
+            signed["signature_b64"] = base64.b64encode(bytes(signature)).decode("utf-8")
+        elif kind == "tampered":
+            signed["tx"]["value"] = str(signed["tx"]["value"]) + "0"
+        else:
+            other = (sender + 1 + rng.randrange(self.spec.senders - 1)) % self.spec.senders
+            signed["pubkey_b64"] = base64.b64encode(self.session(other).public_key_bytes).decode("utf-8")
+        return kind
+
+    def chunk(self, number: int, fmt: str) -> Tuple[int, List[bytes], Dict[str, int]]:
+        '''
+        Registros del bloque "number", ya codificados en el formato de salida
+        '''
+        spec = self.spec
+        rng = random.Random(f"{spec.seed}:chunk:{number}")
+        start = number * CHUNK_SIZE
+        end = min(start + CHUNK_SIZE, spec.count)
+        records: List[bytes] = []
+        valid: List[bytes] = []
+        counts: Dict[str, int] = {"valid": 0, "replay": 0}
+        for index in range(start, end):
+            roll = rng.random()
+            if spec.invalid <= roll < spec.invalid + spec.replay and valid:
+                records.append(valid[rng.randrange(len(valid))])
+                counts["replay"] += 1
+                continue
+            sender, k = self.sender_of(index)
+            signed = self.session(sender).sign(self.tx(index, rng, sender, k))
+            kind = self.damage(signed, rng, sender) if roll < spec.invalid else "valid"
+            counts[kind] = counts.get(kind, 0) + 1
+            record = _encode(signed, fmt)
+            records.append(record)
+            if kind == "valid":
+                valid.append(record)
+        return number, records, counts
+
+
+def _encode(signed: Dict[str, Any], fmt: str) -> bytes:
+    if fmt == "json":
+        return json.dumps(signed, indent=2, ensure_ascii=False).encode("utf-8")
+    if fmt == "ndjson":
+        return json.dumps(signed, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+    return encode_envelope(signed)
+
+
+_WORKER: Optional[_Generator] = None
+
+
+def _init_worker(spec: LoadSpec) -> None:
+    global _WORKER
+    _WORKER = _Generator(spec)
+
+
+def _run_chunk(number: int, fmt: str) -> Tuple[int, List[bytes], Dict[str, int]]:
+    return _WORKER.chunk(number, fmt)
+
+
+def _save_keystores(spec: LoadSpec, senders: range, directory: str) -> None:
+    t_cost, m_cost, parallelism = spec.kdf
+    for sender in senders:
+        keystore = create_keystore(spec.passphrase, t_cost, m_cost, parallelism,
+                                   private_key_bytes=sender_key(spec.seed, sender))
+        save_keystore(keystore, Path(directory) / f"sender_{sender:05d}.keystore.json")
+
+
+# ------------------------------------------------------------
+# Orquestación
+# ------------------------------------------------------------
+def _chunks(spec: LoadSpec, fmt: str, workers: int) -> Iterator[Tuple[int, List[bytes], Dict[str, int]]]:
+    '''
+    Bloques en orden; con varios procesos hay a lo más 2 * workers en vuelo
+    '''
+    total = (spec.count + CHUNK_SIZE - 1) // CHUNK_SIZE
+    if workers <= 1:
+        generator = _Generator(spec)
+        for number in range(total):
+            yield generator.chunk(number, fmt)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+        pending = []
+        submitted = 0
+        while submitted < total or pending:
+            while submitted < total and len(pending) < 2 * workers:
+                pending.append(pool.submit(_run_chunk, submitted, fmt))
+                submitted += 1
+            yield pending.pop(0).result()
+
+
+def generate(
+    spec: LoadSpec,
+    out: Path | str,
+    fmt: str = "ndjson",
+    workers: Optional[int] = None,
+    keystore_dir: Optional[Path | str] = None,
+) -> Dict[str, Any]:
+    '''
+    Genera el corpus en "out" y regresa un resumen:
+        {"count", "valid", "invalid", "replay", "kinds": {tipo: n}, "elapsed_s", "spec"}
+    - keystore_dir: además guarda el keystore de cada remitente (passphrase de spec)
+    '''
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt} (opciones: {', '.join(FORMATS)})")
+    workers = workers or os.cpu_count() or 1
+    out = Path(out)
+    start = time.perf_counter()
+
+    if keystore_dir is not None:
+        Path(keystore_dir).mkdir(parents=True, exist_ok=True)
+        step = (spec.senders + workers - 1) // workers
+        parts = [range(i, min(i + step, spec.senders)) for i in range(0, spec.senders, step)]
+        if workers <= 1:
+            for part in parts:
+                _save_keystores(spec, part, str(keystore_dir))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_save_keystores, [spec] * len(parts), parts, [str(keystore_dir)] * len(parts)))
+
+    counts: Dict[str, int] = {}
+    ledger = None
+    stream = None
+    if fmt == "ndjson":
+        out.parent.mkdir(parents=True, exist_ok=True)
+        stream = open(out, "wb")
+    elif fmt == "ledger":
+        ledger = open_ledger(out)
+    else:
+        out.mkdir(parents=True, exist_ok=True)
+    suffix = ".json" if fmt == "json" else BINARY_SUFFIX
+    try:
+        for number, records, chunk_counts in _chunks(spec, fmt, workers):
+            for kind, n in chunk_counts.items():
+                counts[kind] = counts.get(kind, 0) + n
+            if stream is not None:
+                stream.write(b"".join(records))
+            elif ledger is not None:
+                ledger.append_many(records)
+            else:
+                for i, record in enumerate(records, start=number * CHUNK_SIZE):
+                    (out / f"tx_{i:08d}{suffix}").write_bytes(record)
+    finally:
+        if stream is not None:
+            stream.close()
+        if ledger is not None:
+            ledger.close()
+
+    valid = counts.pop("valid", 0)
+    replay = counts.pop("replay", 0)
+    return {
+        "count": spec.count,
+        "valid": valid,
+        "invalid": sum(counts.values()),
+        "replay": replay,
+        "kinds": dict(sorted(counts.items())),
+        "elapsed_s": time.perf_counter() - start,
+        "spec": spec.to_dict(),
+    }
+
+
+def _parse_range(value: str) -> Tuple[int, int]:
+    lo, _, hi = value.partition(":")
+    return int(lo), int(hi or lo)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.loadgen",
+                                     description="Genera corpus reproducibles de transacciones firmadas")
+    parser.add_argument("--count", type=int, required=True, help="Número de paquetes")
+    parser.add_argument("--out", required=True, help="Archivo (ndjson) o directorio (json, binary, ledger)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson", help="Formato de salida (por defecto ndjson)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla (mismo valor, mismo corpus)")
+    parser.add_argument("--senders", type=int, default=16, help="Remitentes distintos")
+    parser.add_argument("--recipients", type=int, default=64, help="Destinatarios extra además de los remitentes")
+    parser.add_argument("--nonces", choices=NONCE_MODES, default="sequential", help="Distribución de nonces")
+    parser.add_argument("--nonce-gap", type=int, default=10, help="Hueco máximo entre nonces con --nonces gapped")
+    parser.add_argument("--value-digits", type=int, default=6, help="Dígitos enteros máximos de 'value'")
+    parser.add_argument("--decimals", type=int, default=2, help="Decimales de 'value' (0-18)")
+    parser.add_argument("--data-bytes", type=_parse_range, default=(0, 0),
+                        help="Tamaño de data_hex en bytes, MIN:MAX (por defecto 0: sin data_hex)")
+    parser.add_argument("--invalid", type=float, default=0.0, help="Fracción de paquetes dañados a propósito")
+    parser.add_argument("--replay", type=float, default=0.0, help="Fracción de paquetes repetidos (replay)")
+    parser.add_argument("--start", default=DEFAULT_START, help="Timestamp ISO8601 del primer paquete")
+    parser.add_argument("--rate", type=float, default=100.0, help="Paquetes por segundo para los timestamps")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--kdf-m-cost", type=int, default=LOADGEN_KDF[1],
+                        help="Memoria de Argon2 (KiB) de los keystores de los remitentes")
+    parser.add_argument("--keystore-dir", default=None, help="Guardar también el keystore de cada remitente")
+    parser.add_argument("--manifest", default=None, help="Guardar el resumen y los parámetros en JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = LoadSpec(
+            args.count, seed=args.seed, senders=args.senders, recipients=args.recipients,
+            nonces=args.nonces, nonce_gap=args.nonce_gap, value_digits=args.value_digits,
+            decimals=args.decimals, data_bytes=args.data_bytes, invalid=args.invalid, replay=args.replay,
+            start=args.start, rate=args.rate, kdf=(LOADGEN_KDF[0], args.kdf_m_cost, LOADGEN_KDF[2]),
+        )
+        summary = generate(spec, args.out, args.format, args.workers, args.keystore_dir)
+    except ValueError as e:
+        print(f"[!] {e}", file=sys.stderr)
+        sys.exit(1)
+
+    rate = summary["count"] / summary["elapsed_s"] if summary["elapsed_s"] else 0.0
+    kinds = ", ".join(f"{k}: {n}" for k, n in summary["kinds"].items()) or "-"
+    print(f"[+] {summary['count']} paquetes -> {args.out} ({args.format}) en {summary['elapsed_s']:.2f} s "
+          f"({rate:,.0f} tx/s): {summary['valid']} válidos, {summary['invalid']} dañados ({kinds}), "
+          f"{summary['replay']} replays")
+    if args.manifest:
+        Path(args.manifest).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        print(f"[+] Resumen guardado en {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# app/metrics.py
+
+"""
+Contadores e histogramas de latencia por etapa, exportables a archivo.
+
+Para saber en qué se va el tiempo en producción sin pagar nada cuando no
+se mide:
+
+1) Desactivado (por defecto), cada punto instrumentado solo revisa la
+   bandera ENABLED del módulo; no toma tiempos ni locks.
+2) Activado con enable(), cada etapa suma su duración a un histograma con
+   cubetas fijas (1 µs a 10 s) y los resultados de verificación se cuentan
+   por revisión (firma o nonce) y motivo ("ok", "stale nonce", "address
+   mismatch", ...).
+3) Un hilo en segundo plano escribe cada "interval" segundos (y al salir
+   del proceso) un snapshot JSON y un archivo en formato de texto de
+   Prometheus. Ambos se escriben con tmp + os.replace, así el recolector
+   de archivos de texto (node_exporter --collector.textfile) nunca lee uno
+   a medias y no hace falta ningún servicio de red.
+
+Etapas: load_keystore, derive_aes_key, decrypt_data, canonical_bytes,
+ed25519_sign, ed25519_verify, derive_address, nonce_state_read y
+nonce_state_write.
+
+Las métricas son por proceso. Para el trabajo que corre en un
+ProcessPoolExecutor (recv --dir, verify_many con procesos), la tarea se
+envuelve con call_measured(): el proceso hijo mide su bloque y regresa lo
+medido junto con el resultado, y el padre lo suma con merge().
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Lo revisa cada punto instrumentado; lo cambian enable() y disable()
+ENABLED = False
+
+STAGES = (
+    "load_keystore", "derive_aes_key", "decrypt_data", "canonical_bytes", "ed25519_sign",
+    "ed25519_verify", "derive_address", "nonce_state_read", "nonce_state_write",
+)
+# Límites superiores de las cubetas (segundos); la última cubeta es +Inf
+BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+_BUCKETS_NS = tuple(round(b * 1e9) for b in BUCKETS)
+
+DEFAULT_EXPORT_INTERVAL = 10.0
+JSON_NAME = "wallet_metrics.json"
+PROM_NAME = "wallet_metrics.prom"
+# Variable de entorno con el directorio de exportación (la CLI la lee)
+METRICS_DIR_ENV = "WALLET_METRICS_DIR"
+
+
+class Histogram:
+    '''
+    Histograma acumulado en nanosegundos con las cubetas de BUCKETS
+    '''
+
+    __slots__ = ("counts", "count", "sum_ns")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(_BUCKETS_NS) + 1)
+        self.count = 0
+        self.sum_ns = 0
+
+    def observe(self, ns: int) -> None:
+        self.counts[bisect_left(_BUCKETS_NS, ns)] += 1
+        self.count += 1
+        self.sum_ns += ns
+
+    def cumulative(self) -> List[int]:
+        out, total = [], 0
+        for n in self.counts:
+            total += n
+            out.append(total)
+        return out
+
+
+class Registry:
+    '''
+    Histogramas por etapa y contadores con etiquetas, seguros entre hilos
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+
+    def observe(self, stage: str, ns: int) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(ns)
+
+    def inc(self, name: str, value: int = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def state(self) -> Dict[str, Any]:
+        '''
+        Estado crudo y serializable con pickle (para mandarlo entre procesos)
+        '''
+        with self._lock:
+            return {
+                "histograms": {stage: (list(h.counts), h.count, h.sum_ns) for stage, h in self._histograms.items()},
+                "counters": list(self._counters.items()),
+            }
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        '''
+        Suma un estado de state() (de otro proceso) a este registro
+        '''
+        with self._lock:
+            for stage, (counts, count, sum_ns) in state["histograms"].items():
+                histogram = self._histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histograms[stage] = Histogram()
+                for i, n in enumerate(counts):
+                    histogram.counts[i] += n
+                histogram.count += count
+                histogram.sum_ns += sum_ns
+            for key, value in state["counters"]:
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        '''
+        Estado actual como diccionario (lo que se guarda en el JSON):
+            {"timestamp", "stages": {etapa: {"count", "sum_s", "mean_us", "buckets": [[le, acumulado], ...]}},
+             "counters": {nombre: [{"labels": {...}, "value": n}, ...]}}
+        '''
+        with self._lock:
+            stages = {}
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = h.cumulative()
+                stages[stage] = {
+                    "count": h.count,
+                    "sum_s": h.sum_ns / 1e9,
+                    "mean_us": h.sum_ns / h.count / 1e3 if h.count else 0.0,
+                    "buckets": [[le, n] for le, n in zip(list(BUCKETS) + ["+Inf"], cumulative)],
+                }
+            counters: Dict[str, List[Dict[str, Any]]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"timestamp": time.time(), "stages": stages, "counters": counters}
+
+    def to_prometheus(self) -> str:
+        '''
+        Formato de texto de Prometheus (exposition format 0.0.4)
+        '''
+        snap = self.snapshot()
+        lines = [
+            "# HELP wallet_stage_seconds Duración de cada etapa del wallet",
+            "# TYPE wallet_stage_seconds histogram",
+        ]
+        for stage, data in snap["stages"].items():
+            for le, n in data["buckets"]:
+                bound = le if isinstance(le, str) else repr(float(le))
+                lines.append(f'wallet_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'wallet_stage_seconds_sum{{stage="{stage}"}} {data["sum_s"]!r}')
+            lines.append(f'wallet_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+        for name, series in snap["counters"].items():
+            metric = f"wallet_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for s in series:
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in s["labels"].items())
+                lines.append(f"{metric}{{{labels}}} {s['value']}" if labels else f"{metric} {s['value']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+if hasattr(os, "register_at_fork"):
+    # Un hijo creado con fork mientras el exportador tenía el lock lo heredaría tomado
+    os.register_at_fork(after_in_child=lambda: setattr(REGISTRY, "_lock", threading.Lock()))
+
+
+# ------------------------------------------------------------
+# Instrumentación
+# ------------------------------------------------------------
+def observe(stage: str, ns: int) -> None:
+    REGISTRY.observe(stage, ns)
+
+
+def inc(name: str, value: int = 1, **labels: str) -> None:
+    REGISTRY.inc(name, value, **labels)
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    '''
+    Decorador: mide cada llamada como la etapa "stage" si ENABLED
+    (para funciones de milisegundos; las de microsegundos revisan ENABLED
+    en línea para no pagar la llamada extra)
+    '''
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(stage, time.perf_counter_ns() - start)
+        return wrapper
+    return decorator
+
+
+def count_result(check: str, result: Dict[str, Any]) -> None:
+    '''
+    Cuenta un resultado de verificación por revisión ("signature" o
+    "nonce") y motivo, sin el detalle variable ("stale nonce: 3 <= 5"
+    cuenta como "stale nonce")
+    '''
+    reason = result.get("reason") or ""
+    REGISTRY.inc("verify_results", check=check, reason=reason.split(":", 1)[0] or "unknown")
+
+
+def call_measured(func: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, Any]]:
+    '''
+    Para un proceso de un pool: corre func(*args) midiendo y regresa
+    (resultado, estado medido) para que el padre lo pase a merge()
+    - No arranca ningún exportador en el hijo; el padre es quien escribe
+    - Con fork el hijo hereda lo que el padre ya había medido: se descarta
+    '''
+    global ENABLED
+    ENABLED = True
+    REGISTRY.reset()
+    try:
+        result = func(*args)
+        return result, REGISTRY.state()
+    finally:
+        REGISTRY.reset()
+
+
+def merge(state: Dict[str, Any]) -> None:
+    REGISTRY.merge(state)
+
+
+# ------------------------------------------------------------
+# Exportación
+# ------------------------------------------------------------
+def _write_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write(json_path: Optional[Path | str] = None, prom_path: Optional[Path | str] = None) -> None:
+    '''
+    Escribe el snapshot JSON y/o el archivo de Prometheus
+    '''
+    if json_path is not None:
+        _write_atomic(Path(json_path), json.dumps(REGISTRY.snapshot(), indent=2, ensure_ascii=False))
+    if prom_path is not None:
+        _write_atomic(Path(prom_path), REGISTRY.to_prometheus())
+
+
+class _Exporter(threading.Thread):
+    '''
+    Hilo que escribe los archivos cada "interval" segundos
+    '''
+
+    def __init__(self, json_path: Optional[Path], prom_path: Optional[Path], interval: float) -> None:
+        super().__init__(name="wallet-metrics", daemon=True)
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.export()
+
+    def export(self) -> None:
+        try:
+            write(self.json_path, self.prom_path)
+        except OSError:
+            # Un disco lleno no debe tumbar el comando que se está midiendo
+            pass
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.export()
+
+
+_EXPORTER: Optional[_Exporter] = None
+
+
+def enable(
+    directory: Optional[Path | str] = None,
+    json_path: Optional[Path | str] = None,
+    prom_path: Optional[Path | str] = None,
+    interval: float = DEFAULT_EXPORT_INTERVAL,
+) -> None:
+    '''
+    Activa la medición
+    - directory: escribe ahí wallet_metrics.json y wallet_metrics.prom
+      (json_path / prom_path eligen rutas sueltas)
+    - Sin rutas solo se mide en memoria (snapshot() / write() a mano)
+    - Los archivos se escriben cada "interval" segundos y al salir
+    '''
+    global ENABLED, _EXPORTER
+    if interval <= 0:
+        raise ValueError("interval debe ser positivo")
+    if directory is not None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        json_path = directory / JSON_NAME if json_path is None else json_path
+        prom_path = directory / PROM_NAME if prom_path is None else prom_path
+    if _EXPORTER is not None:
+        _EXPORTER.stop()
+        _EXPORTER = None
+    if json_path is not None or prom_path is not None:
+        _EXPORTER = _Exporter(
+            Path(json_path) if json_path is not None else None,
+            Path(prom_path) if prom_path is not None else None,
+            interval,
+        )
+        _EXPORTER.start()
+    ENABLED = True
+
+
+def disable() -> None:
+    '''
+    Desactiva la medición y escribe los archivos una última vez
+    '''
+    global ENABLED, _EXPORTER
+    ENABLED = False
+    if _EXPORTER is not None:
+        _EXPORTER.stop()
+        _EXPORTER = None
+
+
+def snapshot() -> Dict[str, Any]:
+    return REGISTRY.snapshot()
+
+
+atexit.register(disable)
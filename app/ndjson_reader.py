@@ -0,0 +1,218 @@
+# app/ndjson_reader.py
+
+"""
+Lector de archivos NDJSON enormes (un paquete firmado por línea) con mmap.
+
+Las contrapartes mandan volcados de gigabytes. En lugar de read_text() +
+json.loads de todo el archivo:
+
+1) El archivo se mapea en memoria (mmap, solo lectura) y se recorre buscando
+   saltos de línea; solo se copia la línea que se está leyendo. La memoria
+   usada no depende del tamaño del archivo (el kernel descarta las páginas
+   ya leídas).
+2) Cada línea no vacía es un registro con número (0, 1, 2, ...) y offset en
+   bytes. Una línea que no es JSON válido o no es un objeto se reporta con
+   su offset y la lectura sigue con la siguiente.
+3) Índice de offsets opcional (<archivo>.idx): un uint64 por registro. Con
+   él se puede reanudar desde el registro N o leer un registro suelto sin
+   recorrer lo anterior. Guarda el tamaño y la fecha de modificación del
+   archivo; si no coinciden, el índice se ignora. Si no se puede escribir
+   junto al archivo (directorio de solo lectura), se usa solo en memoria.
+
+Cada registro es:
+    {"index": int, "offset": int, "ok": bool, "envelope": dict | None, "error": str | None}
+y "envelope" se puede pasar directo a verify_signed_tx.
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+# Encabezado del índice: magic, tamaño del archivo, mtime_ns, número de registros
+_INDEX_HEADER = struct.Struct("<4sQQQ")
+_INDEX_MAGIC = b"NDX1"
+INDEX_SUFFIX = ".idx"
+
+_WHITESPACE = b" \t\r\n"
+
+
+class NdjsonReader:
+    '''
+    Lector de un archivo NDJSON mapeado en memoria
+    - records(start=N) lee desde el registro N (con índice) o desde un offset
+    - record(n) lee un registro suelto (requiere índice)
+    - build_index() / load_index() manejan el índice de offsets
+    '''
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        self._file = open(self.path, "rb")
+        st = os.fstat(self._file.fileno())
+        self.size = st.st_size
+        self._mtime_ns = st.st_mtime_ns
+        # mmap no acepta archivos vacíos
+        self._mm: Optional[mmap.mmap] = None
+        if self.size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(self._mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                self._mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._offsets: Optional[array] = None
+
+    # --------------------------------------------------------
+    # Lectura secuencial
+    # --------------------------------------------------------
+    def _lines(self, offset: int) -> Iterator[tuple]:
+        '''
+        (inicio, fin) de cada línea no vacía a partir de "offset"
+        '''
+        mm = self._mm
+        if mm is None:
+            return
+        size = self.size
+        pos = offset
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            # Líneas vacías o solo con espacios no cuentan como registro
+            # (casi siempre basta ver el primer byte; no se copia la línea)
+            if end > pos and (mm[pos] not in _WHITESPACE or mm[pos:end].strip(_WHITESPACE)):
+                yield pos, end
+            pos = end + 1
+
+    def _parse(self, index: int, start: int, end: int) -> Dict[str, Any]:
+        try:
+            envelope = json.loads(self._mm[start:end])
+        except ValueError as e:
+            return {"index": index, "offset": start, "ok": False, "envelope": None,
+                    "error": f"offset {start}: JSON inválido ({e})"}
+        if not isinstance(envelope, dict):
+            return {"index": index, "offset": start, "ok": False, "envelope": None,
+                    "error": f"offset {start}: se esperaba un objeto JSON"}
+        return {"index": index, "offset": start, "ok": True, "envelope": envelope, "error": None}
+
+    def records(self, start: int = 0, offset: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        '''
+        Registros en orden, uno a la vez
+        - start: número del primer registro; si no es 0 se usa el índice
+          (se carga o se construye)
+        - offset: alternativa a start, el offset en bytes de una línea
+          conocida (p. ej. el de un registro reportado antes); la numeración
+          empieza en "start"
+        '''
+        if offset is None:
+            offset = 0
+            if start:
+                offsets = self.offsets()
+                if start >= len(offsets):
+                    return
+                offset = offsets[start]
+        index = start
+        for line_start, line_end in self._lines(offset):
+            yield self._parse(index, line_start, line_end)
+            index += 1
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.records()
+
+    # --------------------------------------------------------
+    # Índice de offsets
+    # --------------------------------------------------------
+    def build_index(self, save: bool = True) -> array:
+        '''
+        Recorre el archivo (sin parsear JSON) y guarda el offset de cada registro
+        '''
+        offsets = array("Q", (start for start, _ in self._lines(0)))
+        self._offsets = offsets
+        if save:
+            self._save_index(offsets)
+        return offsets
+
+    def _save_index(self, offsets: array) -> None:
+        data = offsets
+        if sys.byteorder == "big":
+            data = array("Q", offsets)
+            data.byteswap()
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, self.size, self._mtime_ns, len(offsets)))
+                f.write(data.tobytes())
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            raise
+
+    def load_index(self) -> Optional[array]:
+        '''
+        Carga el índice guardado si corresponde a este archivo (mismo tamaño y mtime)
+        '''
+        try:
+            raw = self.index_path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if len(raw) < _INDEX_HEADER.size:
+            return None
+        magic, size, mtime_ns, count = _INDEX_HEADER.unpack_from(raw)
+        body = raw[_INDEX_HEADER.size:]
+        if magic != _INDEX_MAGIC or size != self.size or mtime_ns != self._mtime_ns or len(body) != count * 8:
+            return None
+        offsets = array("Q")
+        offsets.frombytes(body)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        self._offsets = offsets
+        return offsets
+
+    def offsets(self) -> array:
+        '''
+        Índice en memoria; lo carga de disco o lo construye si hace falta
+        - Si no se puede guardar (p. ej. el volcado está en un directorio
+          de solo lectura), se queda solo en memoria
+        '''
+        if self._offsets is None and self.load_index() is None:
+            offsets = self.build_index(save=False)
+            with contextlib.suppress(OSError):
+                self._save_index(offsets)
+        return self._offsets
+
+    def record(self, n: int) -> Dict[str, Any]:
+        '''
+        Registro número n (acceso aleatorio con el índice)
+        '''
+        offsets = self.offsets()
+        if not 0 <= n < len(offsets):
+            raise IndexError(f"No hay registro {n} (el archivo tiene {len(offsets)})")
+        start = offsets[n]
+        end = self._mm.find(b"\n", start)
+        return self._parse(n, start, self.size if end < 0 else end)
+
+    def __len__(self) -> int:
+        return len(self.offsets())
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> "NdjsonReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_ndjson(path: Path | str) -> NdjsonReader:
+    '''
+    Abre un archivo NDJSON de paquetes firmados para leerlo en flujo
+    '''
+    return NdjsonReader(path)
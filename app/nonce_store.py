@@ -0,0 +1,374 @@
+# app/nonce_store.py
+
+"""
+Almacenamiento del último nonce visto por dirección (protección contra replay).
+
+Antes el verificador leía y reescribía todo nonce_state.json por cada
+transacción. Aquí el estado vive en memoria y en disco se guarda como:
+
+1) Un snapshot: el mismo JSON {address: nonce} de siempre (nonce_state.json),
+   así los archivos de estado existentes se siguen pudiendo leer.
+2) Un log de solo-agregar (nonce_state.json.log) con una línea
+   "address nonce" por cada actualización. Escribir cuesta O(1) por tx.
+3) Compactación: cada cierto número de registros el estado completo se
+   escribe como nuevo snapshot (archivo temporal + os.replace, atómico)
+   y el log se vacía.
+
+Si el proceso muere a mitad de una escritura, al cargar se descarta la
+última línea incompleta del log.
+
+Varios procesos pueden compartir el mismo estado (shared=True): cada
+actualización es un compare-and-set por dirección hecho bajo un lock de
+archivo (fcntl.flock), que solo se toma durante la actualización, nunca
+mientras se verifica una firma.
+"""
+
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, el modo compartido no bloquea
+    fcntl = None
+
+# Cada cuántos registros en el log se compacta en un snapshot nuevo
+DEFAULT_COMPACT_EVERY = 10000
+
+
+class NonceStore:
+    '''
+    Estado de nonces solo en memoria (sin disco)
+    - Sirve como base para los almacenes persistentes y para pruebas
+    - get regresa -1 si la dirección nunca se ha visto
+    '''
+
+    def __init__(self) -> None:
+        self._state: Dict[str, int] = {}
+
+    def get(self, address: str) -> int:
+        return self._state.get(address, -1)
+
+    def set(self, address: str, nonce: int) -> None:
+        self._state[address] = int(nonce)
+
+    def compare_and_set(self, address: str, expected: int, new: int) -> bool:
+        '''
+        Cambia el nonce de la dirección a "new" solo si el actual es "expected"
+        '''
+        if self.get(address) != expected:
+            return False
+        self.set(address, new)
+        return True
+
+    def advance(self, address: str, nonce: int) -> Tuple[bool, int]:
+        '''
+        Acepta el nonce solo si es mayor al último visto para la dirección
+        Regresa (aceptado, último nonce antes de la operación)
+        - Ciclo de compare-and-set: si otro proceso avanzó la dirección entre
+          la lectura y la escritura, se vuelve a leer y a comparar
+        - Los nonces solo crecen, así que un valor en caché viejo nunca
+          rechaza de más: si ya es >= nonce, el real también lo es
+        '''
+        while True:
+            last = self.get(address)
+            if nonce <= last:
+                return False, last
+            if self.compare_and_set(address, last, nonce):
+                return True, last
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        return iter(self._state.items())
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "NonceStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class LogNonceStore(NonceStore):
+    '''
+    Estado de nonces con snapshot JSON + log de solo-agregar
+
+    Política de escritura a disco (flush):
+    - flush_every=1: en cada transacción (por defecto, lo más seguro)
+    - flush_every=N: cada N transacciones
+    - flush_interval_ms=T: si pasaron T ms desde el último flush
+      (se revisa en cada escritura, no hay hilo en segundo plano)
+    - flush_every=None y sin intervalo: solo con flush()/close()
+    Con fsync=True cada flush espera a que los datos lleguen al disco.
+
+    Con shared=True el archivo se comparte entre procesos: cada escritura
+    toma el lock, lee lo que otros procesos agregaron al log, compara y
+    escribe su línea antes de soltarlo. En ese modo la línea siempre llega
+    al sistema operativo de inmediato (visible para los demás procesos) y la
+    política de flush solo decide cuándo se hace fsync.
+    '''
+
+    def __init__(
+        self,
+        path: Path | str,
+        flush_every: Optional[int] = 1,
+        flush_interval_ms: Optional[float] = None,
+        compact_every: Optional[int] = DEFAULT_COMPACT_EVERY,
+        fsync: bool = True,
+        shared: bool = False,
+    ) -> None:
+        super().__init__()
+        if flush_every is not None and flush_every <= 0:
+            raise ValueError("flush_every debe ser positivo o None")
+
+        self.path = Path(path)
+        self.log_path = self.path.with_name(self.path.name + ".log")
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.flush_every = flush_every
+        self.flush_interval_ms = flush_interval_ms
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.shared = shared
+
+        # Líneas aún no escritas en el log (modo no compartido)
+        self._pending: list[str] = []
+        # Líneas escritas pero sin fsync (modo compartido)
+        self._unsynced = 0
+        self._log_records = 0
+        self._log_offset = 0
+        self._snapshot_id: Optional[Tuple[int, int, int]] = None
+        self._last_flush = time.monotonic()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.lock_path, "a+b") if shared else None
+        with self._locked():
+            self._load()
+            self._log = open(self.log_path, "ab")
+
+    # ------------------------------------------------------------
+    # Lock entre procesos
+    # ------------------------------------------------------------
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        '''
+        Lock exclusivo sobre el archivo .lock (solo en modo compartido)
+        '''
+        if self._lock_file is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _stat_snapshot(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    # ------------------------------------------------------------
+    # Carga y recuperación
+    # ------------------------------------------------------------
+    @metrics.timed("nonce_state_read")
+    def _load(self) -> None:
+        '''
+        Carga el snapshot y vuelve a aplicar el log encima
+        - Trunca una última línea incompleta (escritura interrumpida)
+        '''
+        self._state = {}
+        self._log_records = 0
+        self._log_offset = 0
+        self._snapshot_id = self._stat_snapshot()
+        if self._snapshot_id is not None:
+            data = json.loads(self.path.read_text(encoding="utf-8") or "{}")
+            # Convierte el nonce a int
+            self._state = {addr: int(nonce) for addr, nonce in data.items()}
+
+        if not self.log_path.exists():
+            return
+
+        raw = self.log_path.read_bytes()
+        good_end = raw.rfind(b"\n") + 1
+        if good_end < len(raw):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_end)
+        self._apply_log(raw[:good_end])
+
+    def _apply_log(self, raw: bytes) -> None:
+        for line in raw.decode("utf-8").splitlines():
+            address, _, nonce = line.rpartition(" ")
+            if not address:
+                continue
+            # max(): volver a aplicar el log sobre un snapshot ya compactado no retrocede nada
+            self._state[address] = max(int(nonce), self._state.get(address, -1))
+            self._log_records += 1
+        self._log_offset += len(raw)
+
+    def _refresh(self) -> None:
+        '''
+        Trae lo que otros procesos escribieron desde la última lectura.
+        Debe llamarse con el lock tomado.
+        - Si otro proceso compactó (snapshot nuevo o log más corto), recarga todo
+        - Si no, solo lee la cola nueva del log
+        '''
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            log_size = 0
+        if self._stat_snapshot() != self._snapshot_id or log_size < self._log_offset:
+            self._load()
+            return
+        if log_size == self._log_offset:
+            return
+        start = time.perf_counter_ns() if metrics.ENABLED else 0
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            self._apply_log(f.read(log_size - self._log_offset))
+        if start:
+            metrics.observe("nonce_state_read", time.perf_counter_ns() - start)
+
+    # ------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------
+    def _record(self, address: str, nonce: int) -> None:
+        if " " in address or "\n" in address:
+            raise ValueError("Dirección inválida para el estado de nonces")
+        nonce = int(nonce)
+        self._state[address] = nonce
+        self._pending.append(f"{address} {nonce}\n")
+
+    def _flush_due(self, count: int) -> bool:
+        if self.flush_every is not None and count >= self.flush_every:
+            return True
+        return (
+            self.flush_interval_ms is not None
+            and (time.monotonic() - self._last_flush) * 1000 >= self.flush_interval_ms
+        )
+
+    def set(self, address: str, nonce: int) -> None:
+        if not self.shared:
+            self._record(address, nonce)
+            if self._flush_due(len(self._pending)):
+                self.flush()
+            return
+        with self._locked():
+            self._refresh()
+            self._record(address, nonce)
+            self._write_through()
+
+    def compare_and_set(self, address: str, expected: int, new: int) -> bool:
+        '''
+        En modo compartido la comparación y la escritura ocurren bajo el lock,
+        después de leer lo que otros procesos escribieron
+        '''
+        if not self.shared:
+            return super().compare_and_set(address, expected, new)
+        with self._locked():
+            self._refresh()
+            if self.get(address) != expected:
+                return False
+            self._record(address, new)
+            self._write_through()
+            return True
+
+    def _write_through(self) -> None:
+        '''
+        Modo compartido: escribe la línea de inmediato y hace fsync según la
+        política. Debe llamarse con el lock tomado.
+        '''
+        self._unsynced += len(self._pending)
+        self._write_pending(sync=self._flush_due(self._unsynced))
+        if self.compact_every is not None and self._log_records >= self.compact_every:
+            self._compact()
+
+    def _write_pending(self, sync: bool) -> None:
+        '''
+        Agrega al log las actualizaciones pendientes
+        '''
+        start = time.perf_counter_ns() if metrics.ENABLED and (self._pending or sync) else 0
+        if self._pending:
+            self._log.write("".join(self._pending).encode("utf-8"))
+            self._log.flush()
+            self._log_records += len(self._pending)
+            self._pending.clear()
+            self._log_offset = self._log.tell()
+        if sync:
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._unsynced = 0
+            self._last_flush = time.monotonic()
+        if start:
+            metrics.observe("nonce_state_write", time.perf_counter_ns() - start)
+
+    def flush(self) -> None:
+        '''
+        Escribe las actualizaciones pendientes y compacta si el log ya creció
+        '''
+        with self._locked():
+            self._write_pending(sync=True)
+            if self.compact_every is not None and self._log_records >= self.compact_every:
+                if self.shared:
+                    self._refresh()
+                self._compact()
+
+    def compact(self) -> None:
+        '''
+        Escribe el estado completo como snapshot (atómico) y vacía el log
+        '''
+        with self._locked():
+            self._write_pending(sync=True)
+            if self.shared:
+                self._refresh()
+            self._compact()
+
+    @metrics.timed("nonce_state_write")
+    def _compact(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self._state, indent=2, ensure_ascii=False))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._snapshot_id = self._stat_snapshot()
+
+        # Si el proceso muere antes de truncar, el log se vuelve a aplicar sin efecto
+        self._log.truncate(0)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_records = 0
+        self._log_offset = 0
+
+    def close(self) -> None:
+        if self._log.closed:
+            return
+        self.flush()
+        self._log.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def open_nonce_store(path: Path | str, shared: bool = True, **kwargs) -> LogNonceStore:
+    '''
+    Abre el almacén de nonces persistente en la ruta dada
+    - Acepta un nonce_state.json antiguo como snapshot inicial
+    - Por defecto en modo compartido, para que varios "wallet recv" sobre el
+      mismo archivo no acepten dos veces el mismo nonce
+    '''
+    return LogNonceStore(path, shared=shared, **kwargs)
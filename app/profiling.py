@@ -0,0 +1,205 @@
+# app/profiling.py
+
+"""
+Modo --profile de la CLI: perfila un subcomando sin cambiar su salida.
+
+Cuando "wallet recv" o "wallet sign" tarda en la máquina de un cliente:
+
+- cpu (por defecto): corre el comando bajo cProfile y escribe
+    <prefijo>.pstats     para pstats, snakeviz, etc.
+    <prefijo>.collapsed  pilas colapsadas ("a;b;c microsegundos") para
+                         flamegraph.pl, speedscope o inferno
+  Las pilas se reconstruyen del grafo de llamadas de cProfile: el tiempo de
+  cada función se reparte entre quienes la llamaron en proporción al
+  tiempo de cada llamada.
+- mem: corre el comando bajo tracemalloc y escribe
+    <prefijo>.alloc.txt      pico de memoria y las N líneas con más memoria
+                             viva al terminar
+    <prefijo>.mem.collapsed  pilas colapsadas pesadas en bytes
+
+En los dos modos el tiempo de Argon2 (derive_aes_key, medido con
+app.metrics) se reporta aparte del resto, para ver de inmediato si domina
+la KDF o nuestro código. Todo el reporte va a stderr; stdout queda igual
+que sin --profile.
+"""
+
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+from . import metrics
+
+PROFILE_MODES = ("cpu", "mem")
+DEFAULT_TOP = 20
+# Profundidad máxima de las pilas reconstruidas
+MAX_STACK_DEPTH = 96
+# Marcos de tracemalloc que son del propio perfilador
+_OWN_FILES = (__file__,)
+
+FuncKey = Tuple[str, int, str]
+
+
+def _label(func: FuncKey) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        # Funciones en C: "<built-in method time.sleep>", "<method 'encode' of 'str' objects>"
+        return name.strip("<>")
+    return f"{Path(filename).name}:{name}"
+
+
+def collapsed_stacks(stats: Dict[FuncKey, Tuple[Any, ...]], min_us: float = 1.0) -> List[str]:
+    '''
+    Pilas colapsadas a partir de pstats.Stats.stats
+    - Cada línea es "raíz;...;función microsegundos" con el tiempo propio de
+      la función en esa pila
+    - Las llamadas recursivas se cortan en la primera repetición
+    '''
+    callees: Dict[FuncKey, List[Tuple[FuncKey, float]]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    lines: Counter = Counter()
+    min_s = min_us / 1e6
+
+    def walk(func: FuncKey, frames: Tuple[str, ...], on_stack: frozenset, share: float) -> None:
+        _, _, tottime, cumtime, _ = stats[func]
+        frames = frames + (_label(func),)
+        if tottime * share >= min_s:
+            lines[";".join(frames)] += tottime * share * 1e6
+        if len(frames) >= MAX_STACK_DEPTH:
+            return
+        on_stack = on_stack | {func}
+        for child, edge_time in callees.get(func, ()):
+            child_cumtime = stats[child][3]
+            if child in on_stack or child_cumtime <= 0 or edge_time * share < min_s:
+                continue
+            walk(child, frames, on_stack, share * edge_time / child_cumtime)
+
+    for root in roots:
+        walk(root, (), frozenset(), 1.0)
+    return [f"{stack} {round(us)}" for stack, us in sorted(lines.items()) if round(us) > 0]
+
+
+def _argon2_seconds() -> Tuple[float, int]:
+    stage = metrics.snapshot()["stages"].get("derive_aes_key")
+    return (stage["sum_s"], stage["count"]) if stage else (0.0, 0)
+
+
+def _report_split(label: str, elapsed: float, argon2: Tuple[float, int], out: TextIO) -> None:
+    kdf_s, kdf_n = argon2
+    rest = max(elapsed - kdf_s, 0.0)
+    pct = (lambda s: 100 * s / elapsed if elapsed else 0.0)
+    print(f"[*] Perfil ({label}): {elapsed:.3f} s en total", file=out)
+    print(f"[*]   Argon2 (derive_aes_key): {kdf_s:.3f} s ({pct(kdf_s):.1f} %) en {kdf_n} derivaciones", file=out)
+    print(f"[*]   Resto del comando: {rest:.3f} s ({pct(rest):.1f} %)", file=out)
+
+
+def profile_call(
+    func: Callable[[], Any],
+    mode: str = "cpu",
+    prefix: Path | str = "wallet-profile",
+    top: int = DEFAULT_TOP,
+    out: Optional[TextIO] = None,
+) -> Any:
+    '''
+    Corre func() bajo el perfilador de "mode" y escribe los archivos con
+    "prefix"; regresa lo que regrese func(). Si func() lanza una excepción
+    (incluido SystemExit), el perfil se escribe igual y la excepción sigue.
+    - out: dónde va el reporte (por defecto sys.stderr)
+    '''
+    out = sys.stderr if out is None else out
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfil desconocido: {mode} (opciones: {', '.join(PROFILE_MODES)})")
+    prefix = Path(prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+
+    # Argon2 se mide con las métricas; si ya estaban activas no se tocan
+    own_metrics = not metrics.ENABLED
+    if own_metrics:
+        metrics.enable()
+    kdf_before = _argon2_seconds()
+    try:
+        if mode == "cpu":
+            return _profile_cpu(func, prefix, top, kdf_before, out)
+        return _profile_mem(func, prefix, top, kdf_before, out)
+    finally:
+        if own_metrics:
+            metrics.disable()
+
+
+def _kdf_delta(before: Tuple[float, int]) -> Tuple[float, int]:
+    after = _argon2_seconds()
+    return after[0] - before[0], after[1] - before[1]
+
+
+def _profile_cpu(func: Callable[[], Any], prefix: Path, top: int, kdf_before: Tuple[float, int], out: TextIO) -> Any:
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        return profiler.runcall(func)
+    finally:
+        elapsed = time.perf_counter() - start
+        pstats_path = prefix.with_name(prefix.name + ".pstats")
+        collapsed_path = prefix.with_name(prefix.name + ".collapsed")
+        profiler.dump_stats(str(pstats_path))
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        collapsed_path.write_text("\n".join(collapsed_stacks(stats.stats)) + "\n", encoding="utf-8")
+
+        _report_split("cpu", elapsed, _kdf_delta(kdf_before), out)
+        stats.sort_stats("tottime").print_stats(top)
+        # Solo la tabla, sin el encabezado de pstats
+        table = text.getvalue()
+        start_at = table.find("   ncalls")
+        print(f"[*]   Top {top} funciones por tiempo propio:", file=out)
+        print(table[start_at:].rstrip() if start_at >= 0 else table.rstrip(), file=out)
+        print(f"[+] Perfil guardado: {pstats_path}, {collapsed_path}", file=out)
+
+
+def _profile_mem(func: Callable[[], Any], prefix: Path, top: int, kdf_before: Tuple[float, int], out: TextIO) -> Any:
+    import tracemalloc
+
+    tracemalloc.start(MAX_STACK_DEPTH)
+    start = time.perf_counter()
+    try:
+        return func()
+    finally:
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)] +
+                                          [tracemalloc.Filter(False, f) for f in _OWN_FILES])
+
+        alloc_path = prefix.with_name(prefix.name + ".alloc.txt")
+        collapsed_path = prefix.with_name(prefix.name + ".mem.collapsed")
+        by_line = snapshot.statistics("lineno")
+        lines = [f"Pico: {peak / 1024:.1f} KiB, vivo al terminar: {current / 1024:.1f} KiB", ""]
+        for i, stat in enumerate(by_line[:top], start=1):
+            frame = stat.traceback[0]
+            lines.append(f"{i:3d}. {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB en {stat.count} bloques")
+        alloc_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        stacks: Counter = Counter()
+        for stat in snapshot.statistics("traceback"):
+            frames = ";".join(f"{Path(f.filename).name}:{f.lineno}" for f in stat.traceback)
+            stacks[frames] += stat.size
+        collapsed_path.write_text("".join(f"{s} {n}\n" for s, n in sorted(stacks.items())), encoding="utf-8")
+
+        _report_split("mem", elapsed, _kdf_delta(kdf_before), out)
+        print(f"[*]   Memoria de Python: pico {peak / 1024:.1f} KiB (Argon2 reserva la suya fuera de este conteo)",
+              file=out)
+        print(f"[*]   Top {min(top, len(by_line))} líneas por memoria viva al terminar:", file=out)
+        for line in lines[2:]:
+            print(f"      {line}", file=out)
+        print(f"[+] Perfil guardado: {alloc_path}, {collapsed_path}", file=out)
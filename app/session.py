@@ -0,0 +1,190 @@
+# app/session.py
+
+"""
+Sesión de firmado con la llave privada ya descifrada en memoria.
+
+Desbloquear el keystore cuesta una derivación Argon2id completa. Una sesión
+la paga una sola vez y después cada firma solo cuesta Ed25519:
+
+1) Se desbloquea el keystore con unlock_keystore.
+2) La llave Ed25519 queda en memoria mientras la sesión esté abierta.
+3) La sesión se cierra sola si pasa demasiado tiempo sin usarse (idle_timeout)
+   o si llega al número máximo de firmas (max_uses).
+4) Al cerrarla (o al salir del bloque "with") se descarta la llave.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from .keystore import load_keystore, unlock_keystore
+from .signer import _sign_with_key, validate_tx
+from .validation import TX_VALIDATOR
+
+# Tiempo por defecto (segundos) sin firmar antes de cerrar la sesión
+DEFAULT_IDLE_TIMEOUT = 300.0
+
+
+class SignerSession:
+    '''
+    Mantiene la llave privada descifrada para firmar muchas transacciones
+    - idle_timeout: segundos sin uso antes de cerrarse (None = sin límite)
+    - max_uses: número máximo de firmas (None = sin límite)
+    - Es seguro usarla desde varios hilos
+    '''
+
+    def __init__(
+        self,
+        keystore: Dict[str, Any],
+        passphrase: str,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+        max_uses: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if idle_timeout is not None and idle_timeout <= 0:
+            raise ValueError("idle_timeout debe ser positivo")
+        if max_uses is not None and max_uses <= 0:
+            raise ValueError("max_uses debe ser positivo")
+
+        # Aquí se paga la única derivación Argon2id de la sesión
+        try:
+            private_key_bytes, public_key_bytes, address = unlock_keystore(keystore, passphrase)
+        except Exception as e:
+            raise ValueError("La passphrase es incorrecta o el keystore está dañado.") from e
+
+        try:
+            self._priv: Optional[ed25519.Ed25519PrivateKey] = (
+                ed25519.Ed25519PrivateKey.from_private_bytes(private_key_bytes)
+            )
+        except Exception:
+            raise RuntimeError("La clave privada en el keystore no es válida.")
+        # No guardamos los bytes crudos, solo el objeto de la llave
+        del private_key_bytes
+
+        self.public_key_bytes = public_key_bytes
+        self.address = address
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self.uses = 0
+
+        self._clock = clock
+        self._last_used = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(
+        cls,
+        keystore_path: Path | str,
+        passphrase: str,
+        **kwargs: Any,
+    ) -> "SignerSession":
+        '''
+        Abre una sesión a partir de la ruta de un keystore
+        '''
+        try:
+            keystore = load_keystore(keystore_path)
+        except FileNotFoundError as e:
+            raise FileNotFoundError("No se encontró el archivo de keystore.") from e
+        except Exception as e:
+            raise RuntimeError(f"Error al cargar el keystore: {e}") from e
+        return cls(keystore, passphrase, **kwargs)
+
+    # ------------------------------------------------------------
+    # Estado de la sesión
+    # ------------------------------------------------------------
+    @property
+    def closed(self) -> bool:
+        '''
+        True si la sesión ya no puede firmar (cerrada, inactiva o agotada)
+        '''
+        with self._lock:
+            self._expire_if_needed()
+            return self._priv is None
+
+    @property
+    def remaining_uses(self) -> Optional[int]:
+        if self.max_uses is None:
+            return None
+        return max(self.max_uses - self.uses, 0)
+
+    def _expire_if_needed(self) -> None:
+        '''
+        Descarta la llave si se venció el idle_timeout o se agotaron los usos.
+        Debe llamarse con el lock tomado.
+        '''
+        if self._priv is None:
+            return
+        if self.idle_timeout is not None and self._clock() - self._last_used > self.idle_timeout:
+            self._priv = None
+        elif self.max_uses is not None and self.uses >= self.max_uses:
+            self._priv = None
+
+    def close(self) -> None:
+        '''
+        Descarta la llave privada. Se puede llamar varias veces.
+        '''
+        with self._lock:
+            self._priv = None
+
+    def __enter__(self) -> "SignerSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ------------------------------------------------------------
+    # Firmado
+    # ------------------------------------------------------------
+    def sign(self, tx: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Valida y firma una transacción; regresa el mismo paquete que sign_transaction
+        - Lanza RuntimeError si la sesión está cerrada, inactiva o agotada
+        '''
+        validate_tx(tx)
+        return self._sign_valid(tx)
+
+    def _acquire_key(self) -> ed25519.Ed25519PrivateKey:
+        '''
+        Cuenta un uso y regresa la llave
+        - Lanza RuntimeError si la sesión está cerrada, inactiva o agotada
+        '''
+        with self._lock:
+            self._expire_if_needed()
+            priv = self._priv
+            if priv is None:
+                raise RuntimeError("La sesión de firmado está cerrada; vuelve a desbloquear el keystore.")
+            self.uses += 1
+            self._last_used = self._clock()
+            return priv
+
+    def _sign_valid(self, tx: Dict[str, Any]) -> Dict[str, Any]:
+        priv = self._acquire_key()
+        # La firma se hace fuera del lock para que varios hilos firmen en paralelo
+        return _sign_with_key(priv, self.public_key_bytes, self.address, tx)
+
+    def sign_many(self, txs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        '''
+        Firma un flujo de transacciones con el mismo formato de resultado que
+        signer.sign_transactions:
+            {"index": int, "ok": bool, "signed": dict | None, "error": str | None}
+        - Si la sesión se cierra a mitad del flujo, el error se propaga
+        - Un error al firmar una tx es de esa tx, aunque con esa firma la
+          sesión se haya agotado
+        '''
+        check = TX_VALIDATOR.check
+        for index, tx in enumerate(txs):
+            rule = check(tx)
+            if rule is not None:
+                yield {"index": index, "ok": False, "signed": None, "error": rule.message}
+                continue
+            # RuntimeError si la sesión ya se cerró: corta el flujo
+            priv = self._acquire_key()
+            try:
+                signed = _sign_with_key(priv, self.public_key_bytes, self.address, tx)
+            except Exception as e:
+                yield {"index": index, "ok": False, "signed": None, "error": str(e)}
+                continue
+            yield {"index": index, "ok": True, "signed": signed, "error": None}
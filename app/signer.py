@@ -16,43 +16,16 @@ El flujo general es:
 """
 
 import base64
-import datetime
-from typing import Dict, Any
-import re
+import time
+from typing import Any, Dict, Iterable, Iterator, Tuple
 
 from cryptography.hazmat.primitives.asymmetric import ed25519
 
+from . import metrics
 from .canonicalizer import canonical_bytes
 from .keystore import load_keystore, unlock_keystore
-# ============================================================
-# VALIDACIÓN DE TRANSACCIONES
-# ============================================================
-def validate_tx(tx: Dict[str, Any]) -> None:
-    """
-    Valida que la transacción tenga los campos necesarios y en formato correcto.
-    Lanza excepciones explícitas para facilitar depuración y verificación.
-    """
-    required = ["to", "value", "nonce", "timestamp"]
-
-    # Validar presencia de campos obligatorios
-    for field in required:
-        if field not in tx:
-            raise ValueError(f"Falta el campo obligatorio '{field}' en la transacción.")
-        if tx[field] is None or tx[field] == "":
-            raise ValueError(f"El campo '{field}' no puede estar vacío.")
-
-    # Validar dirección destino
-    if not isinstance(tx["to"], str):
-        raise TypeError("El campo 'to' debe ser una cadena (dirección).")
-
-    # Validar 'value'
-    value = tx["value"]
-    if isinstance(value, int):
-        pass
-    elif isinstance(value, str) and value.isdigit():
-        pass
-    else:
-        raise ValueError("El campo 'value' debe ser un entero o un string numérico.")
+from .validation import TX_VALIDATOR
+
 
 # ------------------------------------------------------------
 # Validación básica de la transacción
@@ -61,66 +34,25 @@ def validate_tx(tx: Dict[str, Any]) -> None:
     """
     Revisa que la transacción cuente con los campos mínimos y que
     sus valores tengan un formato razonable.
+    Usa el esquema compilado de validation.py (TX_VALIDATOR).
     """
-
-    required = ["to", "value", "nonce", "timestamp"]
-
-    # Validar presencia y contenido
-    for field in required:
-        if field not in tx:
-            raise ValueError(f"Falta el campo obligatorio '{field}'.")
-        if tx[field] is None or tx[field] == "":
-            raise ValueError(f"El campo '{field}' no puede quedar vacío.")
-
-    # Dirección destino
-    if not isinstance(tx["to"], str):
-        raise TypeError("El campo 'to' debe ser una cadena.")
-
-    # 'value' puede ser entero o string numérico
-    value = tx["value"]
-    if isinstance(value, int):
-        pass
-    elif isinstance(value, str):
-        # Permite enteros o decimales (ej. "10", "10.5", "0.001")
-        if not re.match(r'^\d+(\.\d+)?$', value):
-            raise ValueError("El campo 'value' debe ser un número entero o decimal positivo.")
-    else:
-        raise ValueError("El campo 'value' debe ser un entero o un string numérico.")
-
-    # 'nonce' debe ser entero y no negativo
-    if not isinstance(tx["nonce"], int):
-        raise TypeError("El campo 'nonce' debe ser un entero.")
-    if tx["nonce"] < 0:
-        raise ValueError("El 'nonce' no puede ser negativo.")
-
-    # Formato de timestamp
-    try:
-        datetime.datetime.fromisoformat(tx["timestamp"])
-    except Exception:
-        raise ValueError("El campo 'timestamp' debe estar en formato ISO8601.")
+    TX_VALIDATOR.validate(tx)
 
 
 # ------------------------------------------------------------
-# Función principal: firmado
+# Carga de la llave y firmado con una llave ya descifrada
 # ------------------------------------------------------------
-def sign_transaction(
+def _load_signing_key(
     keystore_path: str,
     passphrase: str,
-    tx: Dict[str, Any],
-) -> Dict[str, Any]:
+) -> Tuple[ed25519.Ed25519PrivateKey, bytes, str]:
     """
-    Firma una transacción usando la clave privada almacenada en el keystore.
+    Carga el keystore, lo descifra con la passphrase y construye la llave Ed25519.
+    Aquí se paga la derivación Argon2id, por eso conviene hacerlo una sola vez.
 
-    Regresa un paquete con:
-      - La transacción original
-      - El esquema de firma
-      - La firma en Base64
-      - La llave pública correspondiente
+    Regresa (llave privada, bytes de la llave pública, dirección).
     """
 
-    # Validación previa
-    validate_tx(tx)
-
     # 1. Cargar keystore
     try:
         keystore = load_keystore(keystore_path)
@@ -135,29 +67,46 @@ def sign_transaction(
     except Exception as e:
         raise ValueError("La passphrase es incorrecta o el keystore está dañado.") from e
 
-    # 3. Asignar campo 'from' si no existe
+    # 3. Cargar clave privada Ed25519
+    try:
+        priv = ed25519.Ed25519PrivateKey.from_private_bytes(private_key_bytes)
+    except Exception:
+        raise RuntimeError("La clave privada en el keystore no es válida.")
+
+    return priv, public_key_bytes, address
+
+
+def _sign_with_key(
+    priv: ed25519.Ed25519PrivateKey,
+    public_key_bytes: bytes,
+    address: str,
+    tx: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Firma una transacción (ya validada) con una llave privada ya cargada.
+    No hace ninguna derivación de llaves, solo canonicalización y Ed25519.
+    """
+
+    # Asignar campo 'from' si no existe
     if not tx.get("from"):
         tx["from"] = address
 
-    # 4. Obtener representación canónica
+    # Obtener representación canónica
     try:
         message = canonical_bytes(tx)
     except Exception as e:
         raise RuntimeError(f"Error al generar JSON canónico: {e}") from e
 
-    # 5. Cargar clave privada Ed25519
-    try:
-        priv = ed25519.Ed25519PrivateKey.from_private_bytes(private_key_bytes)
-    except Exception:
-        raise RuntimeError("La clave privada en el keystore no es válida.")
-
-    # 6. Generar la firma
+    # Generar la firma
+    start = time.perf_counter_ns() if metrics.ENABLED else 0
     try:
         signature = priv.sign(message)
     except Exception as e:
         raise RuntimeError(f"Error durante el firmado: {e}") from e
+    if start:
+        metrics.observe("ed25519_sign", time.perf_counter_ns() - start)
 
-    # 7. Paquete final
+    # Paquete final
     signed_tx: Dict[str, Any] = {
         "tx": tx,
         "sig_scheme": "Ed25519",
@@ -166,3 +115,73 @@ def sign_transaction(
     }
 
     return signed_tx
+
+
+# ------------------------------------------------------------
+# Función principal: firmado
+# ------------------------------------------------------------
+def sign_transaction(
+    keystore_path: str,
+    passphrase: str,
+    tx: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Firma una transacción usando la clave privada almacenada en el keystore.
+
+    Regresa un paquete con:
+      - La transacción original
+      - El esquema de firma
+      - La firma en Base64
+      - La llave pública correspondiente
+    """
+
+    # Validación previa
+    validate_tx(tx)
+
+    priv, public_key_bytes, address = _load_signing_key(keystore_path, passphrase)
+    return _sign_with_key(priv, public_key_bytes, address, tx)
+
+
+# ------------------------------------------------------------
+# Firmado por lotes
+# ------------------------------------------------------------
+def sign_transactions(
+    keystore_path: str,
+    passphrase: str,
+    txs: Iterable[Dict[str, Any]],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Firma muchas transacciones descifrando el keystore una sola vez.
+
+    - El keystore se carga y se desbloquea antes de regresar, así que una
+      passphrase incorrecta falla de inmediato y no a mitad del lote.
+    - Las transacciones se consumen y se firman de forma perezosa (generador).
+    - Un error en una transacción no detiene el lote; por cada entrada se produce:
+        {"index": int, "ok": bool, "signed": dict | None, "error": str | None}
+    """
+    priv, public_key_bytes, address = _load_signing_key(keystore_path, passphrase)
+    return _sign_stream(priv, public_key_bytes, address, txs)
+
+
+def _sign_stream(
+    priv: ed25519.Ed25519PrivateKey,
+    public_key_bytes: bytes,
+    address: str,
+    txs: Iterable[Dict[str, Any]],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generador interno de sign_transactions.
+    """
+    check = TX_VALIDATOR.check
+    for index, tx in enumerate(txs):
+        # Una tx inválida se reporta sin lanzar y atrapar una excepción
+        rule = check(tx)
+        if rule is not None:
+            yield {"index": index, "ok": False, "signed": None, "error": rule.message}
+            continue
+        try:
+            signed = _sign_with_key(priv, public_key_bytes, address, tx)
+        except Exception as e:
+            yield {"index": index, "ok": False, "signed": None, "error": str(e)}
+            continue
+        yield {"index": index, "ok": True, "signed": signed, "error": None}
@@ -0,0 +1,373 @@
+# app/signer_service.py
+
+"""
+Servicio local de firmado sobre un socket Unix ("wallet serve-signer").
+
+Firmar con "wallet sign" cuesta arrancar un proceso y una derivación Argon2id
+completa por transacción. El servicio desbloquea el keystore una sola vez
+(SignerSession, que usa unlock_keystore) y atiende peticiones de firmado:
+
+Protocolo (una conexión puede mandar muchas peticiones, una tras otra):
+- Cada mensaje es un entero de 4 bytes big-endian con la longitud y después
+  el contenido.
+- Petición: JSON {"tx": {...}, "format": "json" | "binary"}. Si falta
+  tx["from"] se usa la dirección de la billetera.
+- Respuesta correcta con format="json": {"ok": true, "signed": {...}} (el
+  mismo paquete que sign_transaction).
+- Respuesta correcta con format="binary": el paquete binario de
+  envelope.py tal cual (empieza con b"WTXB").
+- Error: {"ok": false, "error": "..."} (siempre JSON).
+
+Las peticiones que llegan juntas, de una o varias conexiones, se agrupan en
+lotes (hasta max_batch, esperando como mucho batch_window_ms) y cada lote se
+firma de una vez en un hilo aparte con SignerSession.sign_many, que valida
+cada tx con signer.validate_tx.
+
+Protecciones:
+- Bloqueo por inactividad: si pasa idle_timeout sin firmar, la sesión descarta
+  la llave y el servicio responde "bloqueado" hasta que se reinicie (la
+  passphrase nunca viaja por el socket).
+- Límite de peticiones por segundo (token bucket: max_rate por segundo con
+  ráfagas de hasta burst); lo que pasa del límite se rechaza de inmediato.
+- El socket se crea con permisos 0600 (solo el dueño puede conectarse).
+- Si otro servicio ya atiende en la misma ruta, run() se niega a arrancar
+  en lugar de borrarle el socket.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .envelope import encode_envelope, is_binary_envelope
+from .session import SignerSession
+
+# Socket por defecto (en el directorio de la billetera)
+DEFAULT_SOCKET_PATH = Path("wallet-signer.sock")
+# Tamaño máximo de un mensaje (bytes)
+MAX_FRAME_SIZE = 1024 * 1024
+# Peticiones por lote y espera máxima para juntar un lote
+DEFAULT_MAX_BATCH = 64
+DEFAULT_BATCH_WINDOW_MS = 2.0
+
+_FRAME_HEADER = struct.Struct(">I")
+
+
+class RateLimiter:
+    '''
+    Token bucket: "rate" fichas por segundo, hasta "burst" acumuladas
+    - rate=None desactiva el límite
+    '''
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError("rate debe ser positivo o None")
+        self.rate = rate
+        self.burst = burst if burst is not None else (rate or 0)
+        if rate is not None and self.burst < 1:
+            raise ValueError("burst debe ser al menos 1")
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+
+    def allow(self) -> bool:
+        if self.rate is None:
+            return True
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+def _error(message: str) -> bytes:
+    return json.dumps({"ok": False, "error": message}, ensure_ascii=False).encode("utf-8")
+
+
+class SignerService:
+    '''
+    Atiende peticiones de firmado sobre un socket Unix con una SignerSession
+    ya desbloqueada (ver el docstring del módulo). La sesión es del servicio:
+    se cierra al detenerlo.
+    '''
+
+    def __init__(
+        self,
+        session: SignerSession,
+        socket_path: Path | str = DEFAULT_SOCKET_PATH,
+        max_rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        log: Callable[[str], None] = print,
+    ) -> None:
+        if max_batch <= 0:
+            raise ValueError("max_batch debe ser positivo")
+        self.session = session
+        self.socket_path = Path(socket_path)
+        self.limiter = RateLimiter(max_rate, burst)
+        self.max_batch = max_batch
+        self.batch_window_ms = batch_window_ms
+        self.log = log
+
+        self.stats = {"signed": 0, "failed": 0, "rate_limited": 0, "batches": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._clients: set = set()
+        # Un solo hilo de firmado: los lotes se firman uno tras otro
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="signer")
+
+    # --------------------------------------------------------
+    # Lotes
+    # --------------------------------------------------------
+    def _sign_batch(self, txs: List[Any]) -> List[Dict[str, Any]]:
+        '''
+        Firma un lote en el hilo de firmado; un resultado por tx
+        (mismo formato que sign_many)
+        '''
+        results: List[Dict[str, Any]] = []
+        try:
+            results.extend(self.session.sign_many(txs))
+        except Exception as e:
+            # La sesión se bloqueó (o algo falló) a mitad del lote: el resto ya no se
+            # firma, pero cada petición recibe su respuesta
+            for index in range(len(results), len(txs)):
+                results.append({"index": index, "ok": False, "signed": None, "error": str(e)})
+        return results
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_window_ms / 1000
+            # Junta lo que ya esté esperando (o llegue dentro de la ventana)
+            while len(batch) < self.max_batch:
+                try:
+                    if queue.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    else:
+                        batch.append(queue.get_nowait())
+                except asyncio.TimeoutError:
+                    break
+
+            txs = [tx for tx, _ in batch]
+            results = await loop.run_in_executor(self._pool, self._sign_batch, txs)
+            self.stats["batches"] += 1
+            for (_, fut), result in zip(batch, results):
+                if result["ok"]:
+                    self.stats["signed"] += 1
+                else:
+                    self.stats["failed"] += 1
+                if not fut.done():
+                    fut.set_result(result)
+            for _ in batch:
+                queue.task_done()
+
+    # --------------------------------------------------------
+    # Conexiones
+    # --------------------------------------------------------
+    async def _handle_request(self, payload: bytes) -> bytes:
+        if not self.limiter.allow():
+            self.stats["rate_limited"] += 1
+            return _error("rate limited: demasiadas peticiones por segundo")
+        if self.session.closed:
+            return _error("bloqueado: la sesión de firmado se cerró por inactividad; reinicia serve-signer")
+
+        try:
+            request = json.loads(payload)
+            tx = request["tx"]
+            fmt = request.get("format", "json")
+        except Exception as e:
+            return _error(f"petición inválida: {e}")
+        if not isinstance(tx, dict):
+            return _error("petición inválida: 'tx' debe ser un objeto")
+        if fmt not in ("json", "binary"):
+            return _error(f"petición inválida: formato desconocido {fmt!r}")
+        if tx.get("from") and str(tx["from"]).lower() != self.session.address.lower():
+            return _error("address mismatch: 'from' no es la dirección de esta billetera")
+
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((tx, fut))
+        result = await fut
+        if not result["ok"]:
+            return _error(result["error"])
+        if fmt == "binary":
+            return encode_envelope(result["signed"])
+        return json.dumps({"ok": True, "signed": result["signed"]}, ensure_ascii=False).encode("utf-8")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            while not self._stop.is_set():
+                try:
+                    header = await reader.readexactly(_FRAME_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = _FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    writer.write(_frame(_error(f"mensaje demasiado grande ({length} bytes)")))
+                    await writer.drain()
+                    break
+                payload = await reader.readexactly(length)
+                writer.write(_frame(await self._handle_request(payload)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    # --------------------------------------------------------
+    # Ciclo de vida
+    # --------------------------------------------------------
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self, install_signal_handlers: bool = False,
+                  on_ready: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+        '''
+        Atiende peticiones hasta stop() (o SIGTERM/SIGINT)
+        - on_ready se llama cuando el socket ya acepta conexiones
+        '''
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._queue = asyncio.Queue()
+        _claim_socket_path(self.socket_path)
+        if install_signal_handlers:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self.stop)
+
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle_client, path=str(self.socket_path))
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+
+        batcher = asyncio.create_task(self._batcher())
+        self.log(f"[*] Firmando para {self.session.address} en {self.socket_path}")
+        if on_ready is not None:
+            on_ready()
+        try:
+            await self._stop.wait()
+        finally:
+            # Sin conexiones nuevas; se terminan los lotes en curso y se
+            # contestan antes de cortar las conexiones que queden abiertas
+            server.close()
+            await self._queue.join()
+            if self._clients:
+                _, idle = await asyncio.wait(set(self._clients), timeout=1.0)
+                for task in idle:
+                    task.cancel()
+                await asyncio.gather(*idle, return_exceptions=True)
+            await server.wait_closed()
+            batcher.cancel()
+            await asyncio.gather(batcher, return_exceptions=True)
+            self._pool.shutdown(wait=True)
+            self.session.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            if install_signal_handlers:
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    loop.remove_signal_handler(sig)
+
+        self.log(f"[*] Servicio detenido: {self.stats['signed']} firmadas en {self.stats['batches']} lotes, "
+                 f"{self.stats['failed']} con error, {self.stats['rate_limited']} rechazadas por límite")
+        return dict(self.stats)
+
+
+def _claim_socket_path(path: Path) -> None:
+    '''
+    Deja libre la ruta del socket para el bind
+    - Un socket viejo de una ejecución anterior (nadie contesta) se borra
+    - RuntimeError si otro servicio ya atiende en esa ruta
+    '''
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except (ConnectionRefusedError, FileNotFoundError):
+        pass
+    else:
+        raise RuntimeError(f"Otro servicio ya atiende en {path}")
+    finally:
+        probe.close()
+    path.unlink(missing_ok=True)
+
+
+def _frame(payload: bytes) -> bytes:
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+# ------------------------------------------------------------
+# Cliente
+# ------------------------------------------------------------
+class SignerClient:
+    '''
+    Cliente síncrono del servicio (una conexión, muchas peticiones)
+
+        with SignerClient("wallet-signer.sock") as client:
+            signed = client.sign({"to": "0x...", "value": "1", "nonce": 7, ...})
+    '''
+
+    def __init__(self, socket_path: Path | str = DEFAULT_SOCKET_PATH, timeout: Optional[float] = 30.0) -> None:
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(socket_path))
+
+    def _recv_exact(self, n: int) -> bytes:
+        chunks = []
+        while n:
+            chunk = self._sock.recv(n)
+            if not chunk:
+                raise ConnectionError("El servicio de firmado cerró la conexión")
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b"".join(chunks)
+
+    def request(self, tx: Dict[str, Any], fmt: str = "json") -> bytes:
+        '''
+        Manda una petición y regresa la respuesta cruda
+        '''
+        payload = json.dumps({"tx": tx, "format": fmt}, ensure_ascii=False).encode("utf-8")
+        self._sock.sendall(_frame(payload))
+        (length,) = _FRAME_HEADER.unpack(self._recv_exact(_FRAME_HEADER.size))
+        return self._recv_exact(length)
+
+    def sign(self, tx: Dict[str, Any], binary: bool = False) -> Dict[str, Any] | bytes:
+        '''
+        Regresa el paquete firmado (dict, o bytes si binary=True)
+        - Lanza RuntimeError con el mensaje del servicio si algo falla
+        '''
+        response = self.request(tx, "binary" if binary else "json")
+        if binary and is_binary_envelope(response):
+            return response
+        body = json.loads(response)
+        if not body.get("ok"):
+            raise RuntimeError(body.get("error", "error desconocido"))
+        return body["signed"]
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def __enter__(self) -> "SignerClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
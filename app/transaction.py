@@ -3,6 +3,8 @@ import json
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
+from .validation import STORED_TX_VALIDATOR
+
 def time_iso8601() -> str:
     '''
     Genera un timestamp con formato ISO 8601 (YYYY-MM-DD HH:MinMin:SS.mSmSmS)
@@ -60,38 +62,9 @@ def validate_transaction(transaction: Dict[str, Any]) -> None:
     '''
     Verifica que el diccionario cargado tenga los campos correctos
     - Arroja ValueError si falta un campo obligarotio o si es incorrecto, incluyendo campos opcionales 
+    - Usa el esquema compilado de validation.py (STORED_TX_VALIDATOR)
     '''
-    # Primero verifica los campos obligatorios
-    # No se si data_hex puede contener cualquier cosa, así que no lo incluyo
-    must_have = ["from","to","value","nonce","timestamp"]
-    for field in must_have:
-        if field not in transaction:
-            raise ValueError(f"Transacción inválida, falta el campo '{field}'")
-
-    # Verifica el tipo de dato de los campos
-    if not isinstance(transaction["from"], str):
-        raise ValueError("Tipo de dato de 'from' incorrecto, se esperaba un string")
-
-    if not isinstance(transaction["to"], str):
-        raise ValueError("Tipo de dato de 'to' incorrecto, se esperaba un string")
-
-    if not isinstance(transaction["value"], str):
-        raise ValueError("Tipo de dato de 'value' incorrecto, se esperaba un string")
-
-    if not isinstance(transaction["nonce"], int) or transaction["nonce"] < 0:
-        raise ValueError("Valor de 'nonce' inválido o tipo de dato incorrecto, se esperaba un entero >= 0")
-
-    if "gas_limit" in transaction:
-        if not isinstance(transaction["gas_limit"], int) or transaction["gas_limit"] < 0:
-            raise ValueError("Valor de 'gas_limit' inválido o tipo de dato incorrecto, se esperaba un entero >= 0")
-
-    if "data_hex" in transaction:
-        if not isinstance(transaction["data_hex"], str):
-            raise ValueError("Valor de 'data_hex' incorrecto, se esperaba un string")
-
-    #Cómo comprobar que esté en ISO 8601?
-    if not isinstance(transaction["timestamp"], str):
-        raise ValueError("Formato de 'timestamp' incorrecto, se espera un string")
+    STORED_TX_VALIDATOR.validate(transaction)
 
 
 # Aparentemente, es una buena práctica separar la serialización de la lógica del sistema de archivos
@@ -0,0 +1,334 @@
+# app/tx_index.py
+
+"""
+Índice persistente de transacciones verificadas (SQLite de la biblioteca estándar).
+
+Buscar por remitente, rango de nonces o ventana de tiempo ya no requiere
+leer cada archivo de verified/. Cada vez que recv (o serve-inbox) acepta
+una transacción se agrega una fila con:
+
+- from, to (en minúsculas), nonce
+  (uint64; SQLite solo tiene INTEGER de 64 bits con signo, así que se guarda
+  nonce - 2**63, que conserva el orden y cabe completo)
+- timestamp como microsegundos desde la época (UTC), para comparar rangos
+- dónde está la transacción: un archivo (verified/tx_N.json) o una posición
+  (segmento, offset) dentro de una bitácora (ledger.py)
+
+Las consultas usan índices de SQLite sobre (from, nonce), (to, timestamp) y
+(timestamp), así que responden en milisegundos aunque haya millones de filas.
+Los resultados son IndexedTx: los metadatos vienen del índice y la
+transacción completa solo se lee del disco al pedirla (load()).
+
+Si el índice se pierde o se atrasa (p. ej. el proceso murió entre mover el
+archivo y agregar la fila), rebuild() lo reconstruye desde verified/ y la
+bitácora de verificadas.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .envelope import BINARY_SUFFIX, decode_envelope, envelope_tx, is_binary_envelope, load_envelope
+from .ledger import LedgerCorruption, Position, open_ledger
+from .validation import NONCE_LIMIT
+
+# Archivo por defecto del índice
+TX_INDEX_PATH = Path("tx_index.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS txs (
+    id        INTEGER PRIMARY KEY,
+    from_addr TEXT NOT NULL,
+    to_addr   TEXT,
+    nonce     INTEGER NOT NULL,
+    ts_us     INTEGER,
+    path      TEXT NOT NULL,
+    segment   INTEGER,
+    offset    INTEGER,
+    UNIQUE (from_addr, nonce)
+);
+CREATE INDEX IF NOT EXISTS txs_to_ts ON txs (to_addr, ts_us);
+CREATE INDEX IF NOT EXISTS txs_ts ON txs (ts_us);
+"""
+# Versión del esquema en PRAGMA user_version; la 0 guardaba el nonce tal cual
+_SCHEMA_VERSION = 1
+
+# Rango de nonces que se pueden indexar (el mismo que exige TX_VALIDATOR)
+NONCE_MAX = NONCE_LIMIT - 1
+_NONCE_BIAS = 2 ** 63
+
+
+def _nonce_key(nonce: int) -> int:
+    '''
+    Nonce uint64 -> valor de la columna (int64 con signo, mismo orden)
+    '''
+    return nonce - _NONCE_BIAS
+
+
+def timestamp_us(value: Any) -> Optional[int]:
+    '''
+    Timestamp ISO8601 (o datetime) -> microsegundos desde la época, en UTC
+    - Sin zona horaria se toma como UTC; None si no se puede interpretar
+    '''
+    if value is None or value == "":
+        return None
+    try:
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class IndexedTx:
+    '''
+    Fila del índice; la transacción firmada se lee del disco solo con load()
+    '''
+
+    __slots__ = ("from_addr", "to_addr", "nonce", "ts_us", "path", "segment", "offset")
+
+    def __init__(self, from_addr: str, to_addr: Optional[str], nonce: int, ts_us: Optional[int],
+                 path: str, segment: Optional[int], offset: Optional[int]) -> None:
+        self.from_addr = from_addr
+        self.to_addr = to_addr
+        self.nonce = nonce
+        self.ts_us = ts_us
+        self.path = path
+        self.segment = segment
+        self.offset = offset
+
+    @property
+    def location(self) -> str:
+        if self.segment is None:
+            return self.path
+        return f"{self.path}@{self.segment}:{self.offset}"
+
+    def load_raw(self) -> bytes:
+        '''
+        Bytes tal como están guardados (JSON o paquete binario)
+        '''
+        if self.segment is None:
+            return Path(self.path).read_bytes()
+        return open_ledger(self.path, readonly=True).read_at((self.segment, self.offset))
+
+    def load(self) -> Dict[str, Any]:
+        '''
+        Transacción firmada completa (paquete JSON)
+        '''
+        raw = self.load_raw()
+        if is_binary_envelope(raw):
+            return decode_envelope(raw)
+        return json.loads(raw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "from": self.from_addr,
+            "to": self.to_addr,
+            "nonce": self.nonce,
+            "timestamp_us": self.ts_us,
+            "location": self.location,
+        }
+
+
+class TxIndex:
+    '''
+    Índice SQLite de transacciones verificadas
+    - add() / add_many() agregan filas (ignoran duplicados por (from, nonce))
+    - query() regresa IndexedTx en flujo, sin cargar las transacciones
+    '''
+
+    def __init__(self, path: Path | str = TX_INDEX_PATH) -> None:
+        self.path = Path(path)
+        self._db = sqlite3.connect(str(self.path))
+        # WAL: lectores y un escritor a la vez; NORMAL basta porque el índice se puede reconstruir
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+        with self._db:
+            # Versión 0: nonces guardados sin desplazar (todos >= 0, así que no chocan)
+            self._db.execute("UPDATE txs SET nonce = nonce - 9223372036854775807 - 1")
+            self._db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    # ------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------
+    @staticmethod
+    def _row(tx: Dict[str, Any], path: Path | str, position: Optional[Position]) -> Optional[Tuple]:
+        '''
+        Fila para SQLite, o None si el nonce no es un uint64 (solo pasa con
+        datos aceptados antes de que TX_VALIDATOR acotara el nonce)
+        '''
+        nonce = int(tx.get("nonce", 0))
+        if not 0 <= nonce <= NONCE_MAX:
+            return None
+        segment, offset = position if position is not None else (None, None)
+        to_addr = tx.get("to")
+        return (
+            str(tx.get("from", "")).lower(),
+            str(to_addr).lower() if to_addr is not None else None,
+            _nonce_key(nonce),
+            timestamp_us(tx.get("timestamp")),
+            str(path),
+            segment,
+            offset,
+        )
+
+    def add(self, tx: Dict[str, Any], path: Path | str, position: Optional[Position] = None) -> None:
+        '''
+        Agrega una transacción guardada en "path" (archivo) o en la bitácora
+        "path" en "position"
+        '''
+        self.add_many([(tx, path, position)])
+
+    def add_many(self, entries: Iterable[Tuple[Dict[str, Any], Path | str, Optional[Position]]]) -> int:
+        '''
+        Agrega muchas en una sola transacción de SQLite; regresa cuántas eran nuevas
+        - Las que tienen un nonce fuera de uint64 no se indexan
+        '''
+        with self._db:
+            return self._insert(entries)
+
+    def _insert(self, entries: Iterable[Tuple[Dict[str, Any], Path | str, Optional[Position]]]) -> int:
+        '''
+        INSERT de las filas sin confirmar la transacción de SQLite
+        '''
+        rows = (self._row(tx, path, position) for tx, path, position in entries)
+        before = self._db.total_changes
+        self._db.executemany(
+            "INSERT OR IGNORE INTO txs (from_addr, to_addr, nonce, ts_us, path, segment, offset) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (row for row in rows if row is not None),
+        )
+        return self._db.total_changes - before
+
+    def rebuild(self, verified_dir: Optional[Path | str] = None,
+                ledger_dir: Optional[Path | str] = None, batch: int = 10000,
+                log: Callable[[str], None] = print) -> int:
+        '''
+        Vacía el índice y lo vuelve a llenar desde un directorio de archivos
+        verificados y/o una bitácora. Regresa el número de filas.
+        - Un archivo o registro que no se puede leer se reporta con "log" y
+          se omite (como en balances); una bitácora corrupta se lee hasta
+          el registro dañado
+        - Vaciar y llenar es una sola transacción de SQLite: si algo falla,
+          el índice queda como estaba
+        '''
+        def entries() -> Iterator[Tuple[Dict[str, Any], Path | str, Optional[Position]]]:
+            if verified_dir is not None and Path(verified_dir).is_dir():
+                with os.scandir(verified_dir) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.name.endswith((".json", BINARY_SUFFIX)):
+                            try:
+                                tx = envelope_tx(load_envelope(Path(entry.path).read_bytes()))
+                            except (KeyError, TypeError, ValueError, OSError) as e:
+                                log(f"[!] {entry.path} omitido: {e}")
+                                continue
+                            yield tx, entry.path, None
+            if ledger_dir is not None and Path(ledger_dir).is_dir():
+                try:
+                    for position, payload in open_ledger(ledger_dir, readonly=True).records():
+                        try:
+                            tx = envelope_tx(load_envelope(payload))
+                        except (KeyError, TypeError, ValueError) as e:
+                            log(f"[!] Registro {position} de {ledger_dir} omitido: {e}")
+                            continue
+                        yield tx, ledger_dir, position
+                except LedgerCorruption as e:
+                    log(f"[!] {ledger_dir}: {e}; el resto de la bitácora no se indexa")
+
+        with self._db:
+            self._db.execute("DELETE FROM txs")
+            chunk = []
+            for item in entries():
+                chunk.append(item)
+                if len(chunk) >= batch:
+                    self._insert(chunk)
+                    chunk.clear()
+            self._insert(chunk)
+        return len(self)
+
+    # ------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------
+    def query(
+        self,
+        sender: Optional[str] = None,
+        recipient: Optional[str] = None,
+        nonce_min: Optional[int] = None,
+        nonce_max: Optional[int] = None,
+        since: Any = None,
+        until: Any = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[IndexedTx]:
+        '''
+        Transacciones que cumplen todos los filtros dados
+        - since/until: ISO8601, datetime o microsegundos; since incluido, until excluido
+        - Orden: por (from, nonce) si se filtra por remitente; si no, por tiempo
+        '''
+        where = []
+        params: list = []
+        if sender is not None:
+            where.append("from_addr = ?")
+            params.append(sender.lower())
+        if recipient is not None:
+            where.append("to_addr = ?")
+            params.append(recipient.lower())
+        if nonce_min is not None:
+            if int(nonce_min) > NONCE_MAX:
+                return
+            where.append("nonce >= ?")
+            params.append(_nonce_key(max(int(nonce_min), 0)))
+        if nonce_max is not None:
+            if int(nonce_max) < 0:
+                return
+            where.append("nonce <= ?")
+            params.append(_nonce_key(min(int(nonce_max), NONCE_MAX)))
+        for bound, op in ((since, ">="), (until, "<")):
+            if bound is None:
+                continue
+            value = bound if isinstance(bound, int) else timestamp_us(bound)
+            if value is None:
+                raise ValueError(f"Fecha inválida: {bound!r}")
+            where.append(f"ts_us {op} ?")
+            params.append(value)
+
+        sql = "SELECT from_addr, to_addr, nonce, ts_us, path, segment, offset FROM txs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY from_addr, nonce" if sender is not None else " ORDER BY ts_us, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        for from_addr, to_addr, nonce, *rest in self._db.execute(sql, params):
+            yield IndexedTx(from_addr, to_addr, nonce + _NONCE_BIAS, *rest)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM txs").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "TxIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_tx_index(path: Path | str = TX_INDEX_PATH) -> TxIndex:
+    '''
+    Abre (o crea) el índice de transacciones verificadas
+    '''
+    return TxIndex(path)
@@ -0,0 +1,202 @@
+# app/validation.py
+
+"""
+Validación de transacciones guiada por un esquema, compilado una sola vez.
+
+Antes había tres validadores distintos (dos validate_tx en signer.py, el
+segundo tapando al primero, y transaction.validate_transaction), cada uno
+con sus isinstance campo por campo y un re.match que compilaba la expresión
+en cada llamada. Aquí:
+
+1) Un esquema es una lista ordenada de reglas. Cada regla tiene un campo,
+   un código de error, el tipo de excepción y el mensaje de siempre, y una
+   condición escrita como expresión de Python sobre "tx".
+2) Al importar el módulo, cada esquema se compila en una sola función con
+   un "if not (condición): return regla" por regla. Validar es una sola
+   pasada, sin una llamada por regla; las expresiones regulares también se
+   compilan una vez.
+3) validate() lanza la misma excepción (ValueError o TypeError) con el mismo
+   mensaje que el validador que reemplaza; check() regresa la regla que
+   falló sin lanzar nada, y validate_many() revisa un lote o flujo y da un
+   resultado por registro con su código de error, sin detenerse en el
+   primero.
+
+Esquemas:
+- TX_VALIDATOR: transacción que se firma o se verifica (signer, session,
+  verifier). "from" es opcional porque el firmador lo llena. El nonce es un
+  uint64 (0 <= nonce < NONCE_LIMIT): el estado de nonces, el archivo
+  (slots de 8 bytes) y el índice SQLite lo guardan en 64 bits.
+- STORED_TX_VALIDATOR: transacción guardada con transaction.py (todos los
+  campos presentes, "value" como string, gas_limit y data_hex opcionales).
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+# Códigos de error de validate_many()
+NOT_OBJECT = "not_object"
+MISSING = "missing"
+EMPTY = "empty"
+TYPE = "type"
+FORMAT = "format"
+RANGE = "range"
+
+# Entero o decimal positivo: "10", "10.5", "0.001"
+_DECIMAL_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# Límite exclusivo del nonce (uint64)
+NONCE_LIMIT = 2 ** 64
+
+
+def _iso8601(value: Any) -> bool:
+    try:
+        datetime.fromisoformat(value)
+    except Exception:
+        return False
+    return True
+
+
+# Nombres disponibles dentro de las condiciones de las reglas
+_NAMESPACE = {"_decimal": _DECIMAL_RE.fullmatch, "_iso8601": _iso8601, "NONCE_LIMIT": NONCE_LIMIT}
+
+
+class Rule:
+    '''
+    Una condición del esquema: "test" es una expresión de Python sobre "tx"
+    que vale True si la transacción la cumple
+    '''
+
+    __slots__ = ("field", "code", "exc", "message", "test")
+
+    def __init__(self, field: Optional[str], code: str, exc: Type[Exception], message: str, test: str) -> None:
+        self.field = field
+        self.code = code
+        self.exc = exc
+        self.message = message
+        self.test = test
+
+    def error(self) -> Exception:
+        return self.exc(self.message)
+
+
+class Validator:
+    '''
+    Esquema compilado: las reglas se evalúan en orden y la primera que
+    falla es el error
+    - check(tx): regla que falló o None (no lanza)
+    - validate(tx): lanza la excepción de la regla que falló
+    - validate_many(txs): un resultado por registro, con código de error
+    '''
+
+    def __init__(self, rules: Iterable[Rule]) -> None:
+        # Primero se revisa que sea un objeto; las demás condiciones pueden suponerlo
+        self.rules: Tuple[Rule, ...] = (
+            Rule(None, NOT_OBJECT, TypeError, "La transacción debe ser un objeto JSON.", "isinstance(tx, dict)"),
+        ) + tuple(rules)
+
+        lines = ["def check(tx):"]
+        for i, rule in enumerate(self.rules):
+            lines.append(f"    if not ({rule.test}): return _rules[{i}]")
+        lines.append("    return None")
+        namespace = dict(_NAMESPACE, _rules=self.rules)
+        exec(compile("\n".join(lines), "<validation>", "exec"), namespace)
+        self.check: Callable[[Any], Optional[Rule]] = namespace["check"]
+
+    def validate(self, tx: Any) -> None:
+        rule = self.check(tx)
+        if rule is not None:
+            raise rule.error()
+
+    def validate_many(self, txs: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        '''
+        Valida un lote o flujo sin detenerse en el primer error; por registro:
+            {"index": int, "ok": bool, "code": str | None, "field": str | None, "error": str | None}
+        '''
+        check = self.check
+        for index, tx in enumerate(txs):
+            rule = check(tx)
+            if rule is None:
+                yield {"index": index, "ok": True, "code": None, "field": None, "error": None}
+            else:
+                yield {"index": index, "ok": False, "code": rule.code, "field": rule.field, "error": rule.message}
+
+
+# ------------------------------------------------------------
+# Condiciones reutilizables
+# ------------------------------------------------------------
+def _is_type(field: str, types: str, optional: bool = False) -> str:
+    test = f"isinstance(tx[{field!r}], {types})"
+    return f"{field!r} not in tx or {test}" if optional else test
+
+
+def _non_negative_int(field: str, optional: bool = False) -> str:
+    test = f"isinstance(tx[{field!r}], int) and tx[{field!r}] >= 0"
+    return f"{field!r} not in tx or ({test})" if optional else test
+
+
+# ------------------------------------------------------------
+# Esquemas
+# ------------------------------------------------------------
+def _tx_rules() -> List[Rule]:
+    '''
+    Reglas de signer.validate_tx (transacción a firmar o verificar)
+    '''
+    rules: List[Rule] = []
+    for field in ("to", "value", "nonce", "timestamp"):
+        rules.append(Rule(field, MISSING, ValueError, f"Falta el campo obligatorio '{field}'.", f"{field!r} in tx"))
+        rules.append(Rule(field, EMPTY, ValueError, f"El campo '{field}' no puede quedar vacío.",
+                          f"tx[{field!r}] is not None and tx[{field!r}] != ''"))
+
+    rules += [
+        Rule("to", TYPE, TypeError, "El campo 'to' debe ser una cadena.", _is_type("to", "str")),
+        # 'value' puede ser entero o string numérico (entero o decimal positivo)
+        Rule("value", TYPE, ValueError, "El campo 'value' debe ser un entero o un string numérico.",
+             _is_type("value", "(int, str)")),
+        Rule("value", FORMAT, ValueError, "El campo 'value' debe ser un número entero o decimal positivo.",
+             "not isinstance(tx['value'], str) or _decimal(tx['value']) is not None"),
+        Rule("nonce", TYPE, TypeError, "El campo 'nonce' debe ser un entero.", _is_type("nonce", "int")),
+        Rule("nonce", RANGE, ValueError, "El 'nonce' no puede ser negativo.", "tx['nonce'] >= 0"),
+        Rule("nonce", RANGE, ValueError, "El 'nonce' debe ser menor que 2**64 (uint64).",
+             "tx['nonce'] < NONCE_LIMIT"),
+        Rule("timestamp", FORMAT, ValueError, "El campo 'timestamp' debe estar en formato ISO8601.",
+             "_iso8601(tx['timestamp'])"),
+    ]
+    return rules
+
+
+def _stored_tx_rules() -> List[Rule]:
+    '''
+    Reglas de transaction.validate_transaction (todas lanzan ValueError)
+    '''
+    rules = [
+        Rule(field, MISSING, ValueError, f"Transacción inválida, falta el campo '{field}'", f"{field!r} in tx")
+        for field in ("from", "to", "value", "nonce", "timestamp")
+    ]
+    for field in ("from", "to", "value"):
+        rules.append(Rule(field, TYPE, ValueError, f"Tipo de dato de '{field}' incorrecto, se esperaba un string",
+                          _is_type(field, "str")))
+    rules += [
+        Rule("nonce", RANGE, ValueError,
+             "Valor de 'nonce' inválido o tipo de dato incorrecto, se esperaba un entero >= 0",
+             _non_negative_int("nonce")),
+        Rule("gas_limit", RANGE, ValueError,
+             "Valor de 'gas_limit' inválido o tipo de dato incorrecto, se esperaba un entero >= 0",
+             _non_negative_int("gas_limit", optional=True)),
+        Rule("data_hex", TYPE, ValueError, "Valor de 'data_hex' incorrecto, se esperaba un string",
+             _is_type("data_hex", "str", optional=True)),
+        Rule("timestamp", TYPE, ValueError, "Formato de 'timestamp' incorrecto, se espera un string",
+             _is_type("timestamp", "str")),
+    ]
+    return rules
+
+
+TX_VALIDATOR = Validator(_tx_rules())
+STORED_TX_VALIDATOR = Validator(_stored_tx_rules())
+
+
+def validate_many(txs: Iterable[Any], validator: Validator = TX_VALIDATOR) -> Iterator[Dict[str, Any]]:
+    '''
+    Atajo de validator.validate_many (por defecto, el esquema de firmado)
+    '''
+    return validator.validate_many(txs)
@@ -1,99 +1,385 @@
 # app/verifier.py
-import json
 import base64
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from cryptography.hazmat.primitives.asymmetric import ed25519
 
+from . import metrics
 from .canonicalizer import canonical_bytes
 from .crypto_utils import derive_address_btc_style
+from .envelope import BinaryEnvelope, envelope_tx, parse_envelope
+from .nonce_store import NonceStore, open_nonce_store
+from .validation import TX_VALIDATOR
 
 # Archivo donde se guarda el último nonce por address
 # Evitar ataques de replay
 NONCE_STATE_PATH = Path("nonce_state.json")
 
-def _load_nonce_state(path: Path = NONCE_STATE_PATH) -> Dict[str, int]:
-    '''
-    Cragar estado del nonce
-    Verifica si existe archivo con nonce.
-    '''
-    if not path.exists():
-        return {}
-    data = json.loads(path.read_text(encoding="utf-8"))
-    # Convierte el nonce a int
-    return {addr: int(nonce) for addr, nonce in data.items()}
+# Llaves públicas distintas que se recuerdan por defecto
+DEFAULT_PUBKEY_CACHE_SIZE = 4096
+
 
-def _save_nonce_state(state: Dict[str, int], path: Path = NONCE_STATE_PATH) -> None:
+class PubkeyCache:
     '''
-    Guarda el diccionario de nonces actualizado
+    Caché LRU acotada: bytes crudos de la pubkey -> (llave Ed25519, dirección)
+    - Evita repetir SHA-256 + RIPEMD-160 y from_public_bytes para remitentes frecuentes
+    - maxsize=0 desactiva la caché
+    - hits/misses cuentan aciertos y fallos
     '''
-    path.write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding="utf-8")
 
+    def __init__(self, maxsize: int = DEFAULT_PUBKEY_CACHE_SIZE) -> None:
+        if maxsize < 0:
+            raise ValueError("maxsize no puede ser negativo")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[ed25519.Ed25519PublicKey, str]]" = OrderedDict()
+        self._lock = threading.Lock()
 
-def verify_signed_tx(
-    signed_tx: Dict[str, Any],
-    nonce_state_path: str | None = None,
-    enforce_nonce: bool = True,
-) -> Dict[str, Any]:
+    def get(self, pub_bytes: bytes) -> Tuple[Optional[ed25519.Ed25519PublicKey], str]:
+        '''
+        Regresa (llave pública, dirección derivada)
+        - La llave es None si los bytes no son una llave Ed25519 válida
+          (esas no se guardan en la caché)
+        '''
+        with self._lock:
+            entry = self._entries.get(pub_bytes)
+            if entry is not None:
+                self._entries.move_to_end(pub_bytes)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        address = derive_address_btc_style(pub_bytes)
+        try:
+            public_key = ed25519.Ed25519PublicKey.from_public_bytes(pub_bytes)
+        except Exception:
+            return None, address
+
+        if self.maxsize:
+            with self._lock:
+                self._entries[pub_bytes] = (public_key, address)
+                self._entries.move_to_end(pub_bytes)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return public_key, address
+
+    def resize(self, maxsize: int) -> None:
+        '''
+        Cambia el tamaño máximo, descartando las entradas menos usadas si sobran
+        '''
+        if maxsize < 0:
+            raise ValueError("maxsize no puede ser negativo")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Caché compartida por todas las verificaciones del proceso
+PUBKEY_CACHE = PubkeyCache()
+
+# Paquete firmado en cualquiera de sus formas: JSON (dict) o binario
+SignedEnvelope = Dict[str, Any] | BinaryEnvelope | bytes | bytearray | memoryview
+
+
+def verify_signature(
+    signed_tx: SignedEnvelope,
+    pubkey_cache: Optional[PubkeyCache] = None,
+) -> Tuple[Dict[str, Any], Optional[str]]:
     """
-    Verifica:
+    Parte sin estado de la verificación (no toca el estado de nonces):
     - Que la dirección derive de la pubkey y coincida con tx["from"]
+    - Campos y formatos de la tx (validation.TX_VALIDATOR)
     - Firma Ed25519
-    - Que el nonce sea mayor al último visto (si enforce_nonce=True)
+    La llave y la dirección se toman de pubkey_cache (o PUBKEY_CACHE).
+    signed_tx puede ser el paquete JSON o el binario (ver envelope.py); en el
+    binario la firma se verifica sobre los bytes guardados de la tx, que
+    deben ser su forma canónica (la misma regla que decode_envelope).
 
-    Regresa: {"valid": bool, "reason": str}
+    Regresa ({"valid": bool, "reason": str}, dirección derivada o None)
     """
+    result, address = _verify_signature(signed_tx, pubkey_cache)
+    if metrics.ENABLED:
+        metrics.count_result("signature", result)
+    return result, address
+
+
+def _verify_signature(
+    signed_tx: SignedEnvelope,
+    pubkey_cache: Optional[PubkeyCache],
+) -> Tuple[Dict[str, Any], Optional[str]]:
     try:
-        # Extraemos componentes
-        tx = signed_tx["tx"]
-        signature_b64 = signed_tx["signature_b64"]
-        pubkey_b64 = signed_tx["pubkey_b64"]
-        sig_scheme = signed_tx.get("sig_scheme", "Ed25519")
+        if isinstance(signed_tx, (bytes, bytearray, memoryview)):
+            signed_tx = parse_envelope(signed_tx, exact=True)
+
+        binary = isinstance(signed_tx, BinaryEnvelope)
+        if binary:
+            tx = signed_tx.tx
+            sig_scheme = signed_tx.sig_scheme
+            signature = signed_tx.signature
+            # from_public_bytes y la caché necesitan bytes (son solo 32)
+            pub_bytes = bytes(signed_tx.pubkey)
+            message = signed_tx.tx_bytes
+        else:
+            # Extraemos componentes
+            tx = signed_tx["tx"]
+            signature_b64 = signed_tx["signature_b64"]
+            pubkey_b64 = signed_tx["pubkey_b64"]
+            sig_scheme = signed_tx.get("sig_scheme", "Ed25519")
+            message = None
 
         # Validamos esquema de firma
         if sig_scheme != "Ed25519":
-            return {"valid": False, "reason": f"Unsupported sig_scheme {sig_scheme}"}
+            return {"valid": False, "reason": f"Unsupported sig_scheme {sig_scheme}"}, None
 
-        # Decodificamos y pasamos de base 64 a bytes porque Json no almacena bytes
-        signature = base64.b64decode(signature_b64)
-        pub_bytes = base64.b64decode(pubkey_b64)
+        if message is None:
+            # Decodificamos y pasamos de base 64 a bytes porque Json no almacena bytes
+            signature = base64.b64decode(signature_b64)
+            pub_bytes = base64.b64decode(pubkey_b64)
+            message = canonical_bytes(tx)
 
         # 1) Verificar que la address derive de la pubkey
         # Evitamos suplantación
-        derived_address = derive_address_btc_style(pub_bytes)
+        cache = PUBKEY_CACHE if pubkey_cache is None else pubkey_cache
+        public_key, derived_address = cache.get(pub_bytes)
         tx_from = tx.get("from")
         if not tx_from:
-            return {"valid": False, "reason": "tx.from missing"}
+            return {"valid": False, "reason": "tx.from missing"}, None
 
         # Esto atrapa el error "address mismatch" antes de que falle la firma
         if derived_address.lower() != str(tx_from).lower():
-            return {"valid": False, "reason": "address mismatch"}
+            return {"valid": False, "reason": "address mismatch"}, None
+
+        # Campos y formatos (mismo esquema que al firmar)
+        rule = TX_VALIDATOR.check(tx)
+        if rule is not None:
+            return {"valid": False, "reason": f"invalid tx: {rule.message}"}, None
+
+        # En el binario, los bytes firmados deben ser la forma canónica de la
+        # tx; si no, decode_envelope (ledger cat, balances, el índice) no
+        # podría leer después lo que aquí se acepta
+        if binary and canonical_bytes(tx) != message:
+            return {"valid": False, "reason": "non-canonical tx"}, None
 
         # 2) Verificar firma
-        public_key = ed25519.Ed25519PublicKey.from_public_bytes(pub_bytes)
-        message = canonical_bytes(tx)
+        if public_key is None:
+            # Lanza el mismo error que daría una llave inválida
+            public_key = ed25519.Ed25519PublicKey.from_public_bytes(pub_bytes)
         # Si la firma no es válida, esto lanza una excepción
-        public_key.verify(signature, message)
+        if metrics.ENABLED:
+            start = time.perf_counter_ns()
+            try:
+                public_key.verify(signature, message)
+            finally:
+                metrics.observe("ed25519_verify", time.perf_counter_ns() - start)
+        else:
+            public_key.verify(signature, message)
 
-        # 3) Protección contra replay vía nonce
-        if enforce_nonce:
-            # Cargamos estado actual
-            path_obj = NONCE_STATE_PATH if nonce_state_path is None else Path(nonce_state_path)
-            nonce_state = _load_nonce_state(path_obj)
+        return {"valid": True, "reason": "ok"}, derived_address
 
-            # Comprobamos que el nuevo nonce sea mayor que el último nonce guardado
-            sender_nonce = int(tx.get("nonce", 0))
-            last_nonce = int(nonce_state.get(derived_address, -1))
-            if sender_nonce <= last_nonce:
-                return {"valid": False, "reason": f"stale nonce: {sender_nonce} <= {last_nonce}"}
+    except Exception as e:
+        # Captura errores de firma (cryptography raise exceptions)
+        return {"valid": False, "reason": f"exception: {e}"}, None
 
-            # Guarda nuevo nonce
-            nonce_state[derived_address] = sender_nonce
-            _save_nonce_state(nonce_state, path_obj)
 
-        return {"valid": True, "reason": "ok"}
+def check_nonce(nonce_store: NonceStore, address: str, nonce: Any) -> Dict[str, Any]:
+    """
+    Parte con estado: protección contra replay vía nonce.
+    Si el nonce es mayor al último visto para la dirección, lo registra
+    en el almacén (cuándo llega a disco depende de su política de flush).
 
+    Regresa: {"valid": bool, "reason": str}
+    """
+    try:
+        # Comprobamos que el nuevo nonce sea mayor que el último nonce guardado
+        sender_nonce = int(nonce)
+        accepted, last_nonce = nonce_store.advance(address, sender_nonce)
     except Exception as e:
-        # Captura errores de firma (cryptography raise exceptions)
-        return {"valid": False, "reason": f"exception: {e}"}
\ No newline at end of file
+        result = {"valid": False, "reason": f"exception: {e}"}
+    else:
+        if accepted:
+            result = {"valid": True, "reason": "ok"}
+        else:
+            result = {"valid": False, "reason": f"stale nonce: {sender_nonce} <= {last_nonce}"}
+    if metrics.ENABLED:
+        metrics.count_result("nonce", result)
+    return result
+
+
+def verify_signed_tx(
+    signed_tx: SignedEnvelope,
+    nonce_state_path: str | None = None,
+    enforce_nonce: bool = True,
+    nonce_store: Optional[NonceStore] = None,
+) -> Dict[str, Any]:
+    """
+    Verifica:
+    - Que la dirección derive de la pubkey y coincida con tx["from"]
+    - Firma Ed25519
+    - Que el nonce sea mayor al último visto (si enforce_nonce=True)
+
+    Acepta el paquete JSON o el binario (bytes o BinaryEnvelope).
+    El estado de nonces se toma de nonce_store si se pasa (recomendado para
+    verificar muchas transacciones); si no, se abre el almacén en
+    nonce_state_path (o NONCE_STATE_PATH) solo para esta llamada.
+
+    Regresa: {"valid": bool, "reason": str}
+    """
+    if isinstance(signed_tx, (bytes, bytearray, memoryview)):
+        try:
+            signed_tx = parse_envelope(signed_tx, exact=True)
+        except Exception as e:
+            return {"valid": False, "reason": f"exception: {e}"}
+
+    result, derived_address = verify_signature(signed_tx)
+    if not result["valid"] or not enforce_nonce:
+        return result
+
+    # 3) Protección contra replay vía nonce
+    try:
+        nonce = envelope_tx(signed_tx).get("nonce", 0)
+        if nonce_store is not None:
+            return check_nonce(nonce_store, derived_address, nonce)
+
+        path_obj = NONCE_STATE_PATH if nonce_state_path is None else Path(nonce_state_path)
+        with open_nonce_store(path_obj) as store:
+            return check_nonce(store, derived_address, nonce)
+
+    except Exception as e:
+        return {"valid": False, "reason": f"exception: {e}"}
+
+
+# Paquetes que se mandan juntos a cada tarea del executor en verify_many
+VERIFY_CHUNK_SIZE = 64
+
+
+def _verify_chunk(envelopes: List[SignedEnvelope]) -> List[Tuple[Dict[str, Any], Optional[str], Any]]:
+    '''
+    Tarea del executor: parte sin estado de un bloque de paquetes
+    Regresa (resultado, dirección derivada, nonce) por paquete
+    '''
+    out = []
+    for signed_tx in envelopes:
+        try:
+            if isinstance(signed_tx, (bytes, bytearray, memoryview)):
+                signed_tx = parse_envelope(signed_tx, exact=True)
+            result, address = verify_signature(signed_tx)
+            nonce = envelope_tx(signed_tx).get("nonce", 0) if result["valid"] else None
+        except Exception as e:
+            result, address, nonce = {"valid": False, "reason": f"exception: {e}"}, None, None
+        out.append((result, address, nonce))
+    return out
+
+
+def _picklable(signed_tx: SignedEnvelope) -> SignedEnvelope:
+    '''
+    Los procesos reciben copias: BinaryEnvelope y memoryview viajan como bytes
+    '''
+    if isinstance(signed_tx, BinaryEnvelope):
+        return signed_tx.to_bytes()
+    if isinstance(signed_tx, memoryview):
+        return bytes(signed_tx)
+    return signed_tx
+
+
+def verify_many(
+    envelopes: Iterable[SignedEnvelope],
+    executor: Optional[Executor] = None,
+    nonce_state_path: str | None = None,
+    enforce_nonce: bool = True,
+    nonce_store: Optional[NonceStore] = None,
+    chunk_size: int = VERIFY_CHUNK_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Verifica muchos paquetes; mismo resultado que llamar verify_signed_tx
+    con cada uno, en orden, sobre el mismo estado de nonces.
+
+    1) La parte sin estado (dirección y firma Ed25519) corre en "executor"
+       por bloques de chunk_size. Sirve un ThreadPoolExecutor (OpenSSL
+       suelta el GIL al verificar) o un ProcessPoolExecutor. Sin executor
+       se verifica en el hilo actual. Con procesos y las métricas activas,
+       cada bloque regresa lo que midió y se suma a app.metrics.
+    2) Los nonces se revisan en serie, en el orden de entrada, conforme van
+       llegando los bloques (el primero no espera al último).
+
+    El estado de nonces se toma de nonce_store si se pasa; si no, se abre
+    el almacén en nonce_state_path (o NONCE_STATE_PATH) una sola vez para
+    todo el lote.
+
+    Regresa: [{"valid": bool, "reason": str}, ...] en el orden de entrada
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size debe ser positivo")
+    in_processes = isinstance(executor, ProcessPoolExecutor)
+    to_task = _picklable if in_processes else (lambda env: env)
+    # En procesos, cada bloque regresa lo que midió y se suma a las métricas de aquí
+    measured = in_processes and metrics.ENABLED
+    it = iter(envelopes)
+    chunks = iter(lambda: [to_task(env) for env in itertools.islice(it, chunk_size)], [])
+
+    def done(fut: Any) -> List[Tuple[Dict[str, Any], Optional[str], Any]]:
+        if not measured:
+            return fut.result()
+        results, state = fut.result()
+        metrics.merge(state)
+        return results
+
+    def verified() -> Iterable[Tuple[Dict[str, Any], Optional[str], Any]]:
+        if executor is None:
+            for chunk in chunks:
+                yield from _verify_chunk(chunk)
+            return
+        # Bloques en vuelo acotados: no se encola todo el lote de golpe
+        window = getattr(executor, "_max_workers", None) or 4
+        pending: deque = deque()
+        for chunk in chunks:
+            if measured:
+                pending.append(executor.submit(metrics.call_measured, _verify_chunk, chunk))
+            else:
+                pending.append(executor.submit(_verify_chunk, chunk))
+            if len(pending) >= window * 2:
+                yield from done(pending.popleft())
+        while pending:
+            yield from done(pending.popleft())
+
+    if not enforce_nonce:
+        return [result for result, _, _ in verified()]
+
+    def check_all(store: NonceStore) -> List[Dict[str, Any]]:
+        results = []
+        for result, address, nonce in verified():
+            if result["valid"]:
+                result = check_nonce(store, address, nonce)
+            results.append(result)
+        return results
+
+    if nonce_store is not None:
+        return check_all(nonce_store)
+    path_obj = NONCE_STATE_PATH if nonce_state_path is None else Path(nonce_state_path)
+    with open_nonce_store(path_obj) as store:
+        return check_all(store)
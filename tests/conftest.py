@@ -0,0 +1,38 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.keystore import create_keystore  # noqa: E402
+from app.session import SignerSession  # noqa: E402
+from app.tx_model import create_tx  # noqa: E402
+
+PASSPHRASE = "pass123"
+
+
+@pytest.fixture(scope="module")
+def session():
+    '''
+    Sesión de firmado con un keystore nuevo (una derivación por módulo)
+    '''
+    with SignerSession(create_keystore(PASSPHRASE), PASSPHRASE, idle_timeout=None) as s:
+        yield s
+
+
+@pytest.fixture(scope="module")
+def signed(session):
+    '''
+    Fábrica de paquetes firmados por la sesión: signed(nonce, to_addr=..., value=..., **campos)
+    - value por defecto es el mismo nonce
+    '''
+    def sign(nonce: int, to_addr: str = "0xaa", value=None, **kw):
+        tx = create_tx(from_addr=session.address, to_addr=to_addr,
+                       value=nonce if value is None else value, nonce=nonce, **kw)
+        return session.sign(tx)
+
+    return sign
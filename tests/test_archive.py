@@ -0,0 +1,121 @@
+# tests/test_archive.py
+import base64
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import archive as archive_mod  # noqa: E402
+from app.archive import open_archive  # noqa: E402
+from app.envelope import encode_envelope  # noqa: E402
+from app.keystore import create_keystore, unlock_keystore  # noqa: E402
+from app.signer import _sign_with_key  # noqa: E402
+from app.verifier import verify_signature  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def envelopes():
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    priv_bytes, pub_bytes, address = unlock_keystore(create_keystore("pass123"), "pass123")
+    priv = ed25519.Ed25519PrivateKey.from_private_bytes(priv_bytes)
+    return [
+        _sign_with_key(priv, pub_bytes, address,
+                       {"from": address, "to": "0xaa", "value": str(n), "nonce": n, "timestamp": "2025-01-01T00:00:00Z"})
+        for n in range(1, 41)
+    ]
+
+
+def _sig(envelope) -> bytes:
+    return base64.b64decode(envelope["signature_b64"])
+
+
+def test_random_access_by_record_and_signature(tmp_path: Path, envelopes):
+    '''
+    JSON y binario entran igual; cada registro se lee por número o por firma
+    y regresa el mismo paquete, verificable
+    '''
+    with open_archive(tmp_path / "arc", fsync=False) as arc:
+        assert arc.append_many(envelopes[:20]) == list(range(20))
+        arc.append_many(encode_envelope(env) for env in envelopes[20:])
+
+    with open_archive(tmp_path / "arc", readonly=True) as arc:
+        assert len(arc) == 40
+        record = arc[25]
+        assert isinstance(record.signature, memoryview)
+        assert record.nonce == 26
+        assert record.address == envelopes[25]["tx"]["from"]
+        assert record.to_envelope() == envelopes[25]
+        assert record.to_binary() == encode_envelope(envelopes[25])
+        assert verify_signature(record.to_binary())[0]["valid"]
+
+        for n in (0, 19, 20, 39):
+            assert arc.index_of(_sig(envelopes[n])) == n
+        assert arc.find(b"\x00" * 64) is None
+        with pytest.raises(IndexError):
+            arc.get(40)
+
+
+def test_duplicates_and_index_growth(tmp_path: Path, envelopes, monkeypatch):
+    '''
+    Una firma repetida se rechaza; la tabla de firmas crece sin perder registros
+    '''
+    monkeypatch.setattr(archive_mod, "MIN_CAPACITY", 4)
+    with open_archive(tmp_path / "arc", fsync=False) as arc:
+        arc.append_many(envelopes)
+        with pytest.raises(ValueError, match="registro 3"):
+            arc.append(envelopes[3])
+        assert all(arc.index_of(_sig(env)) == n for n, env in enumerate(envelopes))
+
+
+def test_recovers_from_torn_append(tmp_path: Path, envelopes):
+    '''
+    Un slot incompleto, bytes sueltos en heap.bin y un índice viejo se
+    arreglan al abrir para escribir
+    '''
+    path = tmp_path / "arc"
+    with open_archive(path, fsync=False) as arc:
+        arc.append_many(envelopes[:10])
+    index_before = (path / archive_mod.INDEX_FILE).read_bytes()
+    with open_archive(path, fsync=False) as arc:
+        arc.append_many(envelopes[10:12])
+    (path / archive_mod.INDEX_FILE).write_bytes(index_before)
+    with open(path / archive_mod.SLOTS_FILE, "ab") as f:
+        f.write(b"\x01" * 50)
+    with open(path / archive_mod.HEAP_FILE, "ab") as f:
+        f.write(b"basura")
+
+    with open_archive(path, fsync=False) as arc:
+        assert len(arc) == 12
+        assert arc.index_of(_sig(envelopes[11])) == 11
+        assert arc.append(envelopes[12]) == 12
+        assert arc[12].to_envelope() == envelopes[12]
+
+
+def test_rejected_append_leaves_no_trace(tmp_path: Path, envelopes):
+    '''
+    Un nonce fuera de uint64 se rechaza antes de escribir: el registro
+    siguiente apunta a sus propios bytes
+    '''
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    priv_bytes, pub_bytes, address = unlock_keystore(create_keystore("pass123"), "pass123")
+    priv = ed25519.Ed25519PrivateKey.from_private_bytes(priv_bytes)
+    huge = _sign_with_key(priv, pub_bytes, address,
+                          {"from": address, "to": "0xaa", "value": "1", "nonce": 2 ** 64,
+                           "timestamp": "2025-01-01T00:00:00Z"})
+    path = tmp_path / "arc"
+    with open_archive(path, fsync=False) as arc:
+        arc.append(envelopes[0])
+        arc.flush()
+        heap_size = (path / archive_mod.HEAP_FILE).stat().st_size
+        with pytest.raises(ValueError, match="nonce"):
+            arc.append(huge)
+        arc.flush()
+        assert (path / archive_mod.HEAP_FILE).stat().st_size == heap_size
+        assert arc.append(envelopes[1]) == 1
+        assert arc[1].to_envelope() == envelopes[1]
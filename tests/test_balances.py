@@ -0,0 +1,77 @@
+# tests/test_balances.py
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.balances import BalanceEngine, format_units, to_units  # noqa: E402
+from app.envelope import encode_envelope  # noqa: E402
+from app.ledger import open_ledger  # noqa: E402
+
+
+def _append(ledger_dir: Path, signed, values, to_addr: str = "0xBB", first_nonce: int = 1) -> None:
+    with open_ledger(ledger_dir) as ledger:
+        ledger.append_many(
+            encode_envelope(signed(first_nonce + i, to_addr=to_addr, value=v)) for i, v in enumerate(values)
+        )
+
+
+def test_fixed_point_roundtrip():
+    assert to_units("10.5") == 10_500_000_000_000_000_000
+    assert to_units(3) == to_units("3") == to_units("3.000")
+    assert format_units(to_units("0.000000000000000001")) == "0.000000000000000001"
+    assert format_units(to_units("1.25") - to_units("2")) == "-0.75"
+    # 0.1 + 0.2 exacto (con floats sería 0.30000000000000004)
+    assert format_units(to_units("0.1") + to_units("0.2")) == "0.3"
+    for bad in ("diez", "-1", "1e3", "0." + "1" * 19, 1.5, True):
+        with pytest.raises(ValueError):
+            to_units(bad)
+
+
+def test_incremental_sync_and_checkpoints(tmp_path: Path, session, signed, monkeypatch):
+    '''
+    Tras un reinicio solo se aplican los registros posteriores al checkpoint
+    '''
+    led, snap = tmp_path / "led", tmp_path / "balances.json"
+    _append(led, signed, ["1.5", "2", "0.25"])
+
+    engine = BalanceEngine(snap, snapshot_every=2, fsync=False)
+    assert engine.sync(led) == 3
+    assert format_units(engine.balance("0xbb")) == "3.75"
+    assert format_units(engine.balance(session.address)) == "-3.75"
+
+    # Reinicio: el snapshot trae la posición; nada nuevo que leer
+    applied = []
+    original_apply = BalanceEngine.apply
+    monkeypatch.setattr(BalanceEngine, "apply", lambda self, tx: (applied.append(tx["nonce"]), original_apply(self, tx)))
+    engine = BalanceEngine(snap, fsync=False)
+    assert engine.sync(led) == 0
+    _append(led, signed, ["10"], to_addr="0xcc", first_nonce=4)
+    assert engine.sync(led) == 1
+    assert applied == [4]
+    assert format_units(engine.balance("0xCC")) == "10"
+
+    # Reconstrucción completa: mismo resultado
+    before = engine.balances()
+    assert BalanceEngine(snap, fsync=False).rebuild(led) == 4
+    assert BalanceEngine(snap, fsync=False).balances() == before
+
+
+def test_missing_position_triggers_rebuild(tmp_path: Path, signed):
+    '''
+    Si la bitácora ya no contiene la posición del checkpoint, se recalcula todo
+    '''
+    snap = tmp_path / "balances.json"
+    _append(tmp_path / "a", signed, ["1", "1", "1"])
+    BalanceEngine(snap, fsync=False, log=lambda msg: None).sync(tmp_path / "a")
+
+    _append(tmp_path / "b", signed, ["5"])
+    engine = BalanceEngine(snap, fsync=False, log=lambda msg: None)
+    engine.sync(tmp_path / "b")
+    assert format_units(engine.balance("0xbb")) == "5"
+    assert json.loads(snap.read_text(encoding="utf-8"))["applied"] == 1
@@ -0,0 +1,40 @@
+# tests/test_bench.py
+import sys
+import json
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import bench  # noqa: E402
+
+
+def test_run_benchmarks_reports_stats():
+    '''
+    Cada corrida reporta ops/s, percentiles y RSS; los de Argon2 corren una vez
+    '''
+    results = list(bench.run_benchmarks(
+        ["canonical_bytes", "derive_address", "unlock_keystore"], sizes=[1, 20], kdf_iterations=1,
+    ))
+
+    assert [(r["name"], r["size"], r["ops"]) for r in results] == [
+        ("canonical_bytes", 1, 1), ("canonical_bytes", 20, 20),
+        ("derive_address", 1, 1), ("derive_address", 20, 20),
+        ("unlock_keystore", 1, 1),
+    ]
+    for r in results:
+        assert r["ops_per_sec"] > 0
+        assert 0 < r["p50_us"] <= r["p99_us"]
+
+
+def test_bench_main_writes_json(tmp_path: Path):
+    '''
+    --out guarda los resultados junto con los datos de la máquina
+    '''
+    out = tmp_path / "bench.json"
+    bench.main(["--only", "canonical_bytes_generic,nonce_store_advance", "--sizes", "3", "--out", str(out)])
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["meta"]["python"]
+    assert [r["name"] for r in report["results"]] == ["canonical_bytes_generic", "nonce_store_advance"]
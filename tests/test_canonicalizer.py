@@ -1,5 +1,7 @@
 # tests/test_canonicalizer.py
 import sys
+import json
+import random
 from pathlib import Path
 
 # Agregar raíz del proyecto al path para poder importar app/
@@ -7,7 +9,7 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.canonicalizer import canonical_json, canonical_bytes
+from app.canonicalizer import TX_KEYS, canonical_json, canonical_bytes, canonical_json_generic
 
 def test_canonical_json_sorting():
     """
@@ -42,3 +44,78 @@ def test_canonical_json_utf8():
     # Comprobar que caracteres UTF-8 no se escapan
     data = {"ñ": "á"}
     assert canonical_json(data) == '{"ñ":"á"}'
+
+# ------------------------------------------------------------
+# Codificador rápido de transacciones vs. camino genérico
+# ------------------------------------------------------------
+def reference_json(data):
+    '''
+    Salida original de canonical_json (antes del codificador rápido)
+    '''
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+# Caracteres que obligan a escapar o que prueban UTF-8 (incluye fuera del BMP)
+TRICKY_CHARS = ['"', "\\", "/", "\n", "\r", "\t", "\b", "\f", "\x00", "\x1f", "\x7f",
+                "\u2028", "\u2029", "ñ", "á", "€", "漢", "😀", " ", "%", "%s", "{", "}"]
+
+
+def random_str(rng):
+    chars = []
+    for _ in range(rng.randint(0, 24)):
+        if rng.random() < 0.3:
+            chars.append(rng.choice(TRICKY_CHARS))
+        else:
+            chars.append(chr(rng.randint(0x20, 0x7e)))
+    return "".join(chars)
+
+
+def random_value(rng):
+    kind = rng.random()
+    if kind < 0.45:
+        return random_str(rng)
+    if kind < 0.85:
+        return rng.choice([0, 1, -1, rng.randint(-10**6, 10**6), rng.randint(0, 2**64), -rng.randint(0, 10**40)])
+    # Tipos que deben ir por el camino genérico
+    return rng.choice([True, False, None, 1.5, float(rng.randint(0, 100)), [1, "a"], {"x": 1}])
+
+
+def random_tx(rng):
+    tx = {}
+    for key in TX_KEYS:
+        if rng.random() < 0.8:
+            tx[key] = random_value(rng)
+    if rng.random() < 0.1:
+        tx[random_str(rng)] = random_value(rng)
+    # Orden de inserción al azar: no debe afectar la salida
+    items = list(tx.items())
+    rng.shuffle(items)
+    return dict(items)
+
+
+def test_fast_encoder_matches_golden_txs():
+    """
+    El codificador rápido produce exactamente el mismo JSON que el genérico
+    para las transacciones de los vectores dorados
+    """
+    from test_golden import GOLDEN_VECTORS
+    for tx in (vector["tx"] for vector in GOLDEN_VECTORS):
+        assert canonical_json(tx) == reference_json(tx)
+        assert canonical_json_generic(tx) == reference_json(tx)
+
+
+def test_fast_encoder_random_equivalence():
+    """
+    Corpus aleatorio (con semilla fija): el resultado debe ser idéntico byte
+    por byte al de json.dumps, tanto en el camino rápido como en el genérico
+    """
+    rng = random.Random(20251202)
+    for _ in range(20000):
+        tx = random_tx(rng)
+        expected = reference_json(tx)
+        assert canonical_json(tx) == expected
+        try:
+            expected_bytes = expected.encode("utf-8")
+        except UnicodeEncodeError:
+            continue
+        assert canonical_bytes(tx) == expected_bytes
@@ -0,0 +1,447 @@
+# tests/test_cli.py
+import sys
+import json
+import base64
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import cli  # noqa: E402
+from app.keystore import create_keystore, save_keystore  # noqa: E402
+from app.verifier import verify_signed_tx  # noqa: E402
+
+PASSPHRASE = "pass123"
+
+
+@pytest.fixture
+def wallet_dir(tmp_path: Path, monkeypatch):
+    '''
+    Directorio de trabajo con un keystore y la passphrase ya "tecleada"
+    '''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli.getpass, "getpass", lambda prompt="": PASSPHRASE)
+    ks = create_keystore(PASSPHRASE)
+    save_keystore(ks, cli.DEFAULT_KEYSTORE)
+    return tmp_path
+
+
+def test_sign_batch_jsonl_to_ndjson(wallet_dir: Path, capsys):
+    '''
+    sign-batch lee JSONL, firma cada registro y reporta los errores por línea
+    '''
+    lines = [
+        json.dumps({"to": "0xaa", "value": "1", "nonce": 1}),
+        "",
+        json.dumps({"to": "0xbb", "value": "diez", "nonce": 2}),
+        "{no es json",
+        json.dumps({"to": "0xcc", "value": 3, "nonce": 3, "gas_limit": 21000, "data_hex": "0x00"}),
+        # Ni floats ni booleanos se redondean a un nonce
+        json.dumps({"to": "0xdd", "value": "1", "nonce": 1.9}),
+        json.dumps({"to": "0xdd", "value": "1", "nonce": True}),
+        json.dumps({"to": "0xdd", "value": "1", "nonce": 4, "gas_limit": 2.5}),
+    ]
+    (wallet_dir / "txs.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    cli.main(["sign-batch", "--input", "txs.jsonl", "--out", "signed.ndjson"])
+
+    out = capsys.readouterr()
+    assert "2 transacciones firmadas, 5 con error" in out.out
+    assert "tx/s" in out.out
+    assert "Línea 3" in out.err and "Línea 4" in out.err
+    assert all(f"Línea {n}: El campo" in out.err for n in (6, 7, 8))
+
+    signed = [json.loads(l) for l in (wallet_dir / "signed.ndjson").read_text(encoding="utf-8").splitlines()]
+    assert [s["tx"]["nonce"] for s in signed] == [1, 3]
+    assert signed[1]["tx"]["gas_limit"] == 21000
+    for s in signed:
+        assert verify_signed_tx(s, nonce_state_path=str(wallet_dir / "nonce_state.json"))["valid"]
+
+
+def test_sign_batch_csv_to_outbox(wallet_dir: Path):
+    '''
+    sign-batch con CSV y sin --out escribe un archivo por transacción en outbox/
+    '''
+    (wallet_dir / "txs.csv").write_text(
+        "to,value,nonce,gas_limit,data_hex\n"
+        "0xaa,10.5,1,,\n"
+        "0xbb,20,2,50000,0xabcd\n",
+        encoding="utf-8",
+    )
+
+    cli.main(["sign-batch", "--input", "txs.csv"])
+
+    first = json.loads((cli.OUTBOX_DIR / "tx_1.json").read_text(encoding="utf-8"))
+    second = json.loads((cli.OUTBOX_DIR / "tx_2.json").read_text(encoding="utf-8"))
+    assert "gas_limit" not in first["tx"]
+    assert second["tx"]["gas_limit"] == 50000
+    assert second["tx"]["data_hex"] == "0xabcd"
+    assert verify_signed_tx(first, enforce_nonce=False)["valid"]
+
+
+def test_recv_dir_parallel(wallet_dir: Path, capsys):
+    '''
+    recv --dir verifica en paralelo, aplica nonces en orden determinista y
+    mueve los archivos válidos a verified/ sin reescribirlos
+    '''
+    from app.session import SignerSession
+    from app.tx_model import create_tx
+
+    ks = json.loads(cli.DEFAULT_KEYSTORE.read_text(encoding="utf-8"))
+    cli.ensure_dirs()
+    with SignerSession(ks, PASSPHRASE) as s:
+        for nonce in range(1, 6):
+            signed = s.sign(create_tx(from_addr=s.address, to_addr="0xaa", value=nonce, nonce=nonce))
+            (cli.INBOX_DIR / f"tx_{nonce}.json").write_text(json.dumps(signed, indent=2), encoding="utf-8")
+        # Replay del nonce 3 con otro nombre de archivo
+        (cli.INBOX_DIR / "tx_3_copy.json").write_text(
+            (cli.INBOX_DIR / "tx_3.json").read_text(encoding="utf-8"), encoding="utf-8")
+        # Firma manipulada
+        tampered = s.sign(create_tx(from_addr=s.address, to_addr="0xaa", value=1, nonce=6))
+        tampered["tx"]["value"] = "1000"
+        (cli.INBOX_DIR / "tx_6.json").write_text(json.dumps(tampered), encoding="utf-8")
+
+    original = (cli.INBOX_DIR / "tx_1.json").read_bytes()
+    cli.main(["recv", "--dir", str(cli.INBOX_DIR), "--workers", "2"])
+
+    out = capsys.readouterr().out
+    assert "7 archivos verificados" in out
+    assert "5 válidos" in out and "2 rechazados" in out
+    assert "tx_3_copy.json: stale nonce" in out
+
+    verified = sorted(p.name for p in cli.VERIFIED_DIR.iterdir())
+    assert verified == [f"tx_{n}.json" for n in range(1, 6)]
+    # El archivo se movió tal cual, byte por byte
+    assert (cli.VERIFIED_DIR / "tx_1.json").read_bytes() == original
+    assert sorted(p.name for p in cli.INBOX_DIR.iterdir()) == ["tx_3_copy.json", "tx_6.json"]
+
+    from app.nonce_store import open_nonce_store
+    with open_nonce_store("nonce_state.json") as store:
+        assert [nonce for _, nonce in store.items()] == [5]
+
+
+def test_parse_mem_kib():
+    '''
+    Cantidades de memoria para --m-cost y --max-mem
+    '''
+    assert cli.parse_mem_kib("65536") == 65536
+    assert cli.parse_mem_kib("512K") == 512
+    assert cli.parse_mem_kib("64M") == 65536
+    assert cli.parse_mem_kib("64MiB") == 65536
+    assert cli.parse_mem_kib("1g") == 1024 * 1024
+
+
+def test_init_with_custom_kdf_params(tmp_path: Path, monkeypatch):
+    '''
+    init --t-cost/--m-cost/--parallelism guarda esos parámetros en el keystore
+    '''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cli.getpass, "getpass", lambda prompt="": PASSPHRASE)
+    cli.main(["init", "--t-cost", "1", "--m-cost", "8M", "--parallelism", "1"])
+
+    ks = json.loads(cli.DEFAULT_KEYSTORE.read_text(encoding="utf-8"))
+    assert (ks["kdf_params"]["t_cost"], ks["kdf_params"]["m_cost"], ks["kdf_params"]["parallelism"]) == (1, 8192, 1)
+
+
+def test_rekey_default_keystore(wallet_dir: Path, monkeypatch, capsys):
+    '''
+    rekey cambia la passphrase y los parámetros del keystore de la billetera
+    '''
+    from app.keystore import load_keystore, unlock_keystore
+
+    answers = iter([PASSPHRASE, "nueva456", "nueva456"])
+    monkeypatch.setattr(cli.getpass, "getpass", lambda prompt="": next(answers))
+    before = load_keystore(cli.DEFAULT_KEYSTORE)
+
+    cli.main(["rekey", "--new-passphrase", "--t-cost", "1", "--m-cost", "8M", "--parallelism", "1"])
+
+    assert "1 de 1 keystores re-cifrados" in capsys.readouterr().out
+    after = load_keystore(cli.DEFAULT_KEYSTORE)
+    assert after["address"] == before["address"]
+    assert after["kdf_params"]["m_cost"] == 8192
+    unlock_keystore(after, "nueva456")
+
+
+def test_sign_binary_convert_and_recv(wallet_dir: Path, capsys):
+    '''
+    sign --binary escribe .wtx, convert lo pasa a JSON y de regreso sin cambios,
+    y recv --dir acepta ambos formatos
+    '''
+    cli.main(["sign", "--to", "0xaa", "--value", "5", "--nonce", "1", "--binary"])
+    wtx = cli.OUTBOX_DIR / "tx_1.wtx"
+    blob = wtx.read_bytes()
+
+    cli.main(["convert", str(wtx)])
+    as_json = json.loads((cli.OUTBOX_DIR / "tx_1.json").read_text(encoding="utf-8"))
+    assert as_json["tx"]["value"] == "5"
+    cli.main(["convert", str(cli.OUTBOX_DIR / "tx_1.json"), "--out", "again.wtx"])
+    assert (wallet_dir / "again.wtx").read_bytes() == blob
+
+    cli.main(["sign", "--to", "0xbb", "--value", "6", "--nonce", "2"])
+    (cli.OUTBOX_DIR / "tx_1.wtx").replace(cli.INBOX_DIR / "tx_1.wtx")
+    (cli.OUTBOX_DIR / "tx_2.json").replace(cli.INBOX_DIR / "tx_2.json")
+    capsys.readouterr()
+
+    cli.main(["recv", "--dir", str(cli.INBOX_DIR), "--workers", "1"])
+    assert "2 válidos" in capsys.readouterr().out
+    assert (cli.VERIFIED_DIR / "tx_1.wtx").read_bytes() == blob
+
+
+def test_ledger_sign_recv_and_migrate(wallet_dir: Path, capsys):
+    '''
+    sign --ledger y recv --dir --ledger usan bitácoras en lugar de un archivo
+    por tx; ledger migrate pasa un directorio existente a una bitácora
+    '''
+    from app.ledger import open_ledger
+
+    cli.main(["sign", "--to", "0xaa", "--value", "1", "--nonce", "1", "--ledger"])
+    cli.main(["sign", "--to", "0xaa", "--value", "2", "--nonce", "2", "--binary"])
+    assert not (cli.OUTBOX_DIR / "tx_1.json").exists()
+    outbox = list(open_ledger(cli.OUTBOX_LEDGER, readonly=True))
+    assert len(outbox) == 1
+
+    # Lo firmado llega al inbox de quien recibe
+    (cli.INBOX_DIR / "tx_1.wtx").write_bytes(outbox[0])
+    (cli.OUTBOX_DIR / "tx_2.wtx").replace(cli.INBOX_DIR / "tx_2.wtx")
+    cli.main(["recv", "--dir", str(cli.INBOX_DIR), "--workers", "1", "--ledger"])
+    assert "2 válidos" in capsys.readouterr().out
+    assert list(cli.INBOX_DIR.iterdir()) == []
+
+    capsys.readouterr()
+    cli.main(["ledger", "cat", str(cli.VERIFIED_LEDGER)])
+    lines = [json.loads(l) for l in capsys.readouterr().out.splitlines()]
+    assert [l["tx"]["nonce"] for l in lines] == [1, 2]
+    assert all(verify_signed_tx(l, enforce_nonce=False)["valid"] for l in lines)
+
+    # Migración del layout anterior (un JSON por tx)
+    cli.main(["sign", "--to", "0xbb", "--value", "3", "--nonce", "3"])
+    cli.main(["ledger", "migrate", str(cli.OUTBOX_DIR), "migrated", "--delete"])
+    assert list(cli.OUTBOX_DIR.iterdir()) == []
+    cli.main(["ledger", "verify", "migrated"])
+    assert "1 registros, íntegra" in capsys.readouterr().out
+
+
+def test_recv_maintains_query_index(wallet_dir: Path, capsys):
+    '''
+    recv (--path y --dir) agrega lo aceptado al índice y "query" lo consulta
+    '''
+    for n in (1, 2, 3):
+        cli.main(["sign", "--to", "0xaa" if n < 3 else "0xbb", "--value", str(n), "--nonce", str(n)])
+    (cli.OUTBOX_DIR / "tx_1.json").replace(cli.INBOX_DIR / "tx_1.json")
+    cli.main(["recv", "--path", str(cli.INBOX_DIR / "tx_1.json")])
+    for n in (2, 3):
+        (cli.OUTBOX_DIR / f"tx_{n}.json").replace(cli.INBOX_DIR / f"tx_{n}.json")
+    cli.main(["recv", "--dir", str(cli.INBOX_DIR), "--workers", "1"])
+    capsys.readouterr()
+
+    cli.main(["query", "--to", "0xaa"])
+    rows = [json.loads(l) for l in capsys.readouterr().out.splitlines()]
+    assert [r["nonce"] for r in rows] == [1, 2]
+    assert rows[1]["location"] == str(cli.VERIFIED_DIR / "tx_2.json")
+
+    cli.main(["query", "--nonce-min", "3", "--full"])
+    (full,) = [json.loads(l) for l in capsys.readouterr().out.splitlines()]
+    assert full["tx"]["to"] == "0xbb" and verify_signed_tx(full, enforce_nonce=False)["valid"]
+
+    # Sin índice: --rebuild lo reconstruye desde verified/
+    Path("tx_index.sqlite3").unlink()
+    cli.main(["query", "--rebuild"])
+    assert "3 transacciones" in capsys.readouterr().err
+
+
+def test_balances_command(wallet_dir: Path, capsys):
+    '''
+    balances suma la bitácora de verificadas (incremental) y los archivos de verified/
+    '''
+    from app.ledger import open_ledger
+
+    cli.main(["sign", "--to", "0xaa", "--value", "1.5", "--nonce", "1", "--ledger"])
+    cli.main(["sign", "--to", "0xaa", "--value", "2", "--nonce", "2"])
+    (cli.INBOX_DIR / "tx_1.wtx").write_bytes(next(iter(open_ledger(cli.OUTBOX_LEDGER, readonly=True))))
+    cli.main(["recv", "--path", str(cli.INBOX_DIR / "tx_1.wtx"), "--ledger"])
+    (cli.OUTBOX_DIR / "tx_2.json").replace(cli.INBOX_DIR / "tx_2.json")
+    cli.main(["recv", "--path", str(cli.INBOX_DIR / "tx_2.json")])
+    capsys.readouterr()
+
+    cli.main(["balances", "--address", "0xAA"])
+    out = capsys.readouterr()
+    assert out.out.strip() == "3.5"
+    assert "1 registros nuevos" in out.err and "1 archivos" in out.err
+
+    cli.main(["balances"])
+    out = capsys.readouterr()
+    rows = {r["address"]: r["balance"] for r in map(json.loads, out.out.splitlines())}
+    assert rows["0xaa"] == "3.5" and len(rows) == 2
+    assert "0 registros nuevos" in out.err
+
+
+def test_recv_ndjson_stream(wallet_dir: Path, capsys):
+    '''
+    recv --ndjson verifica un volcado con muchos paquetes; una línea rota no
+    detiene el archivo y --start reanuda desde un registro
+    '''
+    lines = [json.dumps({"to": "0xaa", "value": str(n), "nonce": n}) for n in (1, 2, 3, 4)]
+    (wallet_dir / "txs.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    cli.main(["sign-batch", "--input", "txs.jsonl", "--out", "signed.ndjson"])
+    signed = (wallet_dir / "signed.ndjson").read_text(encoding="utf-8").splitlines()
+    dump = "\n".join(signed[:2] + ["{roto"] + signed[2:]) + "\n"
+    (wallet_dir / "dump.ndjson").write_text(dump, encoding="utf-8")
+    capsys.readouterr()
+
+    cli.main(["recv", "--ndjson", "dump.ndjson"])
+    out = capsys.readouterr().out
+    bad_offset = len((signed[0] + "\n" + signed[1] + "\n").encode())
+    assert f"Registro 2 (offset {bad_offset})" in out
+    assert "4 válidos" in out and "1 rechazados" in out and "siguiente registro: 5" in out
+    assert (cli.VERIFIED_DIR / "dump_4.json").exists()
+
+    # Reanudar desde el registro 3: ya se aceptaron, ahora son replay
+    cli.main(["recv", "--ndjson", "dump.ndjson", "--start", "3"])
+    out = capsys.readouterr().out
+    assert "2 registros" in out and "stale nonce" in out
+
+    cli.main(["query", "--to", "0xaa"])
+    assert len(capsys.readouterr().out.splitlines()) == 4
+
+
+def test_recv_ndjson_interrupted_keeps_accepted(wallet_dir: Path, capsys, monkeypatch):
+    '''
+    Un Ctrl+C a mitad del bloque no pierde lo ya aceptado (su nonce ya está
+    en el log) e imprime desde dónde reanudar
+    '''
+    from app import verifier
+
+    lines = [json.dumps({"to": "0xaa", "value": str(n), "nonce": n}) for n in (1, 2, 3)]
+    (wallet_dir / "txs.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    cli.main(["sign-batch", "--input", "txs.jsonl", "--out", "dump.ndjson"])
+    capsys.readouterr()
+
+    real = verifier.verify_signed_tx
+    calls = []
+
+    def interrupted(envelope, **kwargs):
+        calls.append(envelope)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return real(envelope, **kwargs)
+
+    monkeypatch.setattr(verifier, "verify_signed_tx", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        cli.main(["recv", "--ndjson", "dump.ndjson"])
+    out = capsys.readouterr().out
+    assert "2 válidos" in out and "siguiente registro: 2" in out
+    assert sorted(p.name for p in cli.VERIFIED_DIR.iterdir()) == ["dump_0.json", "dump_1.json"]
+    cli.main(["query", "--to", "0xaa"])
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+    # Reanudar desde ahí acepta el registro que faltaba
+    monkeypatch.setattr(verifier, "verify_signed_tx", real)
+    cli.main(["recv", "--ndjson", "dump.ndjson", "--start", "2"])
+    assert "1 válidos" in capsys.readouterr().out
+
+
+def test_archive_add_and_get(wallet_dir: Path, capsys):
+    '''
+    archive add junta verified/ y un NDJSON; archive get lee por registro o firma
+    '''
+    cli.main(["sign", "--to", "0xaa", "--value", "1", "--nonce", "1"])
+    (cli.OUTBOX_DIR / "tx_1.json").replace(cli.INBOX_DIR / "tx_1.json")
+    cli.main(["recv", "--path", str(cli.INBOX_DIR / "tx_1.json")])
+    lines = [json.dumps({"to": "0xbb", "value": "2", "nonce": n}) for n in (2, 3)]
+    (wallet_dir / "txs.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    cli.main(["sign-batch", "--input", "txs.jsonl", "--out", "signed.ndjson"])
+    capsys.readouterr()
+
+    cli.main(["archive", "add", "archive", str(cli.VERIFIED_DIR), "signed.ndjson"])
+    assert "3 transacciones agregadas" in capsys.readouterr().out
+    cli.main(["archive", "add", "archive", "signed.ndjson"])
+    assert "0 transacciones agregadas" in capsys.readouterr().out
+
+    cli.main(["archive", "get", "archive", "--record", "2"])
+    third = json.loads(capsys.readouterr().out)
+    assert third["record"] == 2 and third["tx"]["nonce"] == 3
+
+    signature_hex = base64.b64decode(third["signature_b64"]).hex()
+    cli.main(["archive", "get", "archive", "--signature", signature_hex, "--compact"])
+    assert json.loads(capsys.readouterr().out)["record"] == 2
+
+    with pytest.raises(SystemExit):
+        cli.main(["archive", "get", "archive", "--record", "9"])
+
+
+def test_metrics_dir_option(wallet_dir: Path):
+    '''
+    --metrics-dir escribe las métricas del comando al terminar
+    '''
+    cli.main(["--metrics-dir", "metrics", "sign", "--to", "0xaa", "--value", "1", "--nonce", "1"])
+    snap = json.loads((wallet_dir / "metrics" / "wallet_metrics.json").read_text(encoding="utf-8"))
+    assert {"load_keystore", "derive_aes_key", "ed25519_sign"} <= set(snap["stages"])
+    assert (wallet_dir / "metrics" / "wallet_metrics.prom").exists()
+
+
+def test_metrics_dir_counts_recv_dir_workers(wallet_dir: Path):
+    '''
+    Con recv --dir y varios procesos, lo que mide cada proceso llega al
+    archivo de métricas del padre
+    '''
+    from app.session import SignerSession
+    from app.tx_model import create_tx
+
+    ks = json.loads(cli.DEFAULT_KEYSTORE.read_text(encoding="utf-8"))
+    cli.ensure_dirs()
+    with SignerSession(ks, PASSPHRASE) as s:
+        for nonce in range(1, 4):
+            signed = s.sign(create_tx(from_addr=s.address, to_addr="0xaa", value=nonce, nonce=nonce))
+            (cli.INBOX_DIR / f"tx_{nonce}.json").write_text(json.dumps(signed), encoding="utf-8")
+        tampered = s.sign(create_tx(from_addr=s.address, to_addr="0xaa", value=1, nonce=4))
+        tampered["tx"]["value"] = "1000"
+        (cli.INBOX_DIR / "tx_4.json").write_text(json.dumps(tampered), encoding="utf-8")
+
+    cli.main(["--metrics-dir", "metrics", "recv", "--dir", str(cli.INBOX_DIR), "--workers", "2"])
+    snap = json.loads((wallet_dir / "metrics" / "wallet_metrics.json").read_text(encoding="utf-8"))
+    assert snap["stages"]["ed25519_verify"]["count"] == 4
+    assert snap["stages"]["canonical_bytes"]["count"] >= 4
+    results = {(c["labels"]["check"], c["labels"]["reason"]): c["value"] for c in snap["counters"]["verify_results"]}
+    assert results[("signature", "ok")] == 3
+    assert results[("nonce", "ok")] == 3
+    assert sum(v for (check, _), v in results.items() if check == "signature") == 4
+
+
+def test_profile_option_keeps_output(wallet_dir: Path, capsys):
+    '''
+    --profile no cambia stdout; el reporte va a stderr y separa el tiempo de Argon2
+    '''
+    cli.main(["address"])
+    plain = capsys.readouterr().out
+    cli.main(["--profile", "--profile-out", "prof/address", "address"])
+    out = capsys.readouterr()
+    assert out.out == plain
+    assert "Argon2 (derive_aes_key)" in out.err
+    assert (wallet_dir / "prof" / "address.pstats").exists()
+    assert (wallet_dir / "prof" / "address.collapsed").read_text(encoding="utf-8").strip()
+
+    cli.main(["--profile=mem", "--profile-out", "prof/sign", "sign", "--to", "0xaa", "--value", "1", "--nonce", "1"])
+    out = capsys.readouterr()
+    assert "1 derivaciones" in out.err
+    assert (wallet_dir / "prof" / "sign.alloc.txt").exists()
+
+    cli.main(["--profile", "mem", "--profile-out", "prof/address-mem", "address"])
+    assert capsys.readouterr().out == plain
+    assert (wallet_dir / "prof" / "address-mem.alloc.txt").exists()
+
+
+def test_expand_profile_flag():
+    '''
+    Solo un --profile sin modo, antes del subcomando, se vuelve --profile=cpu
+    '''
+    parser = cli.build_parser()
+    assert cli._expand_profile_flag(parser, ["--profile", "address"]) == ["--profile=cpu", "address"]
+    assert cli._expand_profile_flag(parser, ["--profile", "mem", "address"]) == ["--profile", "mem", "address"]
+    assert cli._expand_profile_flag(parser, ["--profile-out", "sign", "--profile", "sign"]) == \
+        ["--profile-out", "sign", "--profile=cpu", "sign"]
+    # Después del subcomando no se toca nada
+    assert cli._expand_profile_flag(parser, ["sign", "--profile"]) == ["sign", "--profile"]
+    assert parser.parse_args(cli._expand_profile_flag(parser, ["--profile", "mem", "address"])).profile == "mem"
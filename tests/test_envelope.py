@@ -0,0 +1,124 @@
+# tests/test_envelope.py
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.envelope import (  # noqa: E402
+    HEADER_SIZE,
+    decode_envelope,
+    encode_envelope,
+    is_binary_envelope,
+    load_envelope,
+    parse_envelope,
+)
+from app.keystore import create_keystore  # noqa: E402
+from app.tx_model import create_tx  # noqa: E402
+from app.verifier import verify_signed_tx  # noqa: E402
+
+
+def test_roundtrip_is_lossless(signed):
+    '''
+    JSON -> binario -> JSON regresa exactamente el mismo paquete
+    '''
+    envelope = signed(1, gas_limit=21000, data_hex="0xabcd")
+    blob = encode_envelope(envelope)
+
+    assert is_binary_envelope(blob)
+    assert decode_envelope(blob) == envelope
+    assert encode_envelope(decode_envelope(blob)) == blob
+    # 64 bytes de firma + 32 de llave, sin base64 ni indentación
+    assert len(blob) < len(json.dumps(envelope, indent=2))
+
+
+def test_parse_is_zero_copy(signed):
+    '''
+    El parser trabaja sobre memoryview y varios paquetes pueden ir concatenados
+    '''
+    first = encode_envelope(signed(1))
+    second = encode_envelope(signed(2))
+    buf = bytearray(first + second)
+
+    env = parse_envelope(buf)
+    assert env.nbytes == len(first)
+    assert len(env.signature) == 64 and len(env.pubkey) == 32
+    assert env.signature.obj is buf
+
+    nxt = parse_envelope(buf, offset=env.nbytes)
+    assert nxt.tx["nonce"] == 2
+    assert nxt.to_bytes() == second
+
+
+def test_verify_accepts_binary(signed, tmp_path: Path):
+    '''
+    verify_signed_tx acepta bytes y comparte el estado de nonces con el JSON
+    '''
+    nonce_state = str(tmp_path / "nonce_state.json")
+    envelope = signed(7)
+    blob = encode_envelope(envelope)
+
+    assert verify_signed_tx(blob, nonce_state_path=nonce_state)["valid"]
+    # Replay del mismo paquete en JSON
+    replay = verify_signed_tx(envelope, nonce_state_path=nonce_state)
+    assert not replay["valid"] and "stale nonce" in replay["reason"]
+
+
+def test_tampered_binary_rejected(signed):
+    '''
+    Cambiar un byte de la tx invalida la firma; un encabezado roto da error claro
+    '''
+    blob = bytearray(encode_envelope(signed(3, value=10)))
+    # Cambiamos un dígito del valor dentro de los bytes canónicos
+    idx = blob.index(b'"value":"10"') + len('"value":"')
+    blob[idx] = ord("9")
+    assert not verify_signed_tx(bytes(blob), enforce_nonce=False)["valid"]
+
+    bad = verify_signed_tx(b"WTXB\x09" + bytes(HEADER_SIZE), enforce_nonce=False)
+    assert not bad["valid"] and "Versión" in bad["reason"]
+
+    with pytest.raises(ValueError):
+        parse_envelope(encode_envelope(signed(4))[:-1])
+
+
+def test_trailing_bytes_rejected(signed):
+    '''
+    Un archivo .wtx con basura después de un paquete válido no se acepta;
+    dentro de un buffer con varios paquetes sí puede haber más datos
+    '''
+    blob = encode_envelope(signed(5))
+    padded = blob + b"basura"
+
+    assert parse_envelope(padded).to_bytes() == blob
+    with pytest.raises(ValueError, match="de sobra"):
+        load_envelope(padded)
+    with pytest.raises(ValueError, match="de sobra"):
+        decode_envelope(padded)
+    result = verify_signed_tx(padded, enforce_nonce=False)
+    assert not result["valid"] and "de sobra" in result["reason"]
+    assert verify_signed_tx(blob, enforce_nonce=False)["valid"]
+
+def test_non_canonical_binary_rejected():
+    '''
+    Una tx firmada correctamente pero no canónica no pasa la verificación
+    (decode_envelope tampoco la leería)
+    '''
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    from app.envelope import _pack
+    from app.keystore import unlock_keystore
+
+    priv_bytes, pub_bytes, address = unlock_keystore(create_keystore("pass123"), "pass123")
+    tx = create_tx(from_addr=address, to_addr="0xdeadbeef", value=10, nonce=1)
+    tx_bytes = json.dumps(tx, indent=1).encode("utf-8")
+    signature = ed25519.Ed25519PrivateKey.from_private_bytes(priv_bytes).sign(tx_bytes)
+    blob = _pack("Ed25519", signature, pub_bytes, tx_bytes)
+
+    result = verify_signed_tx(blob, enforce_nonce=False)
+    assert not result["valid"] and result["reason"] == "non-canonical tx"
+    with pytest.raises(ValueError):
+        decode_envelope(blob)
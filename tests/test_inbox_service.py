@@ -0,0 +1,154 @@
+# tests/test_inbox_service.py
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.envelope import encode_envelope  # noqa: E402
+from app.inbox_service import InboxService, InotifyWatcher  # noqa: E402
+
+
+def _drop(inbox: Path, name: str, data: bytes) -> None:
+    '''
+    Escribe como lo haría un remitente: archivo temporal oculto + rename
+    '''
+    tmp = inbox / f".{name}.tmp"
+    tmp.write_bytes(data)
+    tmp.replace(inbox / name)
+
+
+def _service(tmp_path: Path, **kw) -> InboxService:
+    return InboxService(
+        tmp_path / "inbox", tmp_path / "verified", tmp_path / "quarantine",
+        nonce_state_path=tmp_path / "nonce_state.json", poll_interval=0.05, log=lambda msg: None, **kw,
+    )
+
+
+async def _run_until(service: InboxService, processed: int, action=None, timeout: float = 20.0):
+    '''
+    Corre el servicio hasta que haya procesado "processed" archivos y lo detiene
+    '''
+    task = asyncio.create_task(service.run())
+    await asyncio.sleep(0.1)
+    if action is not None:
+        action()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while sum(service.stats.values()) < processed:
+        assert asyncio.get_running_loop().time() < deadline, service.stats
+        await asyncio.sleep(0.02)
+    service.stop()
+    return await task
+
+
+@pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+def test_serve_inbox_accepts_and_quarantines(signed, tmp_path: Path, use_inotify: bool):
+    '''
+    Procesa lo que ya había y lo que llega después; los rechazados quedan en
+    cuarentena con su motivo
+    '''
+    if use_inotify:
+        probe = InotifyWatcher.create(tmp_path)
+        if probe is None:
+            pytest.skip("inotify no disponible")
+        probe.close()
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    # Ya estaba antes de arrancar
+    _drop(inbox, "tx_1.json", json.dumps(signed(1)).encode())
+
+    def arrive():
+        _drop(inbox, "tx_2.wtx", encode_envelope(signed(2)))
+        _drop(inbox, "tx_3.json", json.dumps(signed(3)).encode())
+        # Replay del nonce 2 y una firma manipulada
+        _drop(inbox, "tx_2_copy.json", json.dumps(signed(2)).encode())
+        tampered = signed(4)
+        tampered["tx"]["value"] = "1000"
+        _drop(inbox, "tx_4.json", json.dumps(tampered).encode())
+
+    service = _service(tmp_path, use_inotify=use_inotify)
+    stats = asyncio.run(_run_until(service, 5, arrive))
+
+    assert service.watcher_kind == ("inotify" if use_inotify else "polling")
+    assert stats == {"accepted": 3, "rejected": 2, "errors": 0}
+    assert sorted(p.name for p in (tmp_path / "verified").iterdir()) == ["tx_1.json", "tx_2.wtx", "tx_3.json"]
+    assert list(inbox.iterdir()) == []
+
+    reason = json.loads((tmp_path / "quarantine" / "tx_2_copy.json.reason.json").read_text(encoding="utf-8"))
+    assert reason["reason"].startswith("stale nonce")
+    assert (tmp_path / "quarantine" / "tx_4.json").exists()
+
+
+def test_backpressure_and_drain(signed, tmp_path: Path):
+    '''
+    Con una cola de 1 se procesa todo el atraso en orden de llegada; al
+    detenerse no se pierde ningún archivo
+    '''
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    for nonce in range(1, 21):
+        _drop(inbox, f"tx_{nonce}.json", json.dumps(signed(nonce)).encode())
+
+    service = _service(tmp_path, use_inotify=False, workers=2, queue_depth=1)
+    stats = asyncio.run(_run_until(service, 20))
+    assert stats["accepted"] == 20
+
+    # Cierre inmediato: lo que no entró a la cola se queda en inbox/
+    for nonce in range(21, 41):
+        _drop(inbox, f"tx_{nonce}.json", json.dumps(signed(nonce)).encode())
+
+    async def start_and_stop():
+        service = _service(tmp_path, use_inotify=False, workers=1, queue_depth=2)
+        task = asyncio.create_task(service.run())
+        await asyncio.sleep(0)
+        service.stop()
+        return await task
+
+    asyncio.run(start_and_stop())
+    remaining = len(list(inbox.iterdir()))
+    verified = len(list((tmp_path / "verified").iterdir()))
+    assert verified + remaining == 40
+    assert list((tmp_path / "quarantine").iterdir()) == []
+
+
+def test_skipped_file_keeps_commit_order(signed, tmp_path: Path, monkeypatch):
+    '''
+    Si un archivo desaparece antes de verificarse, el que sigue en la cola
+    no se confirma antes que el anterior
+    '''
+    import time
+    from app import inbox_service
+
+    real_verify = inbox_service.verify_inbox_file
+
+    def verify(path: Path):
+        if path.name == "tx_1.json":
+            time.sleep(0.3)
+        elif path.name == "tx_2.json":
+            raise FileNotFoundError(path)
+        return real_verify(path)
+
+    monkeypatch.setattr(inbox_service, "verify_inbox_file", verify)
+    order = []
+    real_commit = InboxService._commit
+
+    def commit(self, store, index, path, verification):
+        order.append(path.name)
+        return real_commit(self, store, index, path, verification)
+
+    monkeypatch.setattr(InboxService, "_commit", commit)
+
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    for nonce in (1, 2, 3):
+        _drop(inbox, f"tx_{nonce}.json", json.dumps(signed(nonce)).encode())
+
+    service = _service(tmp_path, use_inotify=False, workers=3)
+    stats = asyncio.run(_run_until(service, 2))
+    assert stats["accepted"] == 2
+    assert order == ["tx_1.json", "tx_3.json"]
@@ -4,7 +4,8 @@ import sys
 import pytest
 from cryptography.exceptions import InvalidTag
 from pathlib import Path
-from app.keystore import create_keystore, save_keystore, load_keystore, unlock_keystore
+from app import crypto_utils
+from app.keystore import create_keystore, save_keystore, load_keystore, unlock_keystore, rekey_keystore
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -91,4 +92,104 @@ def test_keystore_tampered_kdf_params():
 
     # Mismo caso, se espera ValueError cuando falle la comprobción del chaeksum
     with pytest.raises(ValueError, match="Checksum"):
-        load_keystore(path)
\ No newline at end of file
+        load_keystore(path)
+
+def test_keystore_custom_kdf_params(tmp_path: Path):
+    """
+    Keystores con distintos parámetros de Argon2 conviven: cada uno se
+    desbloquea con los parámetros guardados en su "kdf_params"
+    """
+    cheap = create_keystore("Hola345", t_cost=1, m_cost=8192, parallelism=1)
+    default = create_keystore("Hola345")
+    assert cheap["kdf_params"]["m_cost"] == 8192
+    assert cheap["kdf_params"]["t_cost"] == 1
+    assert default["kdf_params"]["m_cost"] == crypto_utils.ARGON_MEM_COST_KIB
+
+    for i, ks in enumerate((cheap, default)):
+        path = tmp_path / f"wallet_{i}.keystore.json"
+        save_keystore(ks, path)
+        priv, pub, addr = unlock_keystore(load_keystore(path), "Hola345")
+        assert addr == ks["address"]
+
+    # Con los parámetros globales la llave derivada es otra: el tag no cuadra
+    salt = base64.b64decode(cheap["kdf_params"]["salt_b64"])
+    assert crypto_utils.derive_aes_key("Hola345", salt) != crypto_utils.derive_aes_key("Hola345", salt, 1, 8192, 1)
+
+
+def test_calibrate_kdf_respects_limits():
+    """
+    La calibración nunca pasa de la memoria máxima y regresa parámetros usables
+    """
+    params = crypto_utils.calibrate_kdf(target_ms=20, max_mem_kib=16384, parallelism=1)
+    assert 8192 <= params["m_cost"] <= 16384
+    assert params["t_cost"] >= 1
+    ks = create_keystore("Hola678", params["t_cost"], params["m_cost"], params["parallelism"])
+    unlock_keystore(ks, "Hola678")
+
+    with pytest.raises(ValueError):
+        crypto_utils.calibrate_kdf(target_ms=20, max_mem_kib=1024)
+
+
+def test_rekey_keystore_changes_passphrase_and_params(tmp_path: Path):
+    """
+    Re-cifrar conserva la llave y la dirección, cambia salt/parámetros y
+    el checksum sigue siendo válido al cargarlo
+    """
+    ks = create_keystore("Hola901", t_cost=1, m_cost=8192, parallelism=1)
+    priv, pub, addr = unlock_keystore(ks, "Hola901")
+
+    new_ks = rekey_keystore(ks, "Hola901", new_passphrase="Adios901", t_cost=2, m_cost=16384)
+    assert new_ks["address"] == ks["address"]
+    assert new_ks["kdf_params"]["salt_b64"] != ks["kdf_params"]["salt_b64"]
+    assert (new_ks["kdf_params"]["t_cost"], new_ks["kdf_params"]["m_cost"], new_ks["kdf_params"]["parallelism"]) == (2, 16384, 1)
+
+    path = tmp_path / "wallet.keystore.json"
+    save_keystore(new_ks, path)
+    assert unlock_keystore(load_keystore(path), "Adios901") == (priv, pub, addr)
+    with pytest.raises(InvalidTag):
+        unlock_keystore(new_ks, "Hola901")
+    with pytest.raises(InvalidTag):
+        rekey_keystore(ks, "incorrecta", t_cost=2)
+
+
+def test_rekey_files_parallel_within_memory_budget(tmp_path: Path, monkeypatch):
+    """
+    rekey_files procesa en paralelo sin pasar del presupuesto de memoria
+    y reporta los errores por archivo
+    """
+    import threading
+    import time
+    from app import keystore as keystore_mod
+
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"ks_{i}.json"
+        save_keystore(create_keystore("Hola234", t_cost=1, m_cost=8192, parallelism=1), path)
+        paths.append(path)
+    paths.append(tmp_path / "no_existe.json")
+
+    active, peak, lock = [0], [0], threading.Lock()
+    original = keystore_mod.rekey_keystore
+    def tracking_rekey(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        try:
+            return original(*args, **kwargs)
+        finally:
+            with lock:
+                active[0] -= 1
+    monkeypatch.setattr(keystore_mod, "rekey_keystore", tracking_rekey)
+
+    results = dict(keystore_mod.rekey_files(
+        paths, "Hola234", new_passphrase="Nueva234", workers=4, mem_budget_kib=2 * 8192,
+    ))
+
+    assert peak[0] == 2
+    assert results[paths[-1]] is not None
+    for path in paths[:-1]:
+        assert results[path] is None
+        unlock_keystore(load_keystore(path), "Nueva234")
+    # No quedan archivos temporales de la escritura atómica
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.name for p in paths[:-1])
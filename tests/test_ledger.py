@@ -0,0 +1,126 @@
+# tests/test_ledger.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.ledger import LedgerCorruption, open_ledger  # noqa: E402
+
+
+def _payload(i: int) -> bytes:
+    return f"registro-{i:05d}-".encode() + bytes([i % 256]) * (i % 50 + 1)
+
+
+def test_append_rotate_and_read(tmp_path: Path):
+    '''
+    Los registros se leen en orden a través de segmentos rotados y sellados
+    '''
+    with open_ledger(tmp_path / "led", segment_size=512) as ledger:
+        positions = ledger.append_many(_payload(i) for i in range(100))
+        assert len(ledger.segments()) > 3
+        assert ledger.verify() == []
+
+    reader = open_ledger(tmp_path / "led", readonly=True)
+    records = list(reader.records())
+    assert [p for p, _ in records] == positions
+    assert [payload for _, payload in records] == [_payload(i) for i in range(100)]
+    assert reader.read_at(positions[42]) == _payload(42)
+    # Lectura a partir de una posición (incluida)
+    assert [payload for _, payload in reader.records(start=positions[90])] == [_payload(i) for i in range(90, 100)]
+
+
+def test_torn_tail_is_truncated(tmp_path: Path):
+    '''
+    Un registro a medio escribir al final se descarta al reabrir para escribir
+    '''
+    with open_ledger(tmp_path / "led") as ledger:
+        ledger.append_many(_payload(i) for i in range(3))
+        seg = ledger.segment_path(ledger.segments()[-1])
+    good_size = seg.stat().st_size
+    with open(seg, "ab") as f:
+        # Encabezado que promete 100 bytes y solo 10 escritos
+        f.write((100).to_bytes(4, "big") + (0).to_bytes(4, "big") + b"x" * 10)
+
+    # El lector se detiene sin error antes de la cola rota
+    assert len(list(open_ledger(tmp_path / "led", readonly=True))) == 3
+
+    with open_ledger(tmp_path / "led") as ledger:
+        assert seg.stat().st_size == good_size
+        ledger.append(_payload(3))
+        assert list(ledger) == [_payload(i) for i in range(4)]
+        assert ledger.verify() == []
+
+
+def test_corruption_is_detected(tmp_path: Path):
+    '''
+    Un byte cambiado en un segmento sellado lo detectan verify y read_at
+    '''
+    with open_ledger(tmp_path / "led", segment_size=256) as ledger:
+        positions = ledger.append_many(_payload(i) for i in range(20))
+    seq, offset = positions[0]
+    seg = tmp_path / "led" / f"{seq:08d}.seg"
+    data = bytearray(seg.read_bytes())
+    data[offset + 10] ^= 0xFF
+    seg.write_bytes(bytes(data))
+
+    reader = open_ledger(tmp_path / "led", readonly=True)
+    assert any("Segmento 1" in p for p in reader.verify())
+    with pytest.raises(LedgerCorruption):
+        reader.read_at(positions[0])
+    # Un segmento sellado dañado no se salta en silencio
+    with pytest.raises(LedgerCorruption):
+        list(reader.records())
+
+
+def test_corrupt_active_segment_is_not_truncated(tmp_path: Path):
+    '''
+    Un CRC malo a mitad del segmento activo no se trunca: se rechaza la apertura
+    '''
+    with open_ledger(tmp_path / "led") as ledger:
+        positions = ledger.append_many(_payload(i) for i in range(5))
+        seg = ledger.segment_path(ledger.segments()[-1])
+    data = bytearray(seg.read_bytes())
+    data[positions[1][1] + 10] ^= 0xFF
+    seg.write_bytes(bytes(data))
+
+    with pytest.raises(LedgerCorruption):
+        open_ledger(tmp_path / "led")
+    assert seg.read_bytes() == bytes(data)
+    with pytest.raises(LedgerCorruption):
+        list(open_ledger(tmp_path / "led", readonly=True).records())
+
+
+def test_two_writers_interleave(tmp_path: Path):
+    '''
+    Dos escritores sobre la misma bitácora (como dos procesos) no se pisan
+    '''
+    a = open_ledger(tmp_path / "led", segment_size=300)
+    b = open_ledger(tmp_path / "led", segment_size=300)
+    try:
+        for i in range(0, 40, 2):
+            a.append(_payload(i))
+            b.append(_payload(i + 1))
+    finally:
+        a.close()
+        b.close()
+
+    reader = open_ledger(tmp_path / "led", readonly=True)
+    assert list(reader) == [_payload(i) for i in range(40)]
+    assert reader.verify() == []
+
+
+def test_invalid_payload_writes_nothing(tmp_path: Path):
+    '''
+    Un registro inválido a mitad del lote no deja escritos los anteriores
+    '''
+    with open_ledger(tmp_path / "led") as ledger:
+        ledger.append(b"a")
+        with pytest.raises(ValueError):
+            ledger.append_many([b"b", b"", b"c"])
+        assert list(ledger) == [b"a"]
+        ledger.append(b"d")
+        assert list(ledger) == [b"a", b"d"]
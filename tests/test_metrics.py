@@ -0,0 +1,93 @@
+# tests/test_metrics.py
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import metrics  # noqa: E402
+from app.keystore import create_keystore, save_keystore  # noqa: E402
+from app.signer import sign_transaction  # noqa: E402
+from app.tx_model import create_tx  # noqa: E402
+from app.verifier import verify_signed_tx  # noqa: E402
+
+
+@pytest.fixture
+def measured():
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    yield metrics.REGISTRY
+    metrics.disable()
+    metrics.REGISTRY.reset()
+
+
+def test_disabled_records_nothing():
+    metrics.REGISTRY.reset()
+    verify_signed_tx({"tx": {}, "signature_b64": "", "pubkey_b64": ""}, enforce_nonce=False)
+    assert metrics.snapshot()["stages"] == {} and metrics.snapshot()["counters"] == {}
+
+
+def test_stages_and_results_by_reason(tmp_path: Path, measured):
+    '''
+    Firmar y verificar llena los histogramas de cada etapa y cuenta los
+    resultados por revisión y motivo
+    '''
+    save_keystore(create_keystore("pass123", 1, 8192, 1), tmp_path / "ks.json")
+    tx = create_tx("", "0xaa", "1", 1, timestamp="2025-01-01T00:00:00Z")
+    signed = sign_transaction(str(tmp_path / "ks.json"), "pass123", tx)
+    state = str(tmp_path / "nonces.json")
+    assert verify_signed_tx(signed, nonce_state_path=state)["valid"]
+    assert not verify_signed_tx(signed, nonce_state_path=state)["valid"]
+
+    snap = metrics.snapshot()
+    assert set(metrics.STAGES) <= set(snap["stages"])
+    assert snap["stages"]["derive_aes_key"]["count"] == 2  # crear + desbloquear
+    assert snap["stages"]["ed25519_verify"]["buckets"][-1] == ["+Inf", 2]
+    results = {(s["labels"]["check"], s["labels"]["reason"]): s["value"]
+               for s in snap["counters"]["verify_results"]}
+    assert results == {("signature", "ok"): 2, ("nonce", "ok"): 1, ("nonce", "stale nonce"): 1}
+
+
+def test_export_files(tmp_path: Path, measured):
+    '''
+    enable(directorio) escribe el JSON y el archivo de Prometheus al desactivar
+    '''
+    metrics.enable(tmp_path, interval=3600)
+    metrics.observe("canonical_bytes", 1500)
+    metrics.observe("canonical_bytes", 3_000_000)
+    metrics.count_result("nonce", {"valid": False, "reason": "stale nonce: 1 <= 2"})
+    metrics.disable()
+
+    snap = json.loads((tmp_path / metrics.JSON_NAME).read_text())
+    assert snap["stages"]["canonical_bytes"]["count"] == 2
+    prom = (tmp_path / metrics.PROM_NAME).read_text().splitlines()
+    assert 'wallet_stage_seconds_bucket{stage="canonical_bytes",le="2.5e-06"} 1' in prom
+    assert 'wallet_stage_seconds_bucket{stage="canonical_bytes",le="+Inf"} 2' in prom
+    assert 'wallet_stage_seconds_count{stage="canonical_bytes"} 2' in prom
+    assert 'wallet_verify_results_total{check="nonce",reason="stale nonce"} 1' in prom
+
+
+def test_process_pool_results_are_merged(tmp_path: Path, measured):
+    '''
+    verify_many con procesos suma lo que midió cada proceso
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+
+    from app.verifier import verify_many
+
+    save_keystore(create_keystore("pass123", 1, 8192, 1), tmp_path / "ks.json")
+    signed = [sign_transaction(str(tmp_path / "ks.json"), "pass123",
+                               create_tx("", "0xaa", "1", n, timestamp="2025-01-01T00:00:00Z"))
+              for n in range(1, 5)]
+    metrics.REGISTRY.reset()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = verify_many(signed, executor=pool, enforce_nonce=False, chunk_size=1)
+    assert all(r["valid"] for r in results)
+
+    snap = metrics.snapshot()
+    assert snap["stages"]["ed25519_verify"]["count"] == 4
+    assert snap["counters"]["verify_results"] == [{"labels": {"check": "signature", "reason": "ok"}, "value": 4}]
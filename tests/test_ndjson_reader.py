@@ -0,0 +1,91 @@
+# tests/test_ndjson_reader.py
+import os
+import sys
+import json
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.ndjson_reader import open_ndjson  # noqa: E402
+
+
+def _write(path: Path, lines) -> list[int]:
+    '''
+    Escribe las líneas y regresa el offset de cada una
+    '''
+    offsets, data = [], b""
+    for line in lines:
+        offsets.append(len(data))
+        data += line.encode() + b"\n"
+    path.write_bytes(data)
+    return offsets
+
+
+def test_stream_reports_bad_lines_with_offset(tmp_path: Path):
+    '''
+    Las líneas vacías se saltan; las mal formadas se reportan con su offset
+    y la lectura continúa
+    '''
+    lines = [json.dumps({"n": 0}), "", "{roto", "   ", "[1, 2]", json.dumps({"n": 1})]
+    offsets = _write(tmp_path / "dump.ndjson", lines)
+
+    with open_ndjson(tmp_path / "dump.ndjson") as reader:
+        records = list(reader)
+    assert [r["index"] for r in records] == [0, 1, 2, 3]
+    assert [r["ok"] for r in records] == [True, False, False, True]
+    assert records[1]["offset"] == offsets[2] and f"offset {offsets[2]}" in records[1]["error"]
+    assert "objeto" in records[2]["error"]
+    assert records[3]["envelope"] == {"n": 1}
+
+
+def test_index_resume_and_random_access(tmp_path: Path):
+    '''
+    Con el índice se reanuda desde el registro N y se lee un registro suelto
+    '''
+    path = tmp_path / "dump.ndjson"
+    _write(path, [json.dumps({"n": i}) for i in range(50)] + ["{\"n\": 50}"])
+    # Sin salto de línea final
+    path.write_bytes(path.read_bytes().rstrip(b"\n"))
+
+    with open_ndjson(path) as reader:
+        assert len(reader.build_index()) == 51
+    assert (tmp_path / "dump.ndjson.idx").exists()
+
+    with open_ndjson(path) as reader:
+        assert reader.load_index() is not None
+        assert reader.record(50)["envelope"] == {"n": 50}
+        assert [r["envelope"]["n"] for r in reader.records(start=47)] == [47, 48, 49, 50]
+        assert [r["index"] for r in reader.records(start=47)] == [47, 48, 49, 50]
+        assert list(reader.records(start=51)) == []
+
+    # Si el archivo cambia, el índice viejo se ignora y se reconstruye
+    with open(path, "ab") as f:
+        f.write(b"\n{\"n\": 51}\n")
+    os.utime(path, ns=(0, 0))
+    with open_ndjson(path) as reader:
+        assert reader.load_index() is None
+        assert reader.record(51)["envelope"] == {"n": 51}
+
+
+def test_empty_file(tmp_path: Path):
+    (tmp_path / "empty.ndjson").write_bytes(b"")
+    with open_ndjson(tmp_path / "empty.ndjson") as reader:
+        assert list(reader) == []
+        assert len(reader) == 0
+
+
+def test_index_stays_in_memory_when_it_cannot_be_saved(tmp_path: Path):
+    '''
+    Si el índice no se puede escribir junto al volcado (directorio de solo
+    lectura), records(start=N) funciona con el índice en memoria
+    '''
+    path = tmp_path / "dump.ndjson"
+    _write(path, [json.dumps({"n": i}) for i in range(10)])
+    with open_ndjson(path) as reader:
+        # Escribir en un directorio que no existe falla igual que en uno de solo lectura
+        reader.index_path = tmp_path / "solo-lectura" / "dump.ndjson.idx"
+        assert [r["envelope"]["n"] for r in reader.records(start=8)] == [8, 9]
+        assert reader.record(3)["envelope"] == {"n": 3}
+    assert not (tmp_path / "solo-lectura").exists()
@@ -0,0 +1,181 @@
+# tests/test_nonce_store.py
+import sys
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.nonce_store import LogNonceStore, NonceStore, open_nonce_store  # noqa: E402
+
+
+def test_memory_store_advance():
+    '''
+    advance solo acepta nonces estrictamente mayores
+    '''
+    store = NonceStore()
+    assert store.get("0xaa") == -1
+    assert store.advance("0xaa", 0) == (True, -1)
+    assert store.advance("0xaa", 0) == (False, 0)
+    assert store.advance("0xaa", 5) == (True, 0)
+    assert store.advance("0xaa", 3) == (False, 5)
+
+
+def test_log_store_persists_and_reads_legacy_snapshot(tmp_path: Path):
+    '''
+    Un nonce_state.json antiguo se usa como snapshot y las actualizaciones
+    nuevas van al log sin reescribir el snapshot
+    '''
+    path = tmp_path / "nonce_state.json"
+    path.write_text(json.dumps({"0xaa": 3, "0xbb": 7}), encoding="utf-8")
+
+    with open_nonce_store(path) as store:
+        assert store.get("0xaa") == 3
+        assert store.advance("0xaa", 4) == (True, 3)
+        store.set("0xcc", 1)
+
+    # El snapshot no se tocó; los cambios están en el log
+    assert json.loads(path.read_text(encoding="utf-8")) == {"0xaa": 3, "0xbb": 7}
+    assert (tmp_path / "nonce_state.json.log").read_text(encoding="utf-8") == "0xaa 4\n0xcc 1\n"
+
+    with open_nonce_store(path) as store:
+        assert dict(store.items()) == {"0xaa": 4, "0xbb": 7, "0xcc": 1}
+
+
+def test_log_store_flush_policy(tmp_path: Path):
+    '''
+    Con flush_every=N el log se escribe cada N actualizaciones
+    '''
+    path = tmp_path / "nonce_state.json"
+    log_path = tmp_path / "nonce_state.json.log"
+    store = LogNonceStore(path, flush_every=3, fsync=False)
+    store.set("0xaa", 1)
+    store.set("0xbb", 1)
+    assert log_path.read_bytes() == b""
+    store.set("0xcc", 1)
+    assert log_path.read_text(encoding="utf-8").count("\n") == 3
+    store.set("0xdd", 1)
+    store.close()
+    assert log_path.read_text(encoding="utf-8").count("\n") == 4
+
+    # Con intervalo 0 ms se escribe en cada actualización
+    store = LogNonceStore(path, flush_every=None, flush_interval_ms=0, fsync=False)
+    store.set("0xee", 1)
+    assert log_path.read_text(encoding="utf-8").count("\n") == 5
+    store.close()
+
+
+def test_log_store_compaction(tmp_path: Path):
+    '''
+    Al llegar a compact_every registros, el estado pasa al snapshot y el log se vacía
+    '''
+    path = tmp_path / "nonce_state.json"
+    with LogNonceStore(path, compact_every=4, fsync=False) as store:
+        for nonce in range(1, 5):
+            store.set("0xaa", nonce)
+        store.set("0xbb", 9)
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"0xaa": 4}
+    assert (tmp_path / "nonce_state.json.log").read_text(encoding="utf-8") == "0xbb 9\n"
+    with open_nonce_store(path) as store:
+        assert dict(store.items()) == {"0xaa": 4, "0xbb": 9}
+
+
+def test_log_store_recovers_torn_tail(tmp_path: Path):
+    '''
+    Una última línea incompleta (escritura interrumpida) se descarta y se trunca
+    '''
+    path = tmp_path / "nonce_state.json"
+    log_path = tmp_path / "nonce_state.json.log"
+    log_path.write_bytes(b"0xaa 1\n0xaa 2\n0xbb 5")
+
+    with open_nonce_store(path) as store:
+        assert dict(store.items()) == {"0xaa": 2}
+        store.set("0xbb", 6)
+
+    assert log_path.read_bytes() == b"0xaa 1\n0xaa 2\n0xbb 6\n"
+
+
+# ------------------------------------------------------------
+# Estrés con varios procesos sobre el mismo archivo
+# ------------------------------------------------------------
+STRESS_PROCESSES = 8
+STRESS_NONCES = 150
+STRESS_ADDRESSES = ["0xaa", "0xbb", "0xcc"]
+
+
+def _advance_worker(path: str, seed: int):
+    '''
+    Cada proceso intenta avanzar todos los nonces de todas las direcciones,
+    en orden creciente pero intercalando direcciones al azar
+    '''
+    rng = random.Random(seed)
+    todo = {addr: list(range(STRESS_NONCES)) for addr in STRESS_ADDRESSES}
+    accepted = []
+    # compact_every bajo para que también haya compactaciones concurrentes
+    with open_nonce_store(path, flush_every=None, compact_every=50) as store:
+        while todo:
+            addr = rng.choice(sorted(todo))
+            nonce = todo[addr].pop(0)
+            if not todo[addr]:
+                del todo[addr]
+            ok, _ = store.advance(addr, nonce)
+            if ok:
+                accepted.append((addr, nonce))
+    return accepted
+
+
+def test_shared_store_many_processes(tmp_path: Path):
+    '''
+    Con muchos procesos compitiendo, ningún (dirección, nonce) se acepta dos
+    veces y el estado final es el nonce más alto de cada dirección
+    '''
+    path = str(tmp_path / "nonce_state.json")
+    with ProcessPoolExecutor(max_workers=STRESS_PROCESSES) as pool:
+        results = list(pool.map(_advance_worker, [path] * STRESS_PROCESSES, range(STRESS_PROCESSES)))
+
+    all_accepted = [item for accepted in results for item in accepted]
+    assert len(all_accepted) == len(set(all_accepted))
+    # Cada proceso acepta en orden creciente por dirección
+    for accepted in results:
+        for addr in STRESS_ADDRESSES:
+            nonces = [n for a, n in accepted if a == addr]
+            assert nonces == sorted(nonces)
+
+    with open_nonce_store(path) as store:
+        assert dict(store.items()) == {addr: STRESS_NONCES - 1 for addr in STRESS_ADDRESSES}
+
+
+def _verify_worker(nonce_state_path: str, envelopes):
+    from app.verifier import verify_signed_tx
+    return [verify_signed_tx(env, nonce_state_path=nonce_state_path)["valid"] for env in envelopes]
+
+
+def test_verify_signed_tx_many_processes(tmp_path: Path):
+    '''
+    Varios procesos verificando los mismos paquetes contra el mismo
+    nonce_state.json: cada paquete se acepta exactamente una vez
+    '''
+    from app.keystore import create_keystore
+    from app.session import SignerSession
+    from app.tx_model import create_tx
+
+    ks = create_keystore("pass123")
+    with SignerSession(ks, "pass123") as s:
+        envelopes = [
+            s.sign(create_tx(from_addr=s.address, to_addr="0xaa", value=1, nonce=n))
+            for n in range(20)
+        ]
+
+    path = str(tmp_path / "nonce_state.json")
+    # Todos los procesos envían los mismos paquetes (replay masivo)
+    with ProcessPoolExecutor(max_workers=STRESS_PROCESSES) as pool:
+        results = list(pool.map(_verify_worker, [path] * STRESS_PROCESSES, [envelopes] * STRESS_PROCESSES))
+
+    accepted_per_envelope = [sum(r[i] for r in results) for i in range(len(envelopes))]
+    assert all(count <= 1 for count in accepted_per_envelope)
+    # El último nonce siempre lo acepta alguien
+    assert accepted_per_envelope[-1] == 1
@@ -0,0 +1,60 @@
+# tests/test_profiling.py
+import cProfile
+import io
+import pstats
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.profiling import collapsed_stacks, profile_call  # noqa: E402
+
+
+def _leaf():
+    time.sleep(0.02)
+
+
+def _left():
+    _leaf()
+
+
+def _right():
+    _leaf()
+    _leaf()
+
+
+def _root():
+    _left()
+    _right()
+
+
+def test_collapsed_stacks_split_shared_callee_by_caller():
+    '''
+    Una función llamada desde dos lugares aparece en las dos pilas, con el
+    tiempo repartido según cada llamada
+    '''
+    profiler = cProfile.Profile()
+    profiler.runcall(_root)
+    lines = collapsed_stacks(pstats.Stats(profiler).stats)
+    weights = {}
+    for line in lines:
+        stack, _, us = line.rpartition(" ")
+        if stack.endswith("sleep"):
+            weights[stack.split(";")[-3]] = int(us)
+    assert set(weights) == {"test_profiling.py:_left", "test_profiling.py:_right"}
+    assert 1.5 < weights["test_profiling.py:_right"] / weights["test_profiling.py:_left"] < 2.5
+
+
+def test_profile_call_writes_files_and_keeps_result(tmp_path: Path):
+    out = io.StringIO()
+    assert profile_call(lambda: sum(range(1000)), "cpu", tmp_path / "p", out=out) == 499500
+    assert (tmp_path / "p.pstats").exists() and (tmp_path / "p.collapsed").exists()
+    assert "Argon2 (derive_aes_key): 0.000 s" in out.getvalue()
+
+    out = io.StringIO()
+    assert profile_call(lambda: [bytes(1000) for _ in range(100)], "mem", tmp_path / "m", out=out)
+    assert "Pico:" in (tmp_path / "m.alloc.txt").read_text()
+    assert (tmp_path / "m.mem.collapsed").exists()
@@ -0,0 +1,130 @@
+# tests/test_session.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import session as session_mod  # noqa: E402
+from app.keystore import create_keystore, save_keystore  # noqa: E402
+from app.session import SignerSession  # noqa: E402
+from app.tx_model import create_tx  # noqa: E402
+from app.verifier import verify_signed_tx  # noqa: E402
+
+
+class FakeClock:
+    '''
+    Reloj controlado para probar el idle_timeout sin esperar
+    '''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def keystore():
+    return create_keystore("pass123")
+
+
+def test_session_signs_many_with_one_unlock(keystore, tmp_path: Path, monkeypatch):
+    '''
+    La sesión desbloquea una vez y todas sus firmas son válidas
+    '''
+    calls = []
+    original_unlock = session_mod.unlock_keystore
+    def counting_unlock(ks, passphrase):
+        calls.append(1)
+        return original_unlock(ks, passphrase)
+    monkeypatch.setattr(session_mod, "unlock_keystore", counting_unlock)
+
+    nonce_state_path = tmp_path / "nonce_state.json"
+    with SignerSession(keystore, "pass123") as s:
+        for nonce in range(1, 6):
+            tx = create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=nonce, nonce=nonce)
+            signed = s.sign(tx)
+            assert verify_signed_tx(signed, nonce_state_path=str(nonce_state_path))["valid"]
+        assert s.uses == 5
+
+    assert len(calls) == 1
+    # Al salir del "with" la llave se descarta
+    assert s.closed
+    with pytest.raises(RuntimeError, match="cerrada"):
+        s.sign(create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=1, nonce=9))
+
+
+def test_session_idle_timeout(keystore):
+    '''
+    La sesión se cierra si pasa más tiempo que idle_timeout sin firmar
+    '''
+    clock = FakeClock()
+    s = SignerSession(keystore, "pass123", idle_timeout=10, clock=clock)
+    tx = create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=1, nonce=1)
+
+    clock.now = 9
+    s.sign(tx)
+    # El tiempo inactivo se cuenta desde la última firma
+    clock.now = 18
+    assert not s.closed
+    clock.now = 30
+    assert s.closed
+    with pytest.raises(RuntimeError):
+        s.sign(tx)
+
+
+def test_session_max_uses(keystore, tmp_path: Path):
+    '''
+    La sesión se agota tras max_uses firmas; sign_many reporta errores por
+    transacción pero corta el flujo cuando la sesión se cierra
+    '''
+    s = SignerSession(keystore, "pass123", max_uses=2)
+    txs = [
+        {"to": "0xdeadbeef", "value": "diez", "nonce": 0, "timestamp": "2025-01-01T00:00:00"},
+        create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=1, nonce=1),
+        create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=2, nonce=2),
+        create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=3, nonce=3),
+    ]
+    results = []
+    with pytest.raises(RuntimeError):
+        for r in s.sign_many(txs):
+            results.append(r)
+
+    assert [r["ok"] for r in results] == [False, True, True]
+    assert s.remaining_uses == 0
+
+
+def test_sign_many_error_on_last_use_belongs_to_tx(keystore, monkeypatch):
+    '''
+    Si la firma que agota la sesión falla por la propia tx, se reporta como
+    error de esa tx; el flujo se corta hasta la siguiente
+    '''
+    s = SignerSession(keystore, "pass123", max_uses=2)
+    original_sign = session_mod._sign_with_key
+
+    def failing_sign(priv, pub, address, tx):
+        if tx["nonce"] == 2:
+            raise ValueError("tx 2 no se puede firmar")
+        return original_sign(priv, pub, address, tx)
+
+    monkeypatch.setattr(session_mod, "_sign_with_key", failing_sign)
+    txs = [create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=n, nonce=n) for n in (1, 2, 3)]
+    results = []
+    with pytest.raises(RuntimeError, match="cerrada"):
+        for r in s.sign_many(txs):
+            results.append(r)
+
+    assert [r["ok"] for r in results] == [True, False]
+    assert results[1]["error"] == "tx 2 no se puede firmar"
+
+def test_session_wrong_passphrase(keystore, tmp_path: Path):
+    '''
+    Passphrase incorrecta al abrir la sesión desde un archivo
+    '''
+    ks_path = tmp_path / "wallet.keystore.json"
+    save_keystore(keystore, ks_path)
+    with pytest.raises(ValueError, match="passphrase"):
+        SignerSession.from_path(ks_path, "otra")
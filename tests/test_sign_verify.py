@@ -11,8 +11,9 @@ if str(ROOT) not in sys.path:
 
 from app.keystore import create_keystore, save_keystore  # noqa: E402
 from app.tx_model import create_tx  # noqa: E402
-from app.signer import sign_transaction  # noqa: E402
-from app.verifier import verify_signed_tx  # noqa: E402
+from app import signer  # noqa: E402
+from app.signer import sign_transaction, sign_transactions  # noqa: E402
+from app.verifier import verify_signature, verify_signed_tx  # noqa: E402
 
 
 def test_sign_and_verify_ok(tmp_path: Path):
@@ -92,4 +93,150 @@ def test_address_mismatch_detected(tmp_path: Path):
     r = verify_signed_tx(signed_tampered, nonce_state_path=str(nonce_state_path))
     # Verificamos que no sea valida, el address contenido en la transacción no se derivó de la clave pública
     assert not r["valid"]
-    assert "address mismatch" in r["reason"]
\ No newline at end of file
+    assert "address mismatch" in r["reason"]
+
+
+def test_sign_transactions_batch_unlocks_once(tmp_path: Path, monkeypatch):
+    '''
+    Firmado por lotes: el keystore se desbloquea una sola vez y los errores
+    por transacción no detienen el lote
+    '''
+    ks_path = tmp_path / "wallet.keystore.json"
+    ks = create_keystore("pass123")
+    save_keystore(ks, ks_path)
+    addr = ks["address"]
+
+    # Contamos cuántas veces se deriva la llave del keystore
+    calls = []
+    original_unlock = signer.unlock_keystore
+    def counting_unlock(keystore, passphrase):
+        calls.append(1)
+        return original_unlock(keystore, passphrase)
+    monkeypatch.setattr(signer, "unlock_keystore", counting_unlock)
+
+    txs = [create_tx(from_addr=addr, to_addr="0xdeadbeef", value=i, nonce=i) for i in range(1, 4)]
+    # Transacción inválida a mitad del lote
+    txs.insert(1, {"to": "0xdeadbeef", "value": "diez", "nonce": 9, "timestamp": "2025-01-01T00:00:00"})
+
+    results = list(sign_transactions(str(ks_path), "pass123", txs))
+
+    assert len(calls) == 1
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r["ok"] for r in results] == [True, False, True, True]
+    assert results[1]["signed"] is None and results[1]["error"]
+
+    nonce_state_path = tmp_path / "nonce_state.json"
+    for r in results:
+        if r["ok"]:
+            assert verify_signed_tx(r["signed"], nonce_state_path=str(nonce_state_path))["valid"]
+
+
+def test_sign_transactions_wrong_passphrase_fails_early(tmp_path: Path):
+    '''
+    Una passphrase incorrecta falla al crear el lote, no al consumirlo
+    '''
+    ks_path = tmp_path / "wallet.keystore.json"
+    save_keystore(create_keystore("pass123"), ks_path)
+
+    with pytest.raises(ValueError, match="passphrase"):
+        sign_transactions(str(ks_path), "otra", iter([]))
+
+
+def test_verify_with_nonce_store_instance(tmp_path: Path):
+    '''
+    verify_signed_tx acepta un almacén de nonces en lugar de una ruta
+    '''
+    from app.nonce_store import NonceStore
+
+    ks_path = tmp_path / "wallet.keystore.json"
+    ks = create_keystore("pass123")
+    save_keystore(ks, ks_path)
+    txs = [create_tx(from_addr=ks["address"], to_addr="0xdeadbeef", value=1, nonce=n) for n in (1, 2)]
+    signed = [r["signed"] for r in sign_transactions(str(ks_path), "pass123", txs)]
+
+    store = NonceStore()
+    assert verify_signed_tx(signed[0], nonce_store=store)["valid"]
+    assert verify_signed_tx(signed[1], nonce_store=store)["valid"]
+    r = verify_signed_tx(signed[0], nonce_store=store)
+    assert not r["valid"] and "stale nonce: 1 <= 2" in r["reason"]
+    # No se escribió nada en disco
+    assert not (tmp_path / "nonce_state.json").exists()
+
+
+def test_pubkey_cache_hits_and_eviction(tmp_path: Path):
+    '''
+    La caché de llaves públicas acierta con remitentes repetidos y
+    descarta la menos usada al llenarse
+    '''
+    from app.session import SignerSession
+    from app.verifier import PubkeyCache
+
+    senders = [SignerSession(create_keystore("pass123"), "pass123") for _ in range(3)]
+    envelopes = [
+        s.sign(create_tx(from_addr=s.address, to_addr="0xdeadbeef", value=1, nonce=1))
+        for s in senders
+    ]
+
+    cache = PubkeyCache(maxsize=2)
+    for env in (envelopes[0], envelopes[0], envelopes[1], envelopes[0]):
+        result, _ = verify_signature(env, pubkey_cache=cache)
+        assert result["valid"]
+    assert cache.info() == {"hits": 2, "misses": 2, "size": 2, "maxsize": 2}
+
+    # Entra el tercer remitente: se descarta el menos usado (envelopes[1])
+    verify_signature(envelopes[2], pubkey_cache=cache)
+    verify_signature(envelopes[0], pubkey_cache=cache)
+    assert cache.hits == 3
+    verify_signature(envelopes[1], pubkey_cache=cache)
+    assert cache.misses == 4
+
+    # Una firma manipulada sigue fallando aunque la llave esté en caché
+    tampered = json.loads(json.dumps(envelopes[0]))
+    tampered["tx"]["value"] = "999"
+    assert not verify_signature(tampered, pubkey_cache=cache)[0]["valid"]
+
+
+@pytest.mark.parametrize("pool", [None, "threads", "processes"])
+def test_verify_many_matches_serial_in_order(tmp_path: Path, pool):
+    '''
+    verify_many da lo mismo que verify_signed_tx uno por uno, en el orden de
+    entrada, con cualquier executor (y con paquetes JSON, binarios o basura)
+    '''
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    from app.envelope import encode_envelope, parse_envelope
+    from app.nonce_store import NonceStore
+    from app.session import SignerSession
+    from app.verifier import verify_many
+
+    a, b = (SignerSession(create_keystore("pass123"), "pass123") for _ in range(2))
+    tampered = a.sign(create_tx(from_addr=a.address, to_addr="0xdeadbeef", value=1, nonce=9))
+    tampered["tx"]["value"] = "999"
+    envelopes = [
+        a.sign(create_tx(from_addr=a.address, to_addr="0xdeadbeef", value=1, nonce=2)),
+        encode_envelope(b.sign(create_tx(from_addr=b.address, to_addr="0xdeadbeef", value=1, nonce=1))),
+        a.sign(create_tx(from_addr=a.address, to_addr="0xdeadbeef", value=1, nonce=1)),  # stale
+        tampered,
+        b"no es un paquete",
+        parse_envelope(encode_envelope(a.sign(create_tx(from_addr=a.address, to_addr="0xdeadbeef", value=1, nonce=3)))),
+        a.sign(create_tx(from_addr=a.address, to_addr="0xdeadbeef", value=1, nonce=3)),  # replay
+    ]
+
+    serial_store = NonceStore()
+    expected = [verify_signed_tx(env, nonce_store=serial_store) for env in envelopes]
+    assert [r["valid"] for r in expected] == [True, True, False, False, False, True, False]
+
+    executor = {None: None, "threads": ThreadPoolExecutor(2), "processes": ProcessPoolExecutor(2)}[pool]
+    try:
+        got = verify_many(envelopes, executor=executor, nonce_store=NonceStore(), chunk_size=2)
+        assert got == expected
+        assert [r["valid"] for r in verify_many(envelopes, executor=executor, enforce_nonce=False)] == \
+            [True, True, True, False, False, True, True]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Con ruta: el estado se abre una vez y queda en disco
+    path = tmp_path / "nonce_state.json"
+    assert verify_many(envelopes, nonce_state_path=str(path)) == expected
+    assert verify_many(envelopes[:1], nonce_state_path=str(path))[0]["reason"].startswith("stale nonce")
@@ -0,0 +1,197 @@
+# tests/test_signer_service.py
+import sys
+import asyncio
+import threading
+import contextlib
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.keystore import create_keystore  # noqa: E402
+from app.session import SignerSession  # noqa: E402
+from app.signer_service import RateLimiter, SignerClient, SignerService  # noqa: E402
+from app.tx_model import create_tx  # noqa: E402
+from app.verifier import verify_signed_tx  # noqa: E402
+
+PASSPHRASE = "pass123"
+
+
+@pytest.fixture(scope="module")
+def keystore():
+    return create_keystore(PASSPHRASE)
+
+
+@contextlib.contextmanager
+def running(service: SignerService):
+    '''
+    Corre el servicio en un hilo con su propio event loop mientras dure el bloque
+    '''
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+    result = {}
+
+    def target():
+        result["stats"] = loop.run_until_complete(service.run(on_ready=ready.set))
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    assert ready.wait(10)
+    try:
+        yield result
+    finally:
+        loop.call_soon_threadsafe(service.stop)
+        thread.join(10)
+        loop.close()
+
+
+def _tx(nonce: int):
+    tx = create_tx(from_addr="", to_addr="0xaa", value=nonce, nonce=nonce)
+    del tx["from"]
+    return tx
+
+
+def test_concurrent_requests_are_coalesced(keystore, tmp_path: Path):
+    '''
+    Varios clientes a la vez: todo se firma bien y en menos lotes que peticiones
+    '''
+    session = SignerSession(keystore, PASSPHRASE, idle_timeout=None)
+    sock = tmp_path / "signer.sock"
+    service = SignerService(session, sock, batch_window_ms=20, log=lambda msg: None)
+    signed = []
+    lock = threading.Lock()
+
+    def client(base: int) -> None:
+        with SignerClient(sock) as c:
+            for i in range(10):
+                envelope = c.sign(_tx(base + i))
+                with lock:
+                    signed.append(envelope)
+
+    with running(service) as result:
+        threads = [threading.Thread(target=client, args=(k * 100,)) for k in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert len(signed) == 80
+    assert all(verify_signed_tx(s, enforce_nonce=False)["valid"] for s in signed)
+    assert {s["tx"]["from"] for s in signed} == {keystore["address"]}
+    stats = result["stats"]
+    assert stats["signed"] == 80
+    assert stats["batches"] < 80
+    assert not sock.exists()
+    assert session.closed
+
+
+def test_binary_response_and_errors(keystore, tmp_path: Path):
+    '''
+    Respuesta binaria, errores de validación y "from" ajeno
+    '''
+    session = SignerSession(keystore, PASSPHRASE, idle_timeout=None)
+    sock = tmp_path / "signer.sock"
+    with running(SignerService(session, sock, log=lambda msg: None)):
+        assert oct(sock.stat().st_mode & 0o777) == "0o600"
+        with SignerClient(sock) as c:
+            blob = c.sign(_tx(1), binary=True)
+            assert isinstance(blob, bytes)
+            assert verify_signed_tx(blob, enforce_nonce=False)["valid"]
+
+            bad = _tx(2)
+            bad["nonce"] = -1
+            with pytest.raises(RuntimeError, match="nonce"):
+                c.sign(bad)
+
+            foreign = _tx(3)
+            foreign["from"] = "0x" + "00" * 20
+            with pytest.raises(RuntimeError, match="address mismatch"):
+                c.sign(foreign)
+
+            # La conexión sigue sirviendo después de los errores
+            assert c.sign(_tx(4))["tx"]["nonce"] == 4
+
+
+def test_rate_limit_and_idle_lockout(keystore, tmp_path: Path):
+    '''
+    Lo que pasa del límite se rechaza; tras el idle_timeout el servicio queda bloqueado
+    '''
+    now = [0.0]
+    session = SignerSession(keystore, PASSPHRASE, idle_timeout=60, clock=lambda: now[0])
+    sock = tmp_path / "signer.sock"
+    service = SignerService(session, sock, max_rate=0.001, burst=2, log=lambda msg: None)
+    with running(service):
+        with SignerClient(sock) as c:
+            c.sign(_tx(1))
+            c.sign(_tx(2))
+            with pytest.raises(RuntimeError, match="rate limited"):
+                c.sign(_tx(3))
+
+            service.limiter = RateLimiter(None)
+            now[0] = 61.0
+            with pytest.raises(RuntimeError, match="bloqueado"):
+                c.sign(_tx(4))
+
+
+def test_rate_limiter_refills():
+    '''
+    Token bucket: ráfaga inicial y recarga según el tiempo transcurrido
+    '''
+    now = [0.0]
+    limiter = RateLimiter(2, burst=3, clock=lambda: now[0])
+    assert [limiter.allow() for _ in range(4)] == [True, True, True, False]
+    now[0] = 0.5
+    assert limiter.allow() and not limiter.allow()
+
+
+def test_batch_failure_answers_every_request(keystore, tmp_path: Path, monkeypatch):
+    '''
+    Una excepción inesperada al firmar un lote se contesta como error a cada
+    petición y el servicio sigue atendiendo
+    '''
+    session = SignerSession(keystore, PASSPHRASE, idle_timeout=None)
+    sock = tmp_path / "signer.sock"
+    service = SignerService(session, sock, log=lambda msg: None)
+    real_sign_many = session.sign_many
+    calls = []
+
+    def sign_many(txs):
+        calls.append(len(txs))
+        if len(calls) == 1:
+            raise KeyError("boom")
+        return real_sign_many(txs)
+
+    monkeypatch.setattr(session, "sign_many", sign_many)
+    with running(service) as result:
+        with SignerClient(sock) as c:
+            with pytest.raises(RuntimeError, match="boom"):
+                c.sign(_tx(1))
+            assert c.sign(_tx(2))["tx"]["nonce"] == 2
+    assert result["stats"]["failed"] == 1 and result["stats"]["signed"] == 1
+
+
+def test_refuses_socket_of_running_service(keystore, tmp_path: Path):
+    '''
+    Un segundo servicio no borra el socket de uno que sigue atendiendo;
+    un socket viejo sin servidor sí se reemplaza
+    '''
+    import socket
+
+    sock = tmp_path / "signer.sock"
+    first = SignerService(SignerSession(keystore, PASSPHRASE, idle_timeout=None), sock, log=lambda msg: None)
+    with running(first):
+        second = SignerService(SignerSession(keystore, PASSPHRASE, idle_timeout=None), sock, log=lambda msg: None)
+        with pytest.raises(RuntimeError, match="Otro servicio"):
+            asyncio.run(second.run())
+        with SignerClient(sock) as c:
+            assert c.sign(_tx(1))["tx"]["nonce"] == 1
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(sock))
+    stale.close()
+    with running(SignerService(SignerSession(keystore, PASSPHRASE, idle_timeout=None), sock, log=lambda msg: None)):
+        with SignerClient(sock) as c:
+            assert c.sign(_tx(2))["tx"]["nonce"] == 2
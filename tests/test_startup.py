@@ -0,0 +1,64 @@
+# tests/test_startup.py
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import bench  # noqa: E402
+from app.keystore import create_keystore, save_keystore  # noqa: E402
+
+# Lista de módulos cargados al final de un fragmento de código
+_DUMP_MODULES = "import json, sys; print(json.dumps(sorted(sys.modules)))"
+
+
+def _modules_after(code: str, cwd: Path) -> list[str]:
+    '''
+    Corre "code" en un intérprete nuevo y regresa los módulos que quedaron cargados
+    '''
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.run(
+        [sys.executable, "-c", f"{code}\n{_DUMP_MODULES}"],
+        capture_output=True, text=True, cwd=cwd, env=env, check=True,
+    )
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def _heavy(modules: list[str]) -> list[str]:
+    return [m for m in modules if m.split(".")[0] in bench.HEAVY_IMPORTS]
+
+
+def test_cli_import_skips_crypto_backends():
+    '''
+    Importar la CLI y construir el parser (--help) no carga cryptography ni argon2
+    '''
+    modules = _modules_after("from app import cli; cli.build_parser()", ROOT)
+    assert "app.cli" in modules
+    assert _heavy(modules) == []
+
+
+def test_address_command_without_crypto(tmp_path: Path):
+    '''
+    "wallet address" solo lee el keystore: no necesita el backend criptográfico
+    '''
+    save_keystore(create_keystore("pass123"), tmp_path / "wallet.keystore.json")
+    modules = _modules_after("from app import cli; cli.main(['address'])", tmp_path)
+    assert _heavy(modules) == []
+
+
+def test_cli_import_budget():
+    '''
+    El import de app.cli cabe en el presupuesto de arranque
+    (WALLET_IMPORT_BUDGET_MS lo ajusta en máquinas lentas)
+    '''
+    budget_ms = float(os.environ.get("WALLET_IMPORT_BUDGET_MS", bench.CLI_IMPORT_BUDGET_MS))
+    times = bench.import_times("app.cli")
+    total_ms = times["app.cli"][1] / 1000
+
+    heaviest = sorted(times.items(), key=lambda kv: kv[1][1], reverse=True)[:8]
+    detail = ", ".join(f"{name}={cum / 1000:.1f}ms" for name, (_, cum) in heaviest)
+    assert total_ms <= budget_ms, f"import app.cli tardó {total_ms:.1f} ms (> {budget_ms} ms): {detail}"
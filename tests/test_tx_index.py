@@ -0,0 +1,121 @@
+# tests/test_tx_index.py
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.envelope import encode_envelope  # noqa: E402
+from app.ledger import open_ledger  # noqa: E402
+from app.tx_index import open_tx_index, timestamp_us  # noqa: E402
+
+
+def _day(day: int) -> str:
+    return f"2024-01-{day:02d}T00:00:00Z"
+
+
+def test_timestamp_us():
+    assert timestamp_us("1970-01-01T00:00:01Z") == 1_000_000
+    # Sin zona horaria se toma como UTC
+    assert timestamp_us("1970-01-01T00:00:01.5") == 1_500_000
+    assert timestamp_us("2024-01-01T01:00:00+01:00") == timestamp_us("2024-01-01T00:00:00Z")
+    assert timestamp_us("ayer") is None
+
+
+def test_query_filters_and_lazy_load(tmp_path: Path, session, signed):
+    '''
+    Filtros por remitente, destinatario, nonce y tiempo; load() lee el archivo
+    o el registro de la bitácora solo cuando se pide
+    '''
+    files = tmp_path / "verified"
+    files.mkdir()
+    entries = []
+    for n in range(1, 6):
+        envelope = signed(n, to_addr="0xAA" if n % 2 else "0xbb", timestamp=_day(n))
+        path = files / f"tx_{n}.json"
+        path.write_text(json.dumps(envelope), encoding="utf-8")
+        entries.append((envelope["tx"], path, None))
+    with open_ledger(tmp_path / "led") as ledger:
+        ledger_signed = [signed(n, to_addr="0xAA", timestamp=_day(n)) for n in range(6, 9)]
+        positions = ledger.append_many(encode_envelope(s) for s in ledger_signed)
+    entries += [(s["tx"], tmp_path / "led", pos) for s, pos in zip(ledger_signed, positions)]
+
+    with open_tx_index(tmp_path / "idx.sqlite3") as index:
+        assert index.add_many(entries) == 8
+        # Duplicados (mismo remitente y nonce) se ignoran
+        assert index.add_many(entries[:2]) == 0
+        assert len(index) == 8
+
+        rows = list(index.query(sender=session.address.upper(), nonce_min=3, nonce_max=7))
+        assert [r.nonce for r in rows] == [3, 4, 5, 6, 7]
+        assert [r.nonce for r in index.query(recipient="0xaa")] == [1, 3, 5, 6, 7, 8]
+        assert [r.nonce for r in index.query(since="2024-01-02", until="2024-01-04T00:00:00Z")] == [2, 3]
+        assert [r.nonce for r in index.query(limit=2)] == [1, 2]
+
+        by_nonce = {r.nonce: r for r in index.query()}
+        assert by_nonce[2].load() == json.loads((files / "tx_2.json").read_text(encoding="utf-8"))
+        assert by_nonce[7].load() == ledger_signed[1]
+        assert by_nonce[7].to_dict()["location"].endswith(f"@{positions[1][0]}:{positions[1][1]}")
+
+        with pytest.raises(ValueError):
+            list(index.query(since="no es fecha"))
+
+        # Reconstrucción desde el disco
+        assert index.rebuild(files, tmp_path / "led") == 8
+        assert [r.nonce for r in index.query(sender=session.address)] == list(range(1, 9))
+
+
+def test_full_uint64_nonce_range(tmp_path: Path):
+    '''
+    Nonces de todo el rango uint64 se indexan en orden; los de fuera se
+    omiten sin tumbar el lote, y un índice de la versión anterior se migra
+    '''
+    import sqlite3
+
+    from app.tx_index import _SCHEMA
+
+    txs = [{"from": "0xAB", "to": "0xcd", "nonce": n, "timestamp": "2024-01-01T00:00:00Z"}
+           for n in (5, 2 ** 63, 1, 2 ** 64 - 1, 2 ** 64)]
+    with open_tx_index(tmp_path / "idx.sqlite3") as index:
+        assert index.add_many((tx, "f.json", None) for tx in txs) == 4
+        assert [r.nonce for r in index.query(sender="0xab")] == [1, 5, 2 ** 63, 2 ** 64 - 1]
+        assert [r.nonce for r in index.query(sender="0xab", nonce_min=6, nonce_max=2 ** 70)] == [2 ** 63, 2 ** 64 - 1]
+        assert list(index.query(nonce_min=2 ** 64)) == []
+
+    # Índice viejo: nonce sin desplazar y user_version 0
+    old = tmp_path / "old.sqlite3"
+    db = sqlite3.connect(str(old))
+    db.executescript(_SCHEMA)
+    db.execute("INSERT INTO txs (from_addr, nonce, path) VALUES ('0xab', 7, 'f.json')")
+    db.commit()
+    db.close()
+    with open_tx_index(old) as index:
+        assert [r.nonce for r in index.query(sender="0xab")] == [7]
+        index.add({"from": "0xab", "nonce": 2 ** 63}, "g.json")
+        assert [r.nonce for r in index.query(sender="0xab", nonce_min=7)] == [7, 2 ** 63]
+
+
+def test_rebuild_skips_unreadable_entries(tmp_path: Path, signed):
+    '''
+    Un archivo roto en verified/ se reporta y se omite; si la reconstrucción
+    falla a la mitad, el índice queda como estaba
+    '''
+    files = tmp_path / "verified"
+    files.mkdir()
+    for n in (1, 2):
+        (files / f"tx_{n}.json").write_text(json.dumps(signed(n)), encoding="utf-8")
+    (files / "roto.json").write_text("{}", encoding="utf-8")
+
+    messages = []
+    with open_tx_index(tmp_path / "idx.sqlite3") as index:
+        assert index.rebuild(files, log=messages.append) == 2
+        assert len(messages) == 1 and "roto.json" in messages[0]
+
+        (files / "tx_3.json").write_text(json.dumps(signed(3)), encoding="utf-8")
+        with pytest.raises(RuntimeError):
+            index.rebuild(files, log=lambda msg: (_ for _ in ()).throw(RuntimeError(msg)))
+        assert len(index) == 2
@@ -0,0 +1,94 @@
+# tests/test_validation.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.validation import STORED_TX_VALIDATOR, TX_VALIDATOR, validate_many  # noqa: E402
+
+GOOD = {"from": "0xabc", "to": "0x123", "value": "10.5", "nonce": 1, "timestamp": "2025-01-01T00:00:00Z"}
+
+
+def _with(**changes):
+    tx = dict(GOOD)
+    for key, value in changes.items():
+        if value is ...:
+            del tx[key]
+        else:
+            tx[key] = value
+    return tx
+
+
+@pytest.mark.parametrize("tx, exc, message", [
+    (_with(to=...), ValueError, "Falta el campo obligatorio 'to'."),
+    (_with(value=""), ValueError, "El campo 'value' no puede quedar vacío."),
+    (_with(to=5), TypeError, "El campo 'to' debe ser una cadena."),
+    (_with(value=1.5), ValueError, "El campo 'value' debe ser un entero o un string numérico."),
+    (_with(value="diez"), ValueError, "El campo 'value' debe ser un número entero o decimal positivo."),
+    (_with(value="10\n"), ValueError, "El campo 'value' debe ser un número entero o decimal positivo."),
+    (_with(nonce="1"), TypeError, "El campo 'nonce' debe ser un entero."),
+    (_with(nonce=-1), ValueError, "El 'nonce' no puede ser negativo."),
+    (_with(nonce=2 ** 64), ValueError, "El 'nonce' debe ser menor que 2**64 (uint64)."),
+    (_with(timestamp="ayer"), ValueError, "El campo 'timestamp' debe estar en formato ISO8601."),
+    (["no", "es", "dict"], TypeError, "La transacción debe ser un objeto JSON."),
+])
+def test_tx_schema_keeps_signer_exceptions(tx, exc, message):
+    '''
+    El esquema de firmado lanza las mismas excepciones y mensajes que el
+    validate_tx de signer.py
+    '''
+    with pytest.raises(exc) as info:
+        TX_VALIDATOR.validate(tx)
+    assert str(info.value) == message
+
+
+def test_tx_schema_accepts_signer_inputs():
+    for tx in (GOOD, _with(**{"from": ...}), _with(value=7), _with(value="0.001"), _with(gas_limit=-5),
+               _with(nonce=2 ** 64 - 1)):
+        TX_VALIDATOR.validate(tx)
+
+
+def test_stored_schema_matches_transaction_module():
+    STORED_TX_VALIDATOR.validate(_with(gas_limit=21000, data_hex="0x00"))
+    for tx, field in (
+        (_with(**{"from": ...}), "from"),
+        (_with(value=10), "value"),
+        (_with(gas_limit=-1), "gas_limit"),
+        (_with(data_hex=0), "data_hex"),
+        (_with(timestamp=0), "timestamp"),
+    ):
+        with pytest.raises(ValueError, match=field):
+            STORED_TX_VALIDATOR.validate(tx)
+
+
+def test_validate_many_reports_every_record():
+    '''
+    El modo por lotes no se detiene en el primer error y da un código por registro
+    '''
+    results = list(validate_many(iter([GOOD, _with(nonce=-3), "basura", _with(to=...), GOOD])))
+    assert [r["ok"] for r in results] == [True, False, False, False, True]
+    assert [(r["code"], r["field"]) for r in results if not r["ok"]] == [
+        ("range", "nonce"), ("not_object", None), ("missing", "to"),
+    ]
+    assert results[1]["error"] == "El 'nonce' no puede ser negativo."
+    assert [r["index"] for r in results] == list(range(5))
+
+
+def test_verifier_rejects_signed_invalid_tx():
+    '''
+    El verificador usa el mismo esquema: una tx firmada pero sin "to" no es válida
+    '''
+    from app.keystore import create_keystore, unlock_keystore
+    from app.signer import _sign_with_key
+    from app.verifier import verify_signature
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    priv_bytes, pub_bytes, address = unlock_keystore(create_keystore("pass123"), "pass123")
+    priv = ed25519.Ed25519PrivateKey.from_private_bytes(priv_bytes)
+    tx = {"from": address, "value": "1", "nonce": 1, "timestamp": "2025-01-01T00:00:00Z"}
+    result, _ = verify_signature(_sign_with_key(priv, pub_bytes, address, tx))
+    assert result == {"valid": False, "reason": "invalid tx: Falta el campo obligatorio 'to'."}